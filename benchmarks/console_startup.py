@@ -0,0 +1,73 @@
+"""
+Measure the console startup: importing pyfireconsole and loading a model directory eagerly and lazily.
+Each measurement runs in a new interpreter, so imports are cold.
+
+    python benchmarks/console_startup.py --models 150 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "import pyfireconsole": "import pyfireconsole",
+    "import console": "from pyfireconsole.console.pyfireconsole import PyFireConsole",
+    "eager load_models": "from pyfireconsole.console.pyfireconsole import PyFireConsole\n"
+                         "PyFireConsole(model_dir={model_dir!r}).load_models({{}}, verbose=False)",
+    "lazy load_models": "from pyfireconsole.console.pyfireconsole import PyFireConsole\n"
+                        "PyFireConsole(model_dir={model_dir!r}, lazy=True).load_models({{}}, verbose=False)",
+    "lazy load_models + 1 model": "from pyfireconsole.console.pyfireconsole import PyFireConsole\n"
+                                  "PyFireConsole(model_dir={model_dir!r}, lazy=True).load_models({{}}, verbose=False)['Model0']",
+}
+
+TIMER = """import time
+_started = time.perf_counter()
+{code}
+print(time.perf_counter() - _started)
+"""
+
+
+def write_models(model_dir: str, count: int, fields: int = 10):
+    for i in range(count):
+        columns = "\n".join(f"    field{j}: Optional[str] = None" for j in range(fields))
+        with open(os.path.join(model_dir, f"model{i}.py"), "w") as f:
+            f.write(
+                "from typing import Optional\n\n"
+                "from pyfireconsole.models.association import belongs_to\n"
+                "from pyfireconsole.models.pyfire_model import PyfireDoc\n\n\n"
+                # a tree of relationships: loading one model loads its parent
+                f"@belongs_to('Model{i // 10}', 'parent_id', 'parent')\n"
+                f"class Model{i}(PyfireDoc):\n"
+                f"{columns}\n"
+            )
+
+
+def measure(code: str, repeat: int) -> list[float]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")]))
+    return [float(subprocess.check_output([sys.executable, "-c", TIMER.format(code=code)], env=env, text=True).split()[-1])
+            for _ in range(repeat)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', type=int, default=150, help="The number of generated model files.")
+    parser.add_argument('--repeat', type=int, default=5, help="The number of runs per scenario. The median is reported.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        write_models(model_dir, args.models)
+        print(f"{'scenario':32} {'median':>9} {'min':>9}  ({args.models} model files, {args.repeat} runs)")
+        for name, code in SCENARIOS.items():
+            if name.startswith("lazy"):
+                # the first run builds the index cache, the reported runs reuse it
+                measure(code.format(model_dir=model_dir), 1)
+            times = measure(code.format(model_dir=model_dir), args.repeat)
+            print(f"{name:32} {statistics.median(times) * 1000:7.1f}ms {min(times) * 1000:7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Benchmark the ORM hot paths against the in-memory backend, across document counts and widths, and compare the results
+with the baselines stored in benchmarks/baselines.json. Changes of the baselines show up in review with the code.
+
+    python benchmarks/orm_hot_paths.py                      # run and compare with the baselines
+    python benchmarks/orm_hot_paths.py --save               # record the results as the new baselines
+    python benchmarks/orm_hot_paths.py --check              # exit with 1 when a benchmark regressed
+    python benchmarks/orm_hot_paths.py -k as_json --docs 1000 --widths 50
+
+Times are per operation: per document for iteration and as_json, per call otherwise. The fastest of the samples is
+compared with the baseline; the median is printed while running.
+Baselines depend on the machine. Record them and compare on the same machine, e.g. before and after a change, and
+confirm a reported regression by running it again with -k.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from console_startup import SCENARIOS, measure, write_models  # noqa: E402
+
+from pyfireconsole.db.connection import FirestoreConnection  # noqa: E402
+from pyfireconsole.db.memory_backend import AsyncMemoryClient, MemoryClient  # noqa: E402
+from pyfireconsole.models.association import belongs_to, has_many  # noqa: E402
+from pyfireconsole.models.pyfire_model import PyfireCollection, PyfireDoc  # noqa: E402
+
+BASELINES = os.path.join(BENCHMARK_DIR, "baselines.json")
+SAMPLE = 100  # documents per find/save/update/association benchmark
+AUTHORS = 20
+COMMENTS = 3
+STARTUP_MODELS = 50
+MIN_SAMPLE_TIME = 0.05
+
+
+def make_models(width: int) -> tuple[type[PyfireDoc], type[PyfireDoc], type[PyfireDoc]]:
+    """
+    Models of the benchmarks: Author has_many Post, Post belongs_to Author and has a sub collection of Comment.
+    Posts have `width` string fields besides their own.
+    """
+    class BenchComment(PyfireDoc):
+        body: str
+        created_at: datetime
+
+    class BenchAuthor(PyfireDoc):
+        name: str
+        email: str
+
+    annotations = {"title": str, "author_id": str, "published_at": datetime, "tags": list[str], "views": int,
+                   "comments": PyfireCollection[BenchComment]}
+    annotations.update({f"field{i}": str for i in range(width)})
+    BenchPost = type("BenchPost", (PyfireDoc,), {"__annotations__": annotations, "__module__": __name__,
+                                                 "comments": PyfireCollection(BenchComment)})
+    belongs_to(BenchAuthor, "author_id")(BenchPost)
+    has_many(BenchPost, "author_id", "posts")(BenchAuthor)
+    return BenchAuthor, BenchPost, BenchComment
+
+
+def post_data(i: int, width: int) -> dict:
+    data = {
+        "title": f"Post {i}",
+        "author_id": f"author{i % AUTHORS:02}",
+        "published_at": datetime(2023, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i),
+        "tags": ["python", f"tag{i % 7}"],
+        "views": i,
+    }
+    data.update({f"field{j}": f"value {i}-{j}" for j in range(width)})
+    return data
+
+
+def seed(db: MemoryClient, models: tuple, docs: int, width: int):
+    # written with the client directly, so seeding isn't part of any benchmark
+    author_class, post_class, comment_class = models
+    for i in range(AUTHORS):
+        db.collection(author_class.collection_name()).document(f"author{i:02}").set({"name": f"Author {i}", "email": f"{i}@example.com"})
+    for i in range(docs):
+        post = db.collection(post_class.collection_name()).document(f"post{i:06}")
+        post.set(post_data(i, width))
+        if i < SAMPLE:
+            for j in range(COMMENTS):
+                post.collection(comment_class.collection_name()).document(f"comment{j}").set(
+                    {"body": f"Comment {j}", "created_at": datetime(2023, 1, 2, tzinfo=timezone.utc)})
+
+
+def benchmarks(models: tuple, docs: int, width: int) -> dict[str, tuple[Callable[[], object], int]]:
+    """
+    The benchmarks of one document count and width: names to (function, number of operations per call).
+    """
+    author_class, post_class, _ = models
+    rng = random.Random(0)
+    ids = [f"post{rng.randrange(docs):06}" for _ in range(SAMPLE)]
+    posts = post_class.all().each()
+    # the first posts, which have comments
+    loaded = [next(posts) for _ in range(min(docs, SAMPLE))]
+    authors = author_class.all().to_a()
+    counter = iter(range(1 << 62))
+
+    def save():
+        for i in range(SAMPLE):
+            post_class.new(**post_data(docs + next(counter), width)).save()
+
+    def update():
+        for post in loaded:
+            post.update(views=post.views + 1)
+
+    return {
+        "find": (lambda: [post_class.find(id) for id in ids], len(ids)),
+        "iterate": (lambda: list(post_class.all().each()), docs),
+        "iterate_trusted": (lambda: list(post_class.all().trusted().each()), docs),
+        "as_json": (lambda: [post.as_json() for post in loaded], len(loaded)),
+        "as_json_recursive": (lambda: [post.as_json(recursive=True) for post in loaded], len(loaded)),
+        "update": (update, len(loaded)),
+        "belongs_to": (lambda: [post.benchauthor for post in loaded], len(loaded)),
+        "has_many": (lambda: [author.posts.to_a() for author in authors], len(authors)),
+        # last, since it adds documents
+        "save": (save, SAMPLE),
+    }
+
+
+def time_per_op(fn: Callable[[], object], ops: int, repeat: int) -> list[float]:
+    # warm up (indexes of the backend, pydantic validators, caches), then call fn enough times per sample that timer
+    # resolution and scheduling noise don't matter, like timeit.autorange()
+    started = time.perf_counter()
+    fn()
+    loops = max(1, math.ceil(MIN_SAMPLE_TIME / max(time.perf_counter() - started, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            times.append((time.perf_counter() - started) / (loops * max(ops, 1)))
+        finally:
+            gc.enable()
+    return times
+
+
+def run(doc_counts: list[int], widths: list[int], repeat: int, keyword: Optional[str] = None,
+        startup: bool = True) -> dict[str, dict[str, float]]:
+    """
+    Run the benchmarks matching the keyword.
+
+    Returns:
+        dict[str, dict[str, float]]: Benchmark names to the median and min seconds per operation.
+    """
+    results = {}
+    for width in widths:
+        models = make_models(width)
+        for docs in doc_counts:
+            db = MemoryClient()
+            FirestoreConnection().set_db(db)
+            FirestoreConnection().set_async_db(AsyncMemoryClient(db))
+            seed(db, models, docs, width)
+            for name, (fn, ops) in benchmarks(models, docs, width).items():
+                key = f"{name}[docs={docs},width={width}]"
+                if keyword is None or keyword in key:
+                    times = time_per_op(fn, ops, repeat)
+                    results[key] = {"median": statistics.median(times), "min": min(times)}
+                    _report(key, results[key])
+
+    if startup:
+        with tempfile.TemporaryDirectory() as model_dir:
+            write_models(model_dir, STARTUP_MODELS)
+            for name, code in SCENARIOS.items():
+                key = f"startup[{name}]"
+                if keyword is None or keyword in key:
+                    # the first run builds the index cache of lazy loading, like console_startup.py
+                    times = measure(code.format(model_dir=model_dir), repeat + 1)[1:]
+                    results[key] = {"median": statistics.median(times), "min": min(times)}
+                    _report(key, results[key])
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baselines: dict[str, dict[str, float]], threshold: float) -> list[str]:
+    """
+    Print the results next to the baselines.
+
+    Returns:
+        list[str]: The names of the benchmarks slower than threshold times their baseline.
+    """
+    regressions = []
+    print(f"\n{'benchmark':48} {'min':>10} {'baseline':>10} {'change':>8}")
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            print(f"{key:48} {_us(result['min']):>10} {'-':>10} {'new':>8}")
+            continue
+        ratio = result["min"] / baseline["min"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:48} {_us(result['min']):>10} {_us(baseline['min']):>10} {(ratio - 1) * 100:+7.1f}%{flag}")
+    return regressions
+
+
+def _report(key: str, result: dict[str, float]):
+    print(f"{key:48} {_us(result['median']):>10} (min {_us(result['min'])})", file=sys.stderr)
+
+
+def _us(seconds: float) -> str:
+    return f"{seconds * 1e6:.1f}us" if seconds < 1e-3 else f"{seconds * 1e3:.1f}ms"
+
+
+def _load_baselines(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"results": {}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', default="100,1000", help="Comma separated document counts.")
+    parser.add_argument('--widths', default="5,50", help="Comma separated numbers of extra fields per document.")
+    parser.add_argument('--repeat', type=int, default=5, help="The number of timed samples per benchmark. The fastest is compared, being the least disturbed by other processes.")
+    parser.add_argument('-k', dest="keyword", help="Only run the benchmarks whose name contains this string.")
+    parser.add_argument('--no-startup', action='store_true', help="Skip the console startup benchmarks.")
+    parser.add_argument('--baselines', default=BASELINES, help="The baseline file.")
+    parser.add_argument('--save', action='store_true', help="Store the results in the baseline file, keeping the other baselines.")
+    parser.add_argument('--check', action='store_true', help="Exit with 1 when a benchmark is slower than --threshold times its baseline.")
+    parser.add_argument('--threshold', type=float, default=1.25, help="The slowdown ratio reported as a regression.")
+    args = parser.parse_args()
+
+    results = run([int(n) for n in args.docs.split(",")], [int(n) for n in args.widths.split(",")], args.repeat,
+                  args.keyword, startup=not args.no_startup)
+    stored = _load_baselines(args.baselines)
+    regressions = compare(results, stored["results"], args.threshold)
+
+    if args.save:
+        stored["results"].update(results)
+        stored["machine"] = {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.machine()}
+        with open(args.baselines, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {len(results)} baselines to {args.baselines}")
+    if regressions:
+        print(f"{len(regressions)} benchmarks are slower than {args.threshold}x their baseline")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
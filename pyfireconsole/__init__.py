@@ -1,3 +1,29 @@
-from pyfireconsole.console.pyfireconsole import PyFireConsole  # noqa: F401
-from pyfireconsole.db.connection import FirestoreConnection  # noqa: F401
-from pyfireconsole.models.pyfire_model import DocumentRef, PyfireCollection, PyfireDoc  # noqa: F401
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pyfireconsole.console.pyfireconsole import PyFireConsole  # noqa: F401
+    from pyfireconsole.db.connection import FirestoreConnection  # noqa: F401
+    from pyfireconsole.models.pyfire_model import DocumentRef, PyfireCollection, PyfireDoc  # noqa: F401
+
+# The exports are imported on first access, so importing a submodule doesn't load the console and firestore client.
+_exports = {
+    "PyFireConsole": "pyfireconsole.console.pyfireconsole",
+    "FirestoreConnection": "pyfireconsole.db.connection",
+    "DocumentRef": "pyfireconsole.models.pyfire_model",
+    "PyfireCollection": "pyfireconsole.models.pyfire_model",
+    "PyfireDoc": "pyfireconsole.models.pyfire_model",
+}
+__all__ = list(_exports)
+
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError(f"module 'pyfireconsole' has no attribute '{name}'")
+    import importlib
+    value = getattr(importlib.import_module(_exports[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_exports))
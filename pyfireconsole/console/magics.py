@@ -0,0 +1,94 @@
+import time
+from typing import Optional
+
+from IPython.core.magic import Magics, line_cell_magic, line_magic, magics_class
+
+from pyfireconsole.db.connection import conn
+from pyfireconsole.models.pyfire_model import PyfireCollection, PyfireDoc
+
+
+@magics_class
+class PyFireMagics(Magics):
+    """
+    Profiling magics of the console.
+
+        %fsstats User.where("role", "==", "admin").to_a()   # reads, writes, requests and latency of the expression
+        %fsexplain User.where("role", "==", "admin")        # the queries a collection runs, without reading the documents
+    """
+
+    @line_cell_magic
+    def fsstats(self, line: str, cell: Optional[str] = None):
+        """
+        Run an expression (or a cell with %%fsstats) and print the Firestore requests it sent.
+        A PyfireCollection result is loaded, since building it alone doesn't query Firestore.
+        """
+        started = time.perf_counter()
+        with conn.measure() as metrics:
+            if cell is not None:
+                self.shell.ex(cell)
+                result = None
+            else:
+                result = self._eval(line)
+                if isinstance(result, PyfireCollection):
+                    result = result.to_a()
+        print(format_stats(metrics.stats(), time.perf_counter() - started))
+        return result
+
+    @line_magic
+    def fsexplain(self, line: str):
+        """
+        Print the Firestore queries of a PyfireCollection (or model class), the estimated reads and the composite indexes needed.
+        The estimate runs a count aggregation per query. Use `%fsexplain -n <expr>` to skip it.
+        """
+        count = True
+        if line.startswith("-n "):
+            count, line = False, line[3:]
+
+        coll = self._eval(line)
+        if isinstance(coll, type) and issubclass(coll, PyfireDoc):
+            coll = coll.all()
+        if not isinstance(coll, PyfireCollection):
+            print(f"%fsexplain expects a PyfireCollection, got {type(coll).__name__}")
+            return
+        print(coll.explain(count=count))
+
+    def _eval(self, line: str):
+        try:
+            return self.shell.ev(line)
+        except SyntaxError:
+            # statements like assignments
+            self.shell.ex(line)
+            return None
+
+
+def format_stats(stats: dict, elapsed: Optional[float] = None) -> str:
+    """
+    Format Metrics.stats() as a table, one row per collection.
+    """
+    header = ("collection", "rpcs", "reads", "writes", "deletes", "p50", "p95", "max")
+    rows = []
+    for name, coll in stats["collections"].items():
+        latency = coll["latency"]
+        rows.append((name, coll["rpcs"], coll["reads"], coll["writes"], coll["deletes"],
+                     _ms(latency["p50"]), _ms(latency["p95"]), _ms(latency["max"])))
+    rows.append(("total", stats["rpcs"], stats["reads"], stats["writes"], stats["deletes"], "", "", ""))
+
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    lines = ["  ".join(str(value).ljust(widths[i]) if i == 0 else str(value).rjust(widths[i]) for i, value in enumerate(row)).rstrip()
+             for row in [header] + rows]
+    if stats["errors"]:
+        lines.append(f"errors: {stats['errors']}")
+    if elapsed is not None:
+        lines.append(f"elapsed: {elapsed:.3f}s")
+    return "\n".join(lines)
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return "" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+
+def load_ipython_extension(ipython):
+    """
+    Register the magics in any IPython shell or notebook with `%load_ext pyfireconsole.console.magics`.
+    """
+    ipython.register_magics(PyFireMagics)
@@ -0,0 +1,158 @@
+import ast
+import glob
+import importlib.util
+import inspect
+import json
+import os
+from types import ModuleType
+from typing import Any, Optional
+
+INDEX_VERSION = 1
+INDEX_FILE = "pyfireconsole-index.json"
+
+
+def model_files(model_dir: str) -> list[str]:
+    return glob.glob(os.path.join(os.path.abspath(model_dir), '*.py'))
+
+
+def load_model_file(filename: str) -> tuple[ModuleType, list[type]]:
+    """
+    Execute a python file of the model directory as a module.
+
+    Returns:
+        tuple[ModuleType, list[type]]: The module and the classes defined in it.
+    """
+    module_name = os.path.splitext(os.path.basename(filename))[0]
+    spec = importlib.util.spec_from_file_location(module_name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    classes = [obj for _, obj in inspect.getmembers(module, inspect.isclass) if obj.__module__ == module_name]
+    return module, classes
+
+
+def scan_model_dir(model_dir: str, cache: bool = True) -> dict[str, str]:
+    """
+    Find the classes of the model directory without importing it, by parsing the top level class definitions of each file.
+    The result per file is cached in `__pycache__/pyfireconsole-index.json` of the directory and reused while the
+    modification time and size of the file are unchanged.
+
+    Args:
+        model_dir (str): The model directory.
+        cache (bool): Whether to read and write the index cache.
+
+    Returns:
+        dict[str, str]: Class names to the files defining them. The first file wins for duplicated names, like load_models().
+    """
+    cache_path = os.path.join(os.path.abspath(model_dir), "__pycache__", INDEX_FILE)
+    cached = _read_index(cache_path) if cache else {}
+
+    files = {}
+    for filename in model_files(model_dir):
+        stat = os.stat(filename)
+        entry = cached.get(filename)
+        if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "classes": _class_names(filename)}
+        files[filename] = entry
+
+    if cache and files != cached:
+        _write_index(cache_path, files)
+
+    index: dict[str, str] = {}
+    for filename, entry in files.items():
+        for name in entry["classes"]:
+            index.setdefault(name, filename)
+    return index
+
+
+class LazyModelNamespace(dict):
+    """
+    A namespace which imports a file of the model directory when one of its classes is first looked up.
+    Relationships with string class names are resolved as the files are loaded.
+    Classes created dynamically (not by a top level class statement) are found after their file is loaded.
+    """
+
+    def __init__(self, index: dict[str, str], *args, verbose: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index = index
+        self._loaded_files: set[str] = set()
+        self._resolving = False
+        self.verbose = verbose
+
+    def __missing__(self, name: str) -> Any:
+        filename = self._index.get(name)
+        if filename is None or filename in self._loaded_files:
+            raise KeyError(name)
+        self.load_file(filename)
+        return dict.__getitem__(self, name)
+
+    def __contains__(self, name) -> bool:
+        return dict.__contains__(self, name) or name in self._index
+
+    def get(self, name: str, default: Optional[Any] = None) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def load_file(self, filename: str):
+        from pyfireconsole.models.association import resolve_pyfire_model_names
+
+        self._loaded_files.add(filename)
+        module, classes = load_model_file(filename)
+        for obj in classes:
+            if not dict.__contains__(self, obj.__name__):
+                if self.verbose:
+                    print(f"Importing {obj.__name__} from {module.__name__}")
+                self[obj.__name__] = obj
+
+        # Class names in relationships are looked up in this namespace, which loads their files too.
+        # The outer call resolves the relationships added by nested loads.
+        if not self._resolving:
+            self._resolving = True
+            try:
+                resolve_pyfire_model_names(self)
+            finally:
+                self._resolving = False
+
+    def load_all(self):
+        for filename in dict.fromkeys(self._index.values()):
+            if filename not in self._loaded_files:
+                self.load_file(filename)
+
+    @property
+    def lazy_names(self) -> list[str]:
+        """
+        Class names of the model directory which are not imported yet.
+        """
+        return [name for name in self._index if not dict.__contains__(self, name)]
+
+
+def _class_names(filename: str) -> list[str]:
+    try:
+        with open(filename, "rb") as f:
+            tree = ast.parse(f.read(), filename)
+    except (SyntaxError, ValueError):
+        # import errors are reported when the file is loaded
+        return []
+    return [node.name for node in tree.body if isinstance(node, ast.ClassDef)]
+
+
+def _read_index(cache_path: str) -> dict[str, dict]:
+    try:
+        with open(cache_path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get("files", {}) if data.get("version") == INDEX_VERSION else {}
+
+
+def _write_index(cache_path: str, files: dict[str, dict]):
+    # the cache is an optimization. read only model directories just don't get one
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "files": files}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
@@ -1,18 +1,17 @@
-import glob
-import importlib.util
 import inspect
 import os
 import sys
 from typing import Optional
 
-from IPython.terminal.embed import InteractiveShellEmbed
-from IPython.terminal.ipapp import load_default_config
-from IPython.terminal.prompts import Prompts, Token
-
+from pyfireconsole.console.model_loader import LazyModelNamespace, load_model_file, model_files, scan_model_dir
 from pyfireconsole.models.association import resolve_pyfire_model_names
 
 
 def _generate_funny_prompt_config(prompt_char: str):
+    # IPython is imported when the console starts, importing pyfireconsole doesn't need it
+    from IPython.terminal.ipapp import load_default_config
+    from IPython.terminal.prompts import Prompts, Token
+
     class FirePrompts(Prompts):
         def in_prompt_tokens(self, cli=None):
             return [
@@ -27,39 +26,64 @@ def _generate_funny_prompt_config(prompt_char: str):
 
 
 class PyFireConsole:
-    def __init__(self, model_dir: Optional[str] = None):
+    def __init__(self, model_dir: Optional[str] = None, lazy: bool = False):
+        """
+        Args:
+            model_dir (str, optional): The directory of the model files.
+            lazy (bool): Import a model file when one of its classes is first used, instead of importing all of them at startup.
+        """
         self.model_dir = model_dir
+        self.lazy = lazy
 
-    def run(self, reset_global=False):
-        # Get the caller's global namespace
-        caller_globals = inspect.currentframe().f_back.f_globals
+    def load_models(self, namespace: dict, verbose: bool = True) -> dict:
+        """
+        Import all the classes in the model directory into `namespace` and resolve PyfireDoc relationships.
+        With lazy, the files are only scanned and a LazyModelNamespace holding `namespace` is returned instead.
+
+        Args:
+            namespace (dict): The namespace to add the classes to. Names already in it are kept.
+            verbose (bool): Whether to print the imported class names.
 
+        Returns:
+            dict: The namespace.
+        """
         # If a model directory is specified, add it to the system path
         if self.model_dir:
             module_path = os.path.abspath(self.model_dir)
             if module_path not in sys.path:
                 sys.path.append(module_path)
 
-            # Import all the python files as modules
-            for filename in glob.glob(os.path.join(module_path, '*.py')):
-                module_name = os.path.splitext(os.path.basename(filename))[0]
-                spec = importlib.util.spec_from_file_location(module_name, filename)
-                module = importlib.util.module_from_spec(spec)
+            if self.lazy:
+                namespace = LazyModelNamespace(scan_model_dir(module_path), namespace)
+                if verbose:
+                    print(f"{len(namespace.lazy_names)} model classes in {self.model_dir} are imported on first use")
+            else:
+                # Import all the python files as modules
+                for filename in model_files(module_path):
+                    module, classes = load_model_file(filename)
+                    # Import iff the class is not already in the namespace
+                    for obj in classes:
+                        if obj.__name__ not in namespace:
+                            if verbose:
+                                print(f"Importing {obj.__name__} from {module.__name__}")
+                            namespace[obj.__name__] = obj
 
-                spec.loader.exec_module(module)
+        # resolve all PyfireDoc relationships
+        resolve_pyfire_model_names(namespace)
+        return namespace
 
-                # Inspect all classes in the module and add them to global namespace
-                for _, obj in inspect.getmembers(module):
-                    # Import iff the object is a class and is not already in the global namespace
-                    if inspect.isclass(obj) and obj.__module__ == module_name and obj.__name__ not in caller_globals:
-                        print(f"Importing {obj.__name__} from {module_name}")
-                        caller_globals[obj.__name__] = obj
+    def run(self, reset_global=False):
+        from IPython.terminal.embed import InteractiveShellEmbed
 
-        # resolve all PyfireDoc relationships
-        resolve_pyfire_model_names(caller_globals)
+        from pyfireconsole.console.magics import PyFireMagics
+
+        # Get the caller's global namespace
+        caller_globals = inspect.currentframe().f_back.f_globals
+        # a lazy namespace is a copy: names assigned in the console are not set in the caller's globals
+        namespace = self.load_models(caller_globals)
 
         # Start the interactive shell
-        user_ns = None if reset_global else caller_globals
+        user_ns = None if reset_global else namespace
         ipshell = InteractiveShellEmbed.instance(
             banner1="\n==================== Welcome to PyFireConsole ====================\n",
             exit_msg="Bye",
@@ -67,4 +91,5 @@ class PyFireConsole:
             confirm_exit=False,
             config=_generate_funny_prompt_config('🔥'),
         )
+        ipshell.register_magics(PyFireMagics)
         ipshell()
@@ -1,6 +1,9 @@
 import argparse
+import sys
 
 from pyfireconsole import FirestoreConnection, PyFireConsole
+from pyfireconsole.db.rate_limiter import DEFAULT_OPS_PER_SECOND
+from pyfireconsole.models.pyfire_model import PyfireDoc
 
 
 def main():
@@ -8,11 +11,90 @@ def main():
     parser.add_argument('--model-dir', required=False, help="Path to the model directory.")
     parser.add_argument('--project-id', required=False, help="Project ID for FirestoreConnection.")
     parser.add_argument('--service_account_key_path', required=False, help="Key path for FirestoreConnection.")
+    parser.add_argument('--lazy', action='store_true', help="Import each model file on first use of its classes for a faster startup.")
+    parser.add_argument('--snapshot', required=False, help="Query a snapshot file written by the snapshot command instead of Firestore.")
+
+    subparsers = parser.add_subparsers(dest="command")
+    export_parser = subparsers.add_parser("export", help="Export a collection to a JSON Lines file.")
+    export_parser.add_argument('model', help="Model class name in the model directory. e.g. User")
+    export_parser.add_argument('output', help="Output path. Paths ending with '.gz' are gzip compressed. '-' writes to stdout.")
+    export_parser.add_argument('--recursive', action='store_true', help="Dump the sub collections of each document.")
+    export_parser.add_argument('--page-size', type=int, default=500, help="The number of documents fetched per request.")
+    export_parser.add_argument('--gzip', action='store_true', default=None, help="Gzip compress the output.")
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="Dump collections to a snapshot file, which --snapshot queries offline.")
+    snapshot_parser.add_argument('output', help="Output path of the snapshot file.")
+    snapshot_parser.add_argument('--collection', action='append', help="A collection path to dump. Can be repeated. Defaults to all root collections.")
+    snapshot_parser.add_argument('--no-recursive', action='store_true', help="Don't dump the sub collections of each document.")
+    snapshot_parser.add_argument('--page-size', type=int, default=500, help="The number of documents fetched per request.")
+
+    import_parser = subparsers.add_parser("import", help="Import a JSON Lines file into a collection.")
+    import_parser.add_argument('model', help="Model class name in the model directory. e.g. User")
+    import_parser.add_argument('input', help="Input path. Paths ending with '.gz' are read as gzip. '-' reads from stdin.")
+    import_parser.add_argument('--batch-size', type=int, default=500, help="The number of writes per batch. At most 500.")
+    import_parser.add_argument('--max-workers', type=int, default=1, help="The number of batches committed in parallel.")
+    import_parser.add_argument('--ops-per-second', type=float, default=DEFAULT_OPS_PER_SECOND, help="The initial write rate. 0 disables rate control.")
+    import_parser.add_argument('--no-ramp-up', action='store_true', help="Don't increase the write rate by 50%% every 5 minutes.")
 
     args = parser.parse_args()
 
-    FirestoreConnection().initialize(project_id=args.project_id, service_account_key_path=args.service_account_key_path)
-    PyFireConsole(model_dir=args.model_dir).run()
+    if args.snapshot:
+        if args.command in ("import", "snapshot"):
+            parser.error(f"{args.command} can't be used with --snapshot")
+        FirestoreConnection().open_snapshot(args.snapshot)
+    else:
+        FirestoreConnection().initialize(project_id=args.project_id, service_account_key_path=args.service_account_key_path)
+    if args.command == "export":
+        export(parser, args)
+    elif args.command == "import":
+        import_(parser, args)
+    elif args.command == "snapshot":
+        snapshot(args)
+    else:
+        PyFireConsole(model_dir=args.model_dir, lazy=args.lazy).run()
+
+
+def export(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    model_class = _load_model(parser, args)
+    output = sys.stdout.buffer if args.output == "-" and args.gzip else sys.stdout if args.output == "-" else args.output
+    count = model_class.all().export_jsonl(output, recursive=args.recursive, page_size=args.page_size, compress=args.gzip)
+    print(f"Exported {count} documents", file=sys.stderr)
+
+
+def snapshot(args: argparse.Namespace):
+    from pyfireconsole.db.snapshot import dump_snapshot
+
+    count = dump_snapshot(args.output, collections=args.collection, recursive=not args.no_recursive, page_size=args.page_size)
+    print(f"Dumped {count} documents to {args.output}", file=sys.stderr)
+
+
+def import_(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    model_class = _load_model(parser, args)
+    result = model_class.import_jsonl(
+        sys.stdin if args.input == "-" else args.input,
+        batch_size=args.batch_size,
+        max_workers=args.max_workers,
+        ops_per_second=args.ops_per_second or None,
+        ramp_up=not args.no_ramp_up,
+    )
+    for line_no, error in result.failed:
+        print(f"line {line_no}: {error}", file=sys.stderr)
+    for line_no in result.not_attempted:
+        print(f"line {line_no}: not attempted", file=sys.stderr)
+    print(f"Imported {result.imported} rows ({result.written} documents) in {result.elapsed:.1f}s, "
+          f"{result.ops_per_second:.1f} docs/s, {len(result.failed)} failed, {len(result.not_attempted)} not attempted",
+          file=sys.stderr)
+    if result.failed or result.not_attempted:
+        sys.exit(1)
+
+
+def _load_model(parser: argparse.ArgumentParser, args: argparse.Namespace) -> type[PyfireDoc]:
+    # only the files needed by the model are imported
+    models = PyFireConsole(model_dir=args.model_dir, lazy=True).load_models({}, verbose=False)
+    model_class = models.get(args.model)
+    if not (isinstance(model_class, type) and issubclass(model_class, PyfireDoc)):
+        parser.error(f"{args.model} is not a PyfireDoc model in the model directory")
+    return model_class
 
 
 if __name__ == '__main__':
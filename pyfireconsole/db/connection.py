@@ -1,8 +1,15 @@
-from typing import Optional
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, ContextManager, Generator, Optional
 
 from google.cloud import firestore
 from google.oauth2.service_account import Credentials as ServiceAccountCredentials  # type: ignore
 
+from pyfireconsole.db.doc_cache import DocCache
+from pyfireconsole.db.metrics import Metrics
+
+if TYPE_CHECKING:
+    from pyfireconsole.db.snapshot import SnapshotClient
+
 
 class NotConnectedException(Exception):
     pass
@@ -11,29 +18,179 @@ class NotConnectedException(Exception):
 class FirestoreConnection:
     _instance: Optional['FirestoreConnection'] = None
     db: Optional[firestore.Client] = None
+    async_db: Optional[firestore.AsyncClient] = None
+    cache: Optional[DocCache] = None
+    metrics: Optional[Metrics] = None
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls, *args, **kwargs)
             cls._instance.db = None  # デフォルトではdbオブジェクトはNoneとして初期化
+            cls._instance.async_db = None
+            cls._instance.cache = None
+            cls._instance.metrics = None
+            cls._instance._client_kwargs = None
         return cls._instance
 
     def initialize(self, project_id: Optional[str] = None, service_account_key_path: Optional[str] = None):
         if self.db is None:
             if service_account_key_path:
                 creds = ServiceAccountCredentials.from_service_account_file(service_account_key_path)
-                self.db = firestore.Client(credentials=creds, project=project_id)
+                self._client_kwargs = dict(credentials=creds, project=project_id)
             else:
-                self.db = firestore.Client(project=project_id)
+                self._client_kwargs = dict(project=project_id)
+            self.db = firestore.Client(**self._client_kwargs)
 
     def set_db(self, db):
+        """
+        Use another client. The async API is disconnected until set_async_db() is called, so it can't keep using the
+        database given to initialize().
+        """
         self.db = db
+        self.async_db = None
+        self._client_kwargs = None
+        if self.cache is not None:
+            self.cache.clear()
+
+    def set_async_db(self, db):
+        self.async_db = db
+        if self.cache is not None:
+            self.cache.clear()
+
+    def open_snapshot(self, path: str) -> 'SnapshotClient':
+        """
+        Query a snapshot file written by dump_snapshot() instead of Firestore. The snapshot is read only.
+
+        Args:
+            path (str): The snapshot file.
+
+        Returns:
+            SnapshotClient: The client, which is also used by the async API.
+        """
+        from pyfireconsole.db.memory_backend import AsyncMemoryClient
+        from pyfireconsole.db.snapshot import SnapshotClient
+
+        client = SnapshotClient(path)
+        self.set_db(client)
+        self.set_async_db(AsyncMemoryClient(client))
+        return client
+
+    def get_async_db(self):
+        # The AsyncClient is created on first use with the settings given to initialize().
+        if self.async_db is None and self._client_kwargs is not None:
+            self.async_db = firestore.AsyncClient(**self._client_kwargs)
+        if self.async_db is None:
+            raise NotConnectedException("FirestoreConnection is not initialized. Call initialize() first.")
+        return self.async_db
+
+    def enable_cache(self, max_size: int = 1000, ttl: Optional[float] = None) -> DocCache:
+        """
+        Cache documents read by id, so repeated lookups of the same document are served from memory.
+        Args:
+            max_size (int): The maximum number of cached documents. The least recently used ones are evicted.
+            ttl (float, optional): Seconds after which a cached document is read again. Defaults to no expiry.
+        Returns:
+            DocCache: The cache. Use stats() to read hit/miss statistics.
+        """
+        self.cache = DocCache(max_size=max_size, ttl=ttl)
+        return self.cache
+
+    def disable_cache(self):
+        self.cache = None
+
+    def enable_metrics(self, span_factory: Optional[Callable[[str, dict], ContextManager]] = None) -> Metrics:
+        """
+        Count the reads, writes, deletes and requests sent to Firestore per collection.
+        Args:
+            span_factory (Callable, optional): Called with a span name and attributes for every request.
+                The returned context manager wraps the request, e.g. an OpenTelemetry span.
+        Returns:
+            Metrics: The metrics. Use stats() to read the counters and add_hook() to receive every request.
+        """
+        self.metrics = Metrics(span_factory=span_factory)
+        return self.metrics
+
+    def disable_metrics(self):
+        self.metrics = None
+
+    @contextmanager
+    def measure(self) -> Generator[Metrics, None, None]:
+        """
+        Collect the requests sent inside the block into new Metrics, e.g.
+            with FirestoreConnection().measure() as metrics:
+                User.where("role", "==", "admin").to_a()
+            metrics.stats()
+        Metrics enabled with enable_metrics() keep counting as well.
+        """
+        scope = Metrics()
+        metrics = self.metrics
+        if metrics is None:
+            self.metrics = scope
+        else:
+            metrics.add_hook(scope.record)
+        try:
+            yield scope
+        finally:
+            if metrics is None:
+                self.metrics = None
+            else:
+                metrics.remove_hook(scope.record)
 
     def collection(self, collection_name):
         if self.db is None:
             raise NotConnectedException("FirestoreConnection is not initialized. Call initialize() first.")
         return self.db.collection(collection_name)
 
+    def batch(self):
+        if self.db is None:
+            raise NotConnectedException("FirestoreConnection is not initialized. Call initialize() first.")
+        return self.db.batch()
+
+    def write_option(self, **kwargs):
+        if self.db is None:
+            raise NotConnectedException("FirestoreConnection is not initialized. Call initialize() first.")
+        return self.db.write_option(**kwargs)
+
+    def get_all(self, references, field_paths=None):
+        if self.db is None:
+            raise NotConnectedException("FirestoreConnection is not initialized. Call initialize() first.")
+        return self.db.get_all(references, field_paths=field_paths)
+
+
+class AsyncFirestoreConnection:
+    """
+    The FirestoreConnection interface backed by firestore.AsyncClient.
+    Query builders work unchanged with it. Reads and writes of the returned references must be awaited.
+    """
+
+    def __init__(self, sync_conn: FirestoreConnection):
+        self.sync_conn = sync_conn
+
+    @property
+    def db(self):
+        return self.sync_conn.get_async_db()
+
+    @property
+    def cache(self) -> Optional[DocCache]:
+        return self.sync_conn.cache
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        return self.sync_conn.metrics
+
+    def collection(self, collection_name):
+        return self.db.collection(collection_name)
+
+    def batch(self):
+        return self.db.batch()
+
+    def write_option(self, **kwargs):
+        return self.db.write_option(**kwargs)
+
+    def get_all(self, references, field_paths=None):
+        return self.db.get_all(references, field_paths=field_paths)
+
 
 # global singleton instance
 conn = FirestoreConnection()
+async_conn = AsyncFirestoreConnection(conn)
@@ -0,0 +1,110 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class DocCache:
+    """
+    LRU cache of document data keyed by full document path (e.g. "users/123").
+    Entries older than `ttl` seconds are treated as missing. Writes through QueryRunner invalidate their entries once they complete.
+
+    Readers take the generation before reading Firestore and pass it to put(). Invalidating a path stamps it with a new
+    generation, so a document read before a write which completed in the meantime is not stored.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: Optional[float] = None):
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive integer")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # the generation of the last invalidation per path. The oldest are dropped past max_size paths and
+        # put() then treats every path as invalidated at _invalidated_floor.
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        self._invalidated_floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, path: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[path]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(path)
+            self.hits += 1
+        # callers own the returned data and may mutate it
+        return copy.deepcopy(entry[1])
+
+    def generation(self) -> int:
+        """
+        The current generation. Take it before reading the documents passed to put().
+        """
+        with self._lock:
+            return self._generation
+
+    def put(self, path: str, data: dict, generation: Optional[int] = None):
+        """
+        Store the data of a document.
+
+        Args:
+            path (str): The document path.
+            data (dict): The document data.
+            generation (int, optional): The generation taken before the data was read. The data isn't stored if the
+                path was invalidated since. None always stores it.
+        """
+        data = copy.deepcopy(data)
+        with self._lock:
+            if generation is not None and self._invalidated.get(path, self._invalidated_floor) > generation:
+                return
+            self._entries[path] = (time.monotonic(), data)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._entries.pop(path, None)
+            self._generation += 1
+            self._invalidated[path] = self._generation
+            self._invalidated.move_to_end(path)
+            while len(self._invalidated) > self.max_size:
+                _, generation = self._invalidated.popitem(last=False)
+                self._invalidated_floor = generation
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._invalidated.clear()
+            self._invalidated_floor = self._generation
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
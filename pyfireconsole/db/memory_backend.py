@@ -0,0 +1,936 @@
+import copy
+import random
+import string
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timezone
+from operator import itemgetter
+from typing import Any, AsyncGenerator, Generator, Iterable, Optional
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import Conflict, NotFound
+from google.cloud.firestore_v1 import transforms
+
+from pyfireconsole.db.values import order_key as _key
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+DOCUMENT_ID = "__name__"
+
+EQUALITY_OPERATORS = ("==", "in", "array_contains", "array_contains_any")
+RANGE_OPERATORS = ("<", "<=", ">", ">=")
+_OPERATOR_ALIASES = {"array-contains": "array_contains", "array-contains-any": "array_contains_any", "not_in": "not-in"}
+
+_first = itemgetter(0)
+
+
+class MemoryClient:
+    """
+    An in-memory Firestore for tests and offline work, with the subset of the google.cloud.firestore.Client API used by
+    PyFireConsole. Use it with FirestoreConnection().set_db(MemoryClient()).
+
+    Queries use per field indexes built on first use and maintained on writes: hash indexes for equality, "in" and array
+    filters, sorted indexes for range filters, order_by() and cursors. Queries which only need the first documents of an
+    ordered index stop reading there, so a limited query doesn't scan the collection.
+    Values are stored and ordered like Firestore: datetimes are returned as UTC DatetimeWithNanoseconds, and values of
+    different types are ordered null < bool < number < timestamp < string < bytes < reference < array < map.
+    """
+
+    def __init__(self):
+        self._collections: dict[str, _CollectionStore] = {}
+        self._lock = threading.RLock()
+
+    def collection(self, path: str) -> 'MemoryCollectionReference':
+        parts = _split_path(path)
+        if len(parts) % 2 == 0:
+            raise ValueError(f"A collection path must have an odd number of segments: {path}")
+        return MemoryCollectionReference(self, "/".join(parts))
+
+    def document(self, path: str) -> 'MemoryDocumentReference':
+        parts = _split_path(path)
+        if len(parts) % 2 == 1:
+            raise ValueError(f"A document path must have an even number of segments: {path}")
+        return self.collection("/".join(parts[:-1])).document(parts[-1])
+
+    def collections(self) -> list['MemoryCollectionReference']:
+        return [MemoryCollectionReference(self, path) for path in self._collection_paths() if "/" not in path]
+
+    def batch(self) -> 'MemoryWriteBatch':
+        return MemoryWriteBatch(self)
+
+    def write_option(self, exists: Optional[bool] = None, **kwargs) -> '_ExistsOption':
+        if kwargs or exists is None:
+            raise NotImplementedError("Only write_option(exists=...) is supported")
+        return _ExistsOption(exists)
+
+    def get_all(self, references: Iterable['MemoryDocumentReference'], field_paths: Optional[list[str]] = None,
+                transaction=None) -> Generator['MemoryDocumentSnapshot', None, None]:
+        for ref in references:
+            yield ref.get(field_paths=field_paths)
+
+    def reset(self):
+        with self._lock:
+            self._collections.clear()
+
+    def _collection_paths(self) -> list[str]:
+        # the paths of the collections with documents
+        with self._lock:
+            return [path for path, store in self._collections.items() if store.docs]
+
+    def _store(self, path: str, create: bool = False) -> Optional['_CollectionStore']:
+        store = self._collections.get(path)
+        if store is None and create:
+            store = self._collections[path] = _CollectionStore()
+        return store
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: MemoryClient, collection_path: str, id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self) -> 'MemoryCollectionReference':
+        return MemoryCollectionReference(self._client, self._collection_path)
+
+    def collection(self, name: str) -> 'MemoryCollectionReference':
+        return self._client.collection(f"{self.path}/{name}")
+
+    def collections(self) -> list['MemoryCollectionReference']:
+        prefix = f"{self.path}/"
+        return [MemoryCollectionReference(self._client, path) for path in self._client._collection_paths()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]]
+
+    def get(self, field_paths: Optional[list[str]] = None, transaction=None) -> 'MemoryDocumentSnapshot':
+        with self._client._lock:
+            store = self._client._store(self._collection_path)
+            data = None if store is None else store.docs.get(self.id)
+            return MemoryDocumentSnapshot(self, data, field_paths)
+
+    def set(self, document_data: dict, merge: bool = False):
+        batch = self._client.batch()
+        batch.set(self, document_data, merge=merge)
+        batch.commit()
+
+    def create(self, document_data: dict):
+        batch = self._client.batch()
+        batch.create(self, document_data)
+        batch.commit()
+
+    def update(self, field_updates: dict, option=None):
+        batch = self._client.batch()
+        batch.update(self, field_updates, option)
+        batch.commit()
+
+    def delete(self, option=None):
+        batch = self._client.batch()
+        batch.delete(self, option)
+        batch.commit()
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other._client is self._client and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def __repr__(self) -> str:
+        return f"MemoryDocumentReference({self.path!r})"
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference: MemoryDocumentReference, data: Optional[dict], field_paths: Optional[list[str]] = None):
+        self.reference = reference
+        self.exists = data is not None
+        self._data = data
+        self._field_paths = field_paths
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    def to_dict(self) -> Optional[dict]:
+        if self._data is None:
+            return None
+        if self._field_paths is None:
+            return _copy(self._data)
+        projected: dict = {}
+        for field_path in self._field_paths:
+            found, value = _get_field(self._data, field_path)
+            if found:
+                _set_field(projected, field_path, _copy(value))
+        return projected
+
+    def get(self, field_path: str) -> Any:
+        found, value = _get_field(self._data or {}, field_path)
+        if not found:
+            raise KeyError(field_path)
+        return _copy(value)
+
+
+class MemoryQuery:
+    """
+    An immutable query. The builder methods return new queries, like google.cloud.firestore.Query.
+    """
+
+    def __init__(self, client: MemoryClient, collection_path: str):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters: tuple[tuple[str, str, Any], ...] = ()
+        self._orders: tuple[tuple[str, str], ...] = ()
+        self._projection: Optional[tuple[str, ...]] = None
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._start_after: Optional[MemoryDocumentSnapshot | dict] = None
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None, *, filter=None) -> 'MemoryQuery':
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        op_string = _OPERATOR_ALIASES.get(op_string, op_string)
+        if op_string not in EQUALITY_OPERATORS + RANGE_OPERATORS + ("!=", "not-in"):
+            raise ValueError(f"Unsupported operator: {op_string}")
+        if op_string in ("in", "not-in", "array_contains_any") and not isinstance(value, (list, tuple)):
+            raise ValueError(f"'{op_string}' requires a list of values")
+        if field_path == DOCUMENT_ID:
+            value = [_document_id(v) for v in value] if isinstance(value, (list, tuple)) else _document_id(value)
+        else:
+            value = [_encode(v) for v in value] if op_string in ("in", "not-in", "array_contains_any") else _encode(value)
+        return self._copy(_filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> 'MemoryQuery':
+        if direction not in (ASCENDING, DESCENDING):
+            raise ValueError(f"Unknown direction: {direction}")
+        return self._copy(_orders=self._orders + ((field_path, direction),))
+
+    def select(self, field_paths: Iterable[str]) -> 'MemoryQuery':
+        return self._copy(_projection=tuple(field_paths))
+
+    def limit(self, count: int) -> 'MemoryQuery':
+        return self._copy(_limit=count)
+
+    def offset(self, num_to_skip: int) -> 'MemoryQuery':
+        return self._copy(_offset=num_to_skip)
+
+    def start_after(self, document_fields_or_snapshot: MemoryDocumentSnapshot | dict) -> 'MemoryQuery':
+        return self._copy(_start_after=document_fields_or_snapshot)
+
+    def stream(self, transaction=None) -> Generator[MemoryDocumentSnapshot, None, None]:
+        with self._client._lock:
+            store = self._client._store(self._collection_path)
+            if store is None:
+                return
+            snapshots = [MemoryDocumentSnapshot(self._document(id), store.docs[id], self._projection) for id in self._run(store)]
+        yield from snapshots
+
+    def get(self, transaction=None) -> list[MemoryDocumentSnapshot]:
+        return list(self.stream())
+
+    def count(self, alias: Optional[str] = None) -> '_MemoryAggregation':
+        return _MemoryAggregation(self, "count", None, alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> '_MemoryAggregation':
+        return _MemoryAggregation(self, "sum", field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> '_MemoryAggregation':
+        return _MemoryAggregation(self, "avg", field_ref, alias)
+
+    def _document(self, id: str) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection_path, id)
+
+    def _copy(self, **attrs) -> 'MemoryQuery':
+        query = copy.copy(self)
+        if isinstance(query, MemoryCollectionReference):
+            query.__class__ = MemoryQuery
+        query.__dict__.update(attrs)
+        return query
+
+    def _full_orders(self) -> list[tuple[str, str]]:
+        # Like Firestore, inequality fields are ordered after the explicit orders and the document name breaks ties
+        orders = list(self._orders)
+        ordered = {field for field, _ in orders}
+        direction = orders[-1][1] if orders else ASCENDING
+        for field in sorted({field for field, op, _ in self._filters if op not in EQUALITY_OPERATORS}):
+            if field not in ordered and field != DOCUMENT_ID:
+                orders.append((field, direction))
+                ordered.add(field)
+        if DOCUMENT_ID not in ordered:
+            orders.append((DOCUMENT_ID, direction))
+        return orders
+
+    def _run(self, store: '_CollectionStore') -> list[str]:
+        orders = self._full_orders()
+        stop = None if self._limit is None else self._offset + self._limit
+        cursor = None if self._start_after is None else self._cursor_key(store, orders)
+
+        candidates = None
+        for field, op, value in self._filters:
+            if op in EQUALITY_OPERATORS or (op in RANGE_OPERATORS and field != orders[0][0]):
+                ids = store.index(field).lookup(op, value)
+                candidates = ids if candidates is None else candidates & ids
+
+        first_field, first_direction = orders[0]
+        index = store.index(first_field)
+        lo, hi = index.bounds([(op, value) for field, op, value in self._filters if field == first_field and op in RANGE_OPERATORS + ("==",)])
+        if cursor is not None:
+            lo, hi = index.after(cursor[0], first_direction, lo, hi)
+
+        if candidates is not None and len(candidates) * 4 < hi - lo:
+            # a few candidates: sort them instead of walking the index
+            keyed = []
+            for id in candidates:
+                key = self._sort_key(store, id, orders)
+                if key is not None:
+                    keyed.append((key, id))
+            keyed.sort(key=_first)
+            ordered: Iterable[tuple[Any, str]] = keyed
+        else:
+            ordered = self._walk(store, index, lo, hi, orders, candidates)
+
+        result = []
+        for key, id in ordered:
+            if cursor is not None and key <= cursor:
+                continue
+            if not store.matches(id, self._filters):
+                continue
+            result.append(id)
+            if stop is not None and len(result) >= stop:
+                break
+        return result[self._offset:]
+
+    def _walk(self, store: '_CollectionStore', index: '_FieldIndex', lo: int, hi: int, orders: list[tuple[str, str]],
+              candidates: Optional[set[str]]) -> Generator[tuple[Any, str], None, None]:
+        direction = orders[0][1]
+        positions = range(lo, hi) if direction == ASCENDING else range(hi - 1, lo - 1, -1)
+        entries = (index.entries[i] for i in positions)
+        if len(orders) == 1:
+            # ordered by document id only
+            for key, id in entries:
+                if candidates is None or id in candidates:
+                    yield (_directed(id, direction),), id
+            return
+        if len(orders) == 2 and orders[1] == (DOCUMENT_ID, direction):
+            # the index is ordered by (value, id), which is the query order
+            for key, id in entries:
+                if candidates is None or id in candidates:
+                    yield (_directed(key, direction), _directed(id, direction)), id
+            return
+
+        # sort the documents with the same first value by the other orders
+        group: list[tuple[Any, str]] = []
+        group_key = object()
+        for key, id in entries:
+            if candidates is not None and id not in candidates:
+                continue
+            if key != group_key:
+                yield from sorted(group, key=_first)
+                group, group_key = [], key
+            sort_key = self._sort_key(store, id, orders)
+            if sort_key is not None:
+                group.append((sort_key, id))
+        yield from sorted(group, key=_first)
+
+    def _sort_key(self, store: '_CollectionStore', id: str, orders: list[tuple[str, str]]) -> Optional[tuple]:
+        # None if the document lacks an order field. Firestore doesn't return those documents.
+        key = []
+        for field, direction in orders:
+            if field == DOCUMENT_ID:
+                key.append(_directed(id, direction))
+                continue
+            found, value = store.field(id, field)
+            if not found:
+                return None
+            key.append(_directed(_key(value), direction))
+        return tuple(key)
+
+    def _cursor_key(self, store: '_CollectionStore', orders: list[tuple[str, str]]) -> tuple:
+        cursor = self._start_after
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            data, id = cursor._data or {}, cursor.id
+        else:
+            data, id = cursor, cursor.get(DOCUMENT_ID)
+        key = []
+        for field, direction in orders:
+            if field == DOCUMENT_ID:
+                if id is None:
+                    break
+                key.append(_directed(_document_id(id), direction))
+                continue
+            found, value = _get_field(data, field)
+            if not found:
+                raise ValueError(f"The cursor has no value for the order field {field}")
+            key.append(_directed(_key(_encode(value)), direction))
+        return tuple(key)
+
+
+class MemoryCollectionReference(MemoryQuery):
+    @property
+    def id(self) -> str:
+        return self._collection_path.rsplit("/", 1)[-1]
+
+    @property
+    def path(self) -> str:
+        return self._collection_path
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        if document_id is None:
+            document_id = "".join(random.choices(string.ascii_letters + string.digits, k=20))
+        if "/" in document_id:
+            return self._client.document(f"{self._collection_path}/{document_id}")
+        return MemoryDocumentReference(self._client, self._collection_path, document_id)
+
+    def list_documents(self) -> list[MemoryDocumentReference]:
+        with self._client._lock:
+            store = self._client._store(self._collection_path)
+            return [] if store is None else [self.document(id) for id in store.index(DOCUMENT_ID).ids()]
+
+
+class MemoryWriteBatch:
+    """
+    Writes applied atomically on commit(). Preconditions (update() of a missing document, create() of an existing one,
+    delete() with exists=True) are checked for all writes before any is applied.
+    """
+
+    def __init__(self, client: MemoryClient):
+        self._client = client
+        self._writes: list[tuple[str, MemoryDocumentReference, Any, Any]] = []
+
+    def set(self, reference: MemoryDocumentReference, document_data: dict, merge: bool = False):
+        self._writes.append(("merge" if merge else "set", reference, document_data, None))
+
+    def create(self, reference: MemoryDocumentReference, document_data: dict):
+        self._writes.append(("create", reference, document_data, None))
+
+    def update(self, reference: MemoryDocumentReference, field_updates: dict, option=None):
+        self._writes.append(("update", reference, field_updates, option))
+
+    def delete(self, reference: MemoryDocumentReference, option=None):
+        self._writes.append(("delete", reference, None, option))
+
+    def commit(self) -> list:
+        now = DatetimeWithNanoseconds.now(timezone.utc)
+        with self._client._lock:
+            docs = {}
+            for action, ref, data, option in self._writes:
+                store = self._client._store(ref._collection_path)
+                key = (ref._collection_path, ref.id)
+                current = docs[key] if key in docs else (None if store is None else store.docs.get(ref.id))
+                exists = option.exists if isinstance(option, _ExistsOption) else None
+                if action == "update" or exists is True:
+                    if current is None:
+                        raise NotFound(f"No document to update: {ref.path}")
+                if action == "create" or exists is False:
+                    if current is not None:
+                        raise Conflict(f"Document already exists: {ref.path}")
+                docs[key] = _apply_write(action, current, data, now)
+
+            for (collection_path, id), data in docs.items():
+                store = self._client._store(collection_path, create=data is not None)
+                if store is not None:
+                    store.put(id, data)
+        return [now] * len(self._writes)
+
+
+class _ExistsOption:
+    def __init__(self, exists: bool):
+        self.exists = exists
+
+
+class _AggregationResult:
+    def __init__(self, alias: str, value: Any):
+        self.alias = alias
+        self.value = value
+
+
+class _MemoryAggregation:
+    def __init__(self, query: MemoryQuery, kind: str, field: Optional[str], alias: Optional[str]):
+        self.query = query
+        self.kind = kind
+        self.field = field
+        self.alias = alias or kind
+
+    def get(self, transaction=None) -> list[list[_AggregationResult]]:
+        if self.kind == "count":
+            query = self.query
+            with query._client._lock:
+                store = query._client._store(query._collection_path)
+                if store is None:
+                    value = 0
+                elif not query._filters and not query._orders and query._start_after is None:
+                    value = max(0, len(store.docs) - query._offset)
+                    value = value if query._limit is None else min(value, query._limit)
+                else:
+                    value = len(query._run(store))
+            return [[_AggregationResult(self.alias, value)]]
+
+        values = []
+        for snapshot in self.query.stream():
+            found, value = _get_field(snapshot._data, self.field)
+            # Like Firestore, non numeric values are ignored.
+            if found and isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.append(value)
+        if self.kind == "sum":
+            return [[_AggregationResult(self.alias, sum(values))]]
+        return [[_AggregationResult(self.alias, sum(values) / len(values) if values else None)]]
+
+
+class _CollectionStore:
+    def __init__(self):
+        self.docs: dict[str, dict] = {}
+        self.indexes: dict[str, _FieldIndex] = {}
+
+    def put(self, id: str, data: Optional[dict]):
+        old = self.docs.get(id)
+        if old is None and data is None:
+            return
+        for field, index in self.indexes.items():
+            index.remove(id, old)
+            index.add(id, data)
+        if data is None:
+            del self.docs[id]
+        else:
+            self.docs[id] = data
+
+    def index(self, field: str) -> '_FieldIndex':
+        index = self.indexes.get(field)
+        if index is None:
+            index = _FieldIndex(field)
+            index.extend(self.field_values(field))
+            self.indexes[field] = index
+        return index
+
+    def field_values(self, field: str) -> Generator[tuple[str, Any], None, None]:
+        """
+        The ids and values of the documents which have the field.
+        """
+        for id, data in self.docs.items():
+            if field == DOCUMENT_ID:
+                yield id, id
+                continue
+            found, value = _get_field(data, field)
+            if found:
+                yield id, value
+
+    def field(self, id: str, field_path: str) -> tuple[bool, Any]:
+        return _get_field(self.docs[id], field_path)
+
+    def matches(self, id: str, filters: tuple[tuple[str, str, Any], ...]) -> bool:
+        for field, op, value in filters:
+            if field == DOCUMENT_ID:
+                found, actual = True, id
+            else:
+                found, actual = self.field(id, field)
+            if not found or not _compare(op, actual, value):
+                return False
+        return True
+
+
+class _FieldIndex:
+    """
+    Index of one field of a collection: a hash index of the value keys, a hash index of array elements, and a sorted list
+    of (value key, document id). Documents without the field are not indexed.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.entries: list[tuple[Any, str]] = []
+        self.values: dict[Any, set[str]] = {}
+        self.elements: dict[Any, set[str]] = {}
+
+    def _value_key(self, id: str, data: Optional[dict]) -> tuple[bool, Any, Any]:
+        if data is None:
+            return False, None, None
+        if self.field == DOCUMENT_ID:
+            return True, id, id
+        found, value = _get_field(data, self.field)
+        if not found:
+            return False, None, None
+        return True, _key(value), value
+
+    def add(self, id: str, data: Optional[dict]):
+        found, key, value = self._value_key(id, data)
+        if not found:
+            return
+        insort(self.entries, (key, id))
+        self._add_hashes(id, key, value)
+
+    def extend(self, values: Iterable[tuple[str, Any]]):
+        """
+        Add the (id, value) pairs of many documents, sorting the entries once.
+        """
+        for id, value in values:
+            key = id if self.field == DOCUMENT_ID else _key(value)
+            self.entries.append((key, id))
+            self._add_hashes(id, key, value)
+        self.entries.sort()
+
+    def _add_hashes(self, id: str, key: Any, value: Any):
+        self.values.setdefault(key, set()).add(id)
+        if isinstance(value, list):
+            for element in {_key(element) for element in value}:
+                self.elements.setdefault(element, set()).add(id)
+
+    def remove(self, id: str, data: Optional[dict]):
+        found, key, value = self._value_key(id, data)
+        if not found:
+            return
+        i = bisect_left(self.entries, (key, id))
+        if i < len(self.entries) and self.entries[i] == (key, id):
+            del self.entries[i]
+        _discard(self.values, key, id)
+        if isinstance(value, list):
+            for element in {_key(element) for element in value}:
+                _discard(self.elements, element, id)
+
+    def ids(self) -> list[str]:
+        return [id for _, id in self.entries]
+
+    def lookup(self, op: str, value: Any) -> set[str]:
+        """
+        The ids of the documents which may match the filter. The caller checks the filter on each of them.
+        """
+        key = (lambda v: v) if self.field == DOCUMENT_ID else _key
+        if op == "==":
+            return set(self.values.get(key(value), ()))
+        if op == "in":
+            return set().union(*(self.values.get(key(v), ()) for v in value))
+        if op == "array_contains":
+            return set(self.elements.get(_key(value), ()))
+        if op == "array_contains_any":
+            return set().union(*(self.elements.get(_key(v), ()) for v in value))
+        lo, hi = self.bounds([(op, value)])
+        return {id for _, id in self.entries[lo:hi]}
+
+    def bounds(self, filters: list[tuple[str, Any]]) -> tuple[int, int]:
+        """
+        The range of the sorted entries which may match "==" and range filters on this field.
+        """
+        lo, hi = 0, len(self.entries)
+        for op, value in filters:
+            key = value if self.field == DOCUMENT_ID else _key(value)
+            if self.field != DOCUMENT_ID and op != "==":
+                # range filters only match values of the same type
+                lo = max(lo, bisect_left(self.entries, key[:1], lo, hi, key=_first))
+                hi = min(hi, bisect_left(self.entries, (key[0] + 1,), lo, hi, key=_first))
+            if op in ("==", ">="):
+                lo = max(lo, bisect_left(self.entries, key, lo, hi, key=_first))
+            if op == ">":
+                lo = max(lo, bisect_right(self.entries, key, lo, hi, key=_first))
+            if op in ("==", "<="):
+                hi = min(hi, bisect_right(self.entries, key, lo, hi, key=_first))
+            if op == "<":
+                hi = min(hi, bisect_left(self.entries, key, lo, hi, key=_first))
+        return lo, max(lo, hi)
+
+    def after(self, cursor_key: Any, direction: str, lo: int, hi: int) -> tuple[int, int]:
+        """
+        Narrow the range to the entries from the cursor's value of this field, the first order field.
+        Entries with the same value are skipped by comparing the other order fields.
+        """
+        if direction == ASCENDING:
+            return max(lo, bisect_left(self.entries, cursor_key, lo, hi, key=_first)), hi
+        return lo, min(hi, bisect_right(self.entries, cursor_key.key, lo, hi, key=_first))
+
+
+class _Desc:
+    """
+    Reverses the order of a sort key, for descending orders.
+    """
+    __slots__ = ("key",)
+
+    def __init__(self, key: Any):
+        self.key = key
+
+    def __lt__(self, other: '_Desc') -> bool:
+        return other.key < self.key
+
+    def __le__(self, other: '_Desc') -> bool:
+        return other.key <= self.key
+
+    def __gt__(self, other: '_Desc') -> bool:
+        return other.key > self.key
+
+    def __ge__(self, other: '_Desc') -> bool:
+        return other.key >= self.key
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _Desc) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+
+def _directed(key: Any, direction: str) -> Any:
+    return key if direction == ASCENDING else _Desc(key)
+
+
+def _compare(op: str, actual: Any, value: Any) -> bool:
+    if op == "==":
+        return _key(actual) == _key(value)
+    if op == "!=":
+        return _key(actual) != _key(value)
+    if op == "in":
+        return _key(actual) in {_key(v) for v in value}
+    if op == "not-in":
+        return actual is not None and _key(actual) not in {_key(v) for v in value}
+    if op == "array_contains":
+        return isinstance(actual, list) and _key(value) in {_key(v) for v in actual}
+    if op == "array_contains_any":
+        return isinstance(actual, list) and bool({_key(v) for v in actual} & {_key(v) for v in value})
+
+    actual_key, key = _key(actual), _key(value)
+    # range filters only match values of the same type, and NaN matches none
+    if actual_key[0] != key[0] or actual_key[:2] == (2, 0) or key[:2] == (2, 0):
+        return False
+    if op == "<":
+        return actual_key < key
+    if op == "<=":
+        return actual_key <= key
+    if op == ">":
+        return actual_key > key
+    if op == ">=":
+        return actual_key >= key
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+def _apply_write(action: str, current: Optional[dict], data: Any, now: datetime) -> Optional[dict]:
+    if action == "delete":
+        return None
+    if action in ("set", "create"):
+        return _encode_document(data, now)
+    if action == "merge":
+        merged = _copy(current) if current is not None else {}
+        _merge(merged, data, now)
+        return merged
+
+    updated = _copy(current)
+    for field_path, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            _delete_field(updated, field_path)
+        else:
+            _set_field(updated, field_path, _encode(value, now))
+    return updated
+
+
+def _merge(target: dict, data: dict, now: datetime):
+    for name, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(name, None)
+        elif isinstance(value, dict) and isinstance(target.get(name), dict):
+            _merge(target[name], value, now)
+        else:
+            target[name] = _encode(value, now)
+
+
+def _encode_document(data: dict, now: datetime) -> dict:
+    if not isinstance(data, dict):
+        raise TypeError("Document data must be a dict")
+    return {name: _encode(value, now) for name, value in data.items()}
+
+
+def _encode(value: Any, now: Optional[datetime] = None) -> Any:
+    """
+    Convert a value to what Firestore stores, like the client library does.
+    """
+    if value is None or isinstance(value, (bool, int, float, str, bytes, MemoryDocumentReference)):
+        return value
+    if isinstance(value, datetime):
+        nanosecond = getattr(value, "nanosecond", 0)
+        # naive datetimes are UTC
+        value = value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+        fraction = {"nanosecond": nanosecond} if nanosecond else {"microsecond": value.microsecond}
+        return DatetimeWithNanoseconds(value.year, value.month, value.day, value.hour, value.minute, value.second,
+                                       tzinfo=timezone.utc, **fraction)
+    if isinstance(value, date):
+        raise TypeError(f"Cannot store a date, use a datetime: {value!r}")
+    if isinstance(value, dict):
+        return {str(k): _encode(v, now) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v, now) for v in value]
+    if value is transforms.SERVER_TIMESTAMP:
+        return now if now is not None else DatetimeWithNanoseconds.now(timezone.utc)
+    if value is transforms.DELETE_FIELD:
+        raise ValueError("DELETE_FIELD can only be used in update() and set(merge=True)")
+    if hasattr(value, "latitude") and hasattr(value, "longitude"):
+        return value
+    raise TypeError(f"Cannot store a value of type {type(value).__name__}")
+
+
+def _copy(value: Any) -> Any:
+    # stored values are immutable except dicts and lists
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _get_field(data: dict, field_path: str) -> tuple[bool, Any]:
+    if field_path in data:
+        return True, data[field_path]
+    value: Any = data
+    for key in field_path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return False, None
+        value = value[key]
+    return True, value
+
+
+def _set_field(data: dict, field_path: str, value: Any):
+    keys = field_path.split('.')
+    for key in keys[:-1]:
+        if not isinstance(data.get(key), dict):
+            data[key] = {}
+        data = data[key]
+    data[keys[-1]] = value
+
+
+def _delete_field(data: dict, field_path: str):
+    keys = field_path.split('.')
+    for key in keys[:-1]:
+        data = data.get(key)
+        if not isinstance(data, dict):
+            return
+    data.pop(keys[-1], None)
+
+
+def _discard(index: dict[Any, set[str]], key: Any, id: str):
+    ids = index.get(key)
+    if ids is not None:
+        ids.discard(id)
+        if not ids:
+            del index[key]
+
+
+def _document_id(value: Any) -> str:
+    if isinstance(value, MemoryDocumentReference):
+        return value.id
+    return str(value).rsplit("/", 1)[-1]
+
+
+def _split_path(path: str) -> list[str]:
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        raise ValueError("Empty path")
+    return parts
+
+
+class AsyncMemoryClient:
+    """
+    The firestore.AsyncClient interface over a MemoryClient, for FirestoreConnection().set_async_db().
+    """
+
+    def __init__(self, client: Optional[MemoryClient] = None):
+        self.client = client if client is not None else MemoryClient()
+
+    def collection(self, path: str) -> '_AsyncQuery':
+        return _AsyncQuery(self.client.collection(path))
+
+    def document(self, path: str) -> '_AsyncDocumentReference':
+        return _AsyncDocumentReference(self.client.document(path))
+
+    def batch(self) -> '_AsyncWriteBatch':
+        return _AsyncWriteBatch(self.client.batch())
+
+    def write_option(self, **kwargs) -> _ExistsOption:
+        return self.client.write_option(**kwargs)
+
+    async def get_all(self, references: Iterable['_AsyncDocumentReference'], field_paths: Optional[list[str]] = None,
+                      transaction=None) -> AsyncGenerator[MemoryDocumentSnapshot, None]:
+        for ref in references:
+            yield ref.reference.get(field_paths=field_paths)
+
+
+class _AsyncDocumentReference:
+    def __init__(self, reference: MemoryDocumentReference):
+        self.reference = reference
+        self.id = reference.id
+        self.path = reference.path
+
+    def collection(self, name: str) -> '_AsyncQuery':
+        return _AsyncQuery(self.reference.collection(name))
+
+    async def get(self, field_paths: Optional[list[str]] = None, transaction=None) -> MemoryDocumentSnapshot:
+        return self.reference.get(field_paths=field_paths)
+
+    async def set(self, document_data: dict, merge: bool = False):
+        self.reference.set(document_data, merge=merge)
+
+    async def create(self, document_data: dict):
+        self.reference.create(document_data)
+
+    async def update(self, field_updates: dict, option=None):
+        self.reference.update(field_updates, option)
+
+    async def delete(self, option=None):
+        self.reference.delete(option)
+
+
+class _AsyncQuery:
+    def __init__(self, query: MemoryQuery):
+        self.query = query
+
+    def document(self, document_id: Optional[str] = None) -> _AsyncDocumentReference:
+        return _AsyncDocumentReference(self.query.document(document_id))
+
+    def where(self, *args, **kwargs) -> '_AsyncQuery':
+        return _AsyncQuery(self.query.where(*args, **kwargs))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> '_AsyncQuery':
+        return _AsyncQuery(self.query.order_by(field_path, direction=direction))
+
+    def select(self, field_paths: Iterable[str]) -> '_AsyncQuery':
+        return _AsyncQuery(self.query.select(field_paths))
+
+    def limit(self, count: int) -> '_AsyncQuery':
+        return _AsyncQuery(self.query.limit(count))
+
+    def offset(self, num_to_skip: int) -> '_AsyncQuery':
+        return _AsyncQuery(self.query.offset(num_to_skip))
+
+    def start_after(self, document_fields_or_snapshot) -> '_AsyncQuery':
+        return _AsyncQuery(self.query.start_after(document_fields_or_snapshot))
+
+    async def stream(self, transaction=None) -> AsyncGenerator[MemoryDocumentSnapshot, None]:
+        for snapshot in self.query.stream():
+            yield snapshot
+
+    def count(self, alias: Optional[str] = None) -> '_AsyncAggregation':
+        return _AsyncAggregation(self.query.count(alias))
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> '_AsyncAggregation':
+        return _AsyncAggregation(self.query.sum(field_ref, alias))
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> '_AsyncAggregation':
+        return _AsyncAggregation(self.query.avg(field_ref, alias))
+
+
+class _AsyncAggregation:
+    def __init__(self, aggregation: _MemoryAggregation):
+        self.aggregation = aggregation
+
+    async def get(self, transaction=None) -> list[list[_AggregationResult]]:
+        return self.aggregation.get()
+
+
+class _AsyncWriteBatch:
+    def __init__(self, batch: MemoryWriteBatch):
+        self.batch = batch
+
+    def set(self, reference: _AsyncDocumentReference, document_data: dict, merge: bool = False):
+        self.batch.set(reference.reference, document_data, merge=merge)
+
+    def create(self, reference: _AsyncDocumentReference, document_data: dict):
+        self.batch.create(reference.reference, document_data)
+
+    def update(self, reference: _AsyncDocumentReference, field_updates: dict, option=None):
+        self.batch.update(reference.reference, field_updates, option)
+
+    def delete(self, reference: _AsyncDocumentReference, option=None):
+        self.batch.delete(reference.reference, option)
+
+    async def commit(self) -> list:
+        return self.batch.commit()
@@ -0,0 +1,251 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Generator, Optional
+
+# Upper bounds in seconds of the latency histogram buckets. The last bucket has no upper bound.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RPCEvent:
+    """
+    One request to Firestore. Passed to the hooks of Metrics after the request finished.
+    Reads are counted like Firestore bills them: one per returned document, and at least one per query or aggregation.
+    """
+
+    def __init__(self, op: str, collection: str):
+        self.op = op
+        self.collection = collection
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.latency = 0.0
+        self.error: Optional[BaseException] = None
+
+    def __repr__(self):
+        return (f"RPCEvent(op={self.op!r}, collection={self.collection!r}, reads={self.reads}, writes={self.writes}, "
+                f"deletes={self.deletes}, latency={self.latency:.4f}, error={self.error!r})")
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Returns the upper bound of the bucket holding the q-th percentile (0 < q <= 100), capped by the max latency.
+        """
+        if self.count == 0:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip(self.buckets + (float("inf"),), self.counts)),
+        }
+
+
+class _CollectionStats:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.rpcs = 0
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.errors = 0
+        self.ops: dict[str, int] = {}
+        self.latency = LatencyHistogram(buckets)
+
+    def to_dict(self) -> dict:
+        return {
+            "rpcs": self.rpcs,
+            "reads": self.reads,
+            "writes": self.writes,
+            "deletes": self.deletes,
+            "errors": self.errors,
+            "ops": dict(self.ops),
+            "latency": self.latency.to_dict(),
+        }
+
+
+class Metrics:
+    """
+    Counts the reads, writes, deletes and requests sent to Firestore per collection, with latency histograms.
+    Sub collections are grouped by their path without document ids, e.g. "books/*/tags".
+
+    Hooks are called with an RPCEvent after every request. `span_factory(name, attributes)` can return a context manager
+    wrapping every request, e.g. an OpenTelemetry span. Streamed queries get a span per batch of documents, named
+    "firestore.query.batch", because the caller runs between the batches:
+
+        tracer = trace.get_tracer("pyfireconsole")
+        Metrics(span_factory=lambda name, attributes: tracer.start_as_current_span(name, attributes=attributes))
+    """
+
+    def __init__(self, span_factory: Optional[Callable[[str, dict], ContextManager]] = None,
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.span_factory = span_factory
+        self.buckets = buckets
+        self._hooks: list[Callable[[RPCEvent], Any]] = []
+        self._collections: dict[str, _CollectionStats] = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[RPCEvent], Any]) -> Callable[[RPCEvent], Any]:
+        self._hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook: Callable[[RPCEvent], Any]):
+        self._hooks.remove(hook)
+
+    @contextmanager
+    def rpc(self, op: str, collection_key: str) -> Generator[RPCEvent, None, None]:
+        """
+        Measure a request. Set the reads, writes and deletes of the yielded event inside the block.
+        """
+        event = RPCEvent(op, _collection_group(collection_key))
+        with self._span(f"firestore.{op}", event) as span:
+            started = time.perf_counter()
+            try:
+                yield event
+            except Exception as e:
+                event.error = e
+                raise
+            finally:
+                event.latency = time.perf_counter() - started
+                self.record(event)
+                _set_counts(span, event.reads, event.writes, event.deletes)
+
+    def stream(self, op: str, collection_key: str) -> 'StreamRPC':
+        """
+        Measure a request whose results are read in batches, with the caller running between them.
+        See StreamRPC.
+        """
+        return StreamRPC(self, op, collection_key)
+
+    def record(self, event: RPCEvent):
+        with self._lock:
+            stats = self._collections.get(event.collection)
+            if stats is None:
+                stats = self._collections[event.collection] = _CollectionStats(self.buckets)
+            stats.rpcs += 1
+            stats.reads += event.reads
+            stats.writes += event.writes
+            stats.deletes += event.deletes
+            stats.errors += event.error is not None
+            stats.ops[event.op] = stats.ops.get(event.op, 0) + 1
+            stats.latency.observe(event.latency)
+
+        for hook in list(self._hooks):
+            hook(event)
+
+    def stats(self) -> dict:
+        """
+        Returns the totals and the per collection counters. Latencies are in seconds.
+        """
+        with self._lock:
+            collections = {name: stats.to_dict() for name, stats in sorted(self._collections.items())}
+        totals = {key: sum(stats[key] for stats in collections.values()) for key in ("rpcs", "reads", "writes", "deletes", "errors")}
+        return dict(totals, collections=collections)
+
+    def reset(self):
+        with self._lock:
+            self._collections.clear()
+
+    def _span(self, name: str, event: RPCEvent) -> ContextManager:
+        if self.span_factory is None:
+            return nullcontext()
+        return self.span_factory(name, {"db.system": "firestore", "db.operation": event.op, "db.collection": event.collection})
+
+
+class StreamRPC:
+    """
+    One streamed request, e.g. a query read with stream(). Each batch of results is read in a `batch()` block, and the
+    request is recorded once by `close()`, with the reads and the time spent in the batches as its latency.
+    The time the caller spends between the batches isn't part of the request.
+    """
+
+    def __init__(self, metrics: Optional[Metrics], op: str, collection_key: str):
+        self.metrics = metrics
+        self.event = RPCEvent(op, collection_key if metrics is None else _collection_group(collection_key))
+        self._closed = False
+
+    @contextmanager
+    def batch(self) -> Generator[RPCEvent, None, None]:
+        """
+        Measure reading a batch of the results. Add its reads to the yielded event inside the block.
+        """
+        span_cm = nullcontext() if self.metrics is None else self.metrics._span(f"firestore.{self.event.op}.batch", self.event)
+        reads = self.event.reads
+        with span_cm as span:
+            started = time.perf_counter()
+            try:
+                yield self.event
+            except Exception as e:
+                self.event.error = e
+                raise
+            finally:
+                self.event.latency += time.perf_counter() - started
+                _set_counts(span, self.event.reads - reads, 0, 0)
+
+    def close(self):
+        """
+        Record the request. Later calls do nothing.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.metrics is not None:
+            self.metrics.record(self.event)
+
+
+def track(metrics: Optional[Metrics], op: str, collection_key: str) -> ContextManager[RPCEvent]:
+    """
+    Metrics.rpc() if metrics are enabled. Otherwise the event is discarded.
+    """
+    if metrics is None:
+        return nullcontext(RPCEvent(op, collection_key))
+    return metrics.rpc(op, collection_key)
+
+
+def track_stream(metrics: Optional[Metrics], op: str, collection_key: str) -> StreamRPC:
+    """
+    Metrics.stream() if metrics are enabled. Otherwise the event is discarded.
+    """
+    if metrics is None:
+        return StreamRPC(None, op, collection_key)
+    return metrics.stream(op, collection_key)
+
+
+def _set_counts(span: Any, reads: int, writes: int, deletes: int):
+    if hasattr(span, "set_attribute"):
+        span.set_attribute("db.firestore.reads", reads)
+        span.set_attribute("db.firestore.writes", writes)
+        span.set_attribute("db.firestore.deletes", deletes)
+
+
+def _collection_group(collection_key: str) -> str:
+    # "books/123/tags" -> "books/*/tags"
+    parts = collection_key.split("/")
+    return "/".join(part if i % 2 == 0 else "*" for i, part in enumerate(parts))
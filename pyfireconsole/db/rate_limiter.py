@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Callable, Optional
+
+# The "500/50/5" rule for ramping up traffic to a new collection:
+# start at 500 operations per second and increase by 50% every 5 minutes.
+DEFAULT_OPS_PER_SECOND = 500
+RAMP_UP_RATE = 0.5
+RAMP_UP_INTERVAL = 5 * 60
+
+
+class RampRateLimiter:
+    """
+    Paces write operations to a rate which starts at `ops_per_second` and increases by `ramp_up_rate` every `ramp_up_interval` seconds.
+    acquire(n) blocks until n more operations fit in the current rate.
+    """
+
+    def __init__(self, ops_per_second: float = DEFAULT_OPS_PER_SECOND, ramp_up_rate: float = RAMP_UP_RATE,
+                 ramp_up_interval: float = RAMP_UP_INTERVAL, max_ops_per_second: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if ops_per_second <= 0:
+            raise ValueError("ops_per_second must be positive")
+        self.ops_per_second = ops_per_second
+        self.ramp_up_rate = ramp_up_rate
+        self.ramp_up_interval = ramp_up_interval
+        self.max_ops_per_second = max_ops_per_second
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+        self._next: float = 0.0
+
+    def rate(self) -> float:
+        """
+        Returns the current allowed operations per second.
+        """
+        if self._started is None:
+            return self.ops_per_second
+        steps = int((self._clock() - self._started) // self.ramp_up_interval) if self.ramp_up_rate > 0 else 0
+        rate = self.ops_per_second * (1 + self.ramp_up_rate) ** steps
+        if self.max_ops_per_second is not None:
+            rate = min(rate, self.max_ops_per_second)
+        return rate
+
+    def acquire(self, n: int = 1):
+        """
+        Wait until `n` operations can be sent.
+        """
+        with self._lock:
+            now = self._clock()
+            if self._started is None:
+                self._started = now
+                self._next = now
+
+            wait = self._next - now
+            if wait > 0:
+                self._sleep(wait)
+                now = self._clock()
+            self._next = max(self._next, now) + n / self.rate()
@@ -0,0 +1,543 @@
+import calendar
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from typing import IO, Any, Generator, Iterator, Optional
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import PermissionDenied
+from google.cloud.firestore_v1 import GeoPoint
+
+from pyfireconsole.db.connection import FirestoreConnection, NotConnectedException
+from pyfireconsole.db.memory_backend import DOCUMENT_ID, MemoryClient, MemoryWriteBatch, _CollectionStore, _encode, _FieldIndex
+from pyfireconsole.db.metrics import track
+from pyfireconsole.queries.page_query import PageQuery
+
+# A snapshot file is laid out as
+#   header     magic, version
+#   records    per document: id size (u16), id, the document as a map value
+#   tables     per collection: (record offset u64, record size u32) of each document, sorted by id
+#   keys       the map keys: count (u32), then size (u16) and utf-8 of each key
+#   directory  a map value: {"created_at": timestamp, "collections": {path: [table offset, document count]}}
+#   trailer    keys offset (u64), directory offset (u64), magic
+# Values are a tag byte followed by the value. Strings, bytes and references are prefixed with their size, arrays and
+# maps with their size and number of items, so a reader skips the fields it doesn't need. Map keys are indexes into the
+# key table. Integers are little endian.
+MAGIC = b"PFSNAP\x00\x00"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sI")
+_TRAILER = struct.Struct("<QQ8s")
+_ENTRY = struct.Struct("<QI")
+_ID = struct.Struct("<H")
+_SIZE = struct.Struct("<I")
+_CONTAINER = struct.Struct("<II")
+_INT = struct.Struct("<q")
+_DOUBLE = struct.Struct("<d")
+_TIMESTAMP = struct.Struct("<qI")
+_GEO = struct.Struct("<dd")
+
+_NULL, _TRUE, _FALSE, _INTEGER, _FLOAT, _TIME, _STRING, _BYTES, _REFERENCE, _GEOPOINT, _ARRAY, _MAP = b"NTFidtsbrgam"
+_FIXED_SIZES = {_NULL: 0, _TRUE: 0, _FALSE: 0, _INTEGER: 8, _FLOAT: 8, _TIME: _TIMESTAMP.size, _GEOPOINT: _GEO.size}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_first = itemgetter(0)
+
+
+def dump_snapshot(path: str, collections: Optional[list[str]] = None, recursive: bool = True, page_size: int = 500) -> int:
+    """
+    Write collections of the connected database to a snapshot file, which SnapshotClient queries offline.
+    Documents are read page by page and written as they arrive, so only one page is held in memory.
+    The file is written to a temporary path and moved into place when complete.
+
+    Args:
+        path (str): The output path.
+        collections (list[str], optional): The collection paths to dump. Defaults to all root collections.
+        recursive (bool): Whether to dump the sub collections of each document. Sub collections of documents which
+            don't exist themselves are not found.
+        page_size (int): The number of documents fetched per request.
+
+    Returns:
+        int: The number of written documents.
+    """
+    conn = FirestoreConnection()
+    if conn.db is None:
+        raise NotConnectedException("FirestoreConnection is not initialized. Call initialize() first.")
+    if collections is None:
+        collections = [coll.id for coll in conn.db.collections()]
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w+b") as fp:
+            writer = _SnapshotWriter(fp)
+            for collection_path in collections:
+                _dump_collection(conn, writer, collection_path.strip("/"), recursive, page_size)
+            writer.finish()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return writer.written
+
+
+def _dump_collection(conn: FirestoreConnection, writer: '_SnapshotWriter', collection_path: str, recursive: bool, page_size: int):
+    cursor = None
+    while True:
+        query = PageQuery(collection_path, page_size, cursor).set_conn(conn).exec()
+        with track(conn.metrics, "query", collection_path) as rpc:
+            snapshots = list(query.stream())
+            rpc.reads = max(len(snapshots), 1)
+        for snapshot in snapshots:
+            writer.add(collection_path, snapshot.id, snapshot.to_dict() or {})
+            if recursive:
+                for sub_collection in snapshot.reference.collections():
+                    _dump_collection(conn, writer, f"{collection_path}/{snapshot.id}/{sub_collection.id}", recursive, page_size)
+        if len(snapshots) < page_size:
+            return
+        cursor = snapshots[-1]
+
+
+class SnapshotClient(MemoryClient):
+    """
+    A read-only client of a snapshot file written by dump_snapshot(), with the queries of MemoryClient.
+    Use it with FirestoreConnection().open_snapshot(path).
+
+    The file is memory mapped: documents are decoded when a query returns them, and filters and orders decode only
+    their fields. Like MemoryClient, a field is indexed on its first query; the index holds the values of that field,
+    not the documents. Documents are ordered by id in the file, so queries without filters or orders read no index.
+    Writes raise PermissionDenied.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._file = _SnapshotFile(path, self)
+
+    @property
+    def created_at(self) -> datetime:
+        return self._file.created_at
+
+    def batch(self) -> '_ReadOnlyBatch':
+        return _ReadOnlyBatch(self)
+
+    def close(self):
+        with self._lock:
+            self._collections.clear()
+            self._file.close()
+
+    def __enter__(self) -> 'SnapshotClient':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _collection_paths(self) -> list[str]:
+        return [path for path, (_, count) in self._file.collections.items() if count]
+
+    def _store(self, path: str, create: bool = False) -> Optional[_CollectionStore]:
+        with self._lock:
+            store = self._collections.get(path)
+            if store is None and path in self._file.collections:
+                table, count = self._file.collections[path]
+                store = self._collections[path] = _SnapshotStore(self._file, table, count)
+            return store
+
+
+class _ReadOnlyBatch(MemoryWriteBatch):
+    def commit(self) -> list:
+        raise PermissionDenied(f"The snapshot {self._client.path} is read only")
+
+
+class _SnapshotFile:
+    def __init__(self, path: str, client: MemoryClient):
+        self.client = client
+        self._fp = open(path, "rb")
+        try:
+            size = os.fstat(self._fp.fileno()).st_size
+            if size < _HEADER.size + _TRAILER.size:
+                raise ValueError(f"{path} is not a snapshot file")
+            self.buf = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version = _HEADER.unpack_from(self.buf, 0)
+            keys_offset, directory_offset, end_magic = _TRAILER.unpack_from(self.buf, size - _TRAILER.size)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a snapshot file")
+            if version != VERSION:
+                raise ValueError(f"Unsupported snapshot version {version} of {path}")
+            if end_magic != MAGIC:
+                raise ValueError(f"The snapshot {path} is truncated")
+        except BaseException:
+            self._fp.close()
+            raise
+
+        count, = _SIZE.unpack_from(self.buf, keys_offset)
+        pos = keys_offset + _SIZE.size
+        self.keys: list[str] = []
+        for _ in range(count):
+            key_size, = _ID.unpack_from(self.buf, pos)
+            pos += _ID.size
+            self.keys.append(str(self.buf[pos:pos + key_size], "utf-8"))
+            pos += key_size
+        self.key_ids = {key: i for i, key in enumerate(self.keys)}
+
+        directory, _ = self.value(directory_offset)
+        self.created_at: datetime = directory["created_at"]
+        self.collections: dict[str, tuple[int, int]] = {path: (table, count) for path, (table, count) in directory["collections"].items()}
+
+    def close(self):
+        self.buf.close()
+        self._fp.close()
+
+    def record(self, table: int, i: int) -> tuple[str, int]:
+        """
+        The id and the position of the document at the index i of a collection table.
+        """
+        offset, _ = _ENTRY.unpack_from(self.buf, table + i * _ENTRY.size)
+        size, = _ID.unpack_from(self.buf, offset)
+        start = offset + _ID.size
+        return str(self.buf[start:start + size], "utf-8"), start + size
+
+    def value(self, pos: int) -> tuple[Any, int]:
+        """
+        Decode the value at pos. Returns the value and the position after it.
+        """
+        buf = self.buf
+        tag = buf[pos]
+        pos += 1
+        if tag == _MAP:
+            _, count = _CONTAINER.unpack_from(buf, pos)
+            pos += _CONTAINER.size
+            data = {}
+            for _ in range(count):
+                key, = _SIZE.unpack_from(buf, pos)
+                data[self.keys[key]], pos = self.value(pos + _SIZE.size)
+            return data, pos
+        if tag == _STRING:
+            size, = _SIZE.unpack_from(buf, pos)
+            pos += _SIZE.size
+            return str(buf[pos:pos + size], "utf-8"), pos + size
+        if tag == _INTEGER:
+            return _INT.unpack_from(buf, pos)[0], pos + _INT.size
+        if tag == _FLOAT:
+            return _DOUBLE.unpack_from(buf, pos)[0], pos + _DOUBLE.size
+        if tag == _TRUE:
+            return True, pos
+        if tag == _FALSE:
+            return False, pos
+        if tag == _NULL:
+            return None, pos
+        if tag == _TIME:
+            seconds, nanos = _TIMESTAMP.unpack_from(buf, pos)
+            value = _EPOCH + timedelta(seconds=seconds)
+            return DatetimeWithNanoseconds(value.year, value.month, value.day, value.hour, value.minute, value.second,
+                                           nanosecond=nanos, tzinfo=timezone.utc), pos + _TIMESTAMP.size
+        if tag == _ARRAY:
+            _, count = _CONTAINER.unpack_from(buf, pos)
+            pos += _CONTAINER.size
+            items = []
+            for _ in range(count):
+                item, pos = self.value(pos)
+                items.append(item)
+            return items, pos
+        if tag == _BYTES:
+            size, = _SIZE.unpack_from(buf, pos)
+            pos += _SIZE.size
+            return bytes(buf[pos:pos + size]), pos + size
+        if tag == _REFERENCE:
+            size, = _SIZE.unpack_from(buf, pos)
+            pos += _SIZE.size
+            return self.client.document(str(buf[pos:pos + size], "utf-8")), pos + size
+        if tag == _GEOPOINT:
+            latitude, longitude = _GEO.unpack_from(buf, pos)
+            return GeoPoint(latitude, longitude), pos + _GEO.size
+        raise ValueError(f"Corrupted snapshot: unknown value tag {tag} at {pos - 1}")
+
+    def field(self, pos: int, field_path: str) -> tuple[bool, Any]:
+        """
+        Decode one field of the document at pos, skipping the others. Dotted paths are nested fields, unless the
+        document has a field named with the dots.
+        """
+        value_pos = self._find(pos, field_path)
+        if value_pos < 0 and "." in field_path:
+            value_pos = pos
+            for key in field_path.split("."):
+                value_pos = self._find(value_pos, key)
+                if value_pos < 0:
+                    break
+        if value_pos < 0:
+            return False, None
+        return True, self.value(value_pos)[0]
+
+    def _find(self, pos: int, key: str) -> int:
+        # the position of the value of the key in the map at pos, or -1
+        key_id = self.key_ids.get(key)
+        buf = self.buf
+        if key_id is None or buf[pos] != _MAP:
+            return -1
+        _, count = _CONTAINER.unpack_from(buf, pos + 1)
+        pos += 1 + _CONTAINER.size
+        for _ in range(count):
+            key, = _SIZE.unpack_from(buf, pos)
+            pos += _SIZE.size
+            if key == key_id:
+                return pos
+            pos = self._skip(pos)
+        return -1
+
+    def _skip(self, pos: int) -> int:
+        tag = self.buf[pos]
+        size = _FIXED_SIZES.get(tag)
+        if size is not None:
+            return pos + 1 + size
+        size, = _SIZE.unpack_from(self.buf, pos + 1)
+        return pos + 1 + (_CONTAINER.size if tag in (_ARRAY, _MAP) else _SIZE.size) + size
+
+
+class _SnapshotStore(_CollectionStore):
+    """
+    A collection of a snapshot file. docs decodes documents on access.
+    """
+
+    def __init__(self, file: _SnapshotFile, table: int, count: int):
+        super().__init__()
+        self.file = file
+        self.table = table
+        self.count = count
+        self.entries = _SnapshotEntries(self)
+        self.docs = _SnapshotDocuments(self)  # type: ignore[assignment]
+        self.indexes[DOCUMENT_ID] = _SnapshotIdIndex(self)
+
+    def position(self, id: Any) -> int:
+        """
+        The index of the document in the table, or -1.
+        """
+        if not isinstance(id, str):
+            return -1
+        i = bisect_left(self.entries, id, key=_first)
+        return i if i < self.count and self.file.record(self.table, i)[0] == id else -1
+
+    def document(self, i: int) -> dict:
+        return self.file.value(self.file.record(self.table, i)[1])[0]
+
+    def field(self, id: str, field_path: str) -> tuple[bool, Any]:
+        i = self.position(id)
+        if i < 0:
+            raise KeyError(id)
+        return self.file.field(self.file.record(self.table, i)[1], field_path)
+
+    def field_values(self, field: str) -> Generator[tuple[str, Any], None, None]:
+        for i in range(self.count):
+            id, pos = self.file.record(self.table, i)
+            if field == DOCUMENT_ID:
+                yield id, id
+                continue
+            found, value = self.file.field(pos, field)
+            if found:
+                yield id, value
+
+    def put(self, id: str, data: Optional[dict]):
+        raise PermissionDenied("Snapshots are read only")
+
+
+class _SnapshotEntries(Sequence):
+    # the (id, id) entries of the document id index, read from the table
+    def __init__(self, store: _SnapshotStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return self._store.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._store.count))]
+        if i < 0:
+            i += self._store.count
+        if not 0 <= i < self._store.count:
+            raise IndexError(i)
+        id = self._store.file.record(self._store.table, i)[0]
+        return id, id
+
+
+class _SnapshotDocuments(Mapping):
+    def __init__(self, store: _SnapshotStore):
+        self._store = store
+
+    def __getitem__(self, id: str) -> dict:
+        i = self._store.position(id)
+        if i < 0:
+            raise KeyError(id)
+        return self._store.document(i)
+
+    def __contains__(self, id) -> bool:
+        return self._store.position(id) >= 0
+
+    def __len__(self) -> int:
+        return self._store.count
+
+    def __iter__(self) -> Iterator[str]:
+        return (id for id, _ in self._store.entries)
+
+
+class _SnapshotIdIndex(_FieldIndex):
+    """
+    The document id index of a snapshot collection, which is its table.
+    """
+
+    def __init__(self, store: _SnapshotStore):
+        super().__init__(DOCUMENT_ID)
+        self.entries = store.entries  # type: ignore[assignment]
+        self._store = store
+
+    def lookup(self, op: str, value: Any) -> set[str]:
+        if op == "==":
+            return {value} if value in self._store.docs else set()
+        if op == "in":
+            return {v for v in value if v in self._store.docs}
+        return super().lookup(op, value)
+
+
+class _SnapshotWriter:
+    def __init__(self, fp: IO[bytes]):
+        self.written = 0
+        self._fp = fp
+        self._offset = fp.write(_HEADER.pack(MAGIC, VERSION))
+        self._tables: dict[str, _TableBuilder] = {}
+        self._key_ids: dict[str, int] = {}
+
+    def add(self, collection_path: str, id: str, data: dict):
+        encoded_id = id.encode()
+        out = bytearray(_ID.pack(len(encoded_id)))
+        out += encoded_id
+        self._write_value(out, data)
+
+        table = self._tables.get(collection_path)
+        if table is None:
+            table = self._tables[collection_path] = _TableBuilder()
+        table.add(id, self._offset, len(out))
+        self._offset += self._fp.write(out)
+        self.written += 1
+
+    def finish(self):
+        self._fp.flush()
+        collections = {}
+        for collection_path, table in self._tables.items():
+            collections[collection_path] = [self._offset, len(table.offsets)]
+            entries = bytearray()
+            for i in table.order(self._fp):
+                entries += _ENTRY.pack(table.offsets[i], table.sizes[i])
+                if len(entries) >= 1 << 20:
+                    self._offset += self._fp.write(entries)
+                    entries = bytearray()
+            self._offset += self._fp.write(entries)
+
+        directory = bytearray()
+        self._write_value(directory, {"created_at": datetime.now(timezone.utc), "collections": collections})
+
+        keys_offset = self._offset
+        keys = bytearray(_SIZE.pack(len(self._key_ids)))
+        for key in self._key_ids:
+            encoded = key.encode()
+            keys += _ID.pack(len(encoded))
+            keys += encoded
+        self._offset += self._fp.write(keys)
+
+        directory_offset = self._offset
+        self._fp.write(directory)
+        self._fp.write(_TRAILER.pack(keys_offset, directory_offset, MAGIC))
+
+    def _write_value(self, out: bytearray, value: Any):
+        if value is None:
+            out.append(_NULL)
+        elif value is True:
+            out.append(_TRUE)
+        elif value is False:
+            out.append(_FALSE)
+        elif isinstance(value, int):
+            out.append(_INTEGER)
+            out += _INT.pack(value)
+        elif isinstance(value, float):
+            out.append(_FLOAT)
+            out += _DOUBLE.pack(value)
+        elif isinstance(value, str):
+            _write_sized(out, _STRING, value.encode())
+        elif isinstance(value, datetime):
+            value = _encode(value)
+            out.append(_TIME)
+            out += _TIMESTAMP.pack(calendar.timegm(value.utctimetuple()), value.nanosecond)
+        elif isinstance(value, dict):
+            start = _begin(out, _MAP)
+            for key, item in value.items():
+                key_id = self._key_ids.get(key)
+                if key_id is None:
+                    key_id = self._key_ids[key] = len(self._key_ids)
+                out += _SIZE.pack(key_id)
+                self._write_value(out, item)
+            _end(out, start, len(value))
+        elif isinstance(value, (list, tuple)):
+            start = _begin(out, _ARRAY)
+            for item in value:
+                self._write_value(out, item)
+            _end(out, start, len(value))
+        elif isinstance(value, bytes):
+            _write_sized(out, _BYTES, value)
+        elif isinstance(getattr(value, "path", None), str):
+            # document references
+            _write_sized(out, _REFERENCE, value.path.encode())
+        elif hasattr(value, "latitude") and hasattr(value, "longitude"):
+            out.append(_GEOPOINT)
+            out += _GEO.pack(value.latitude, value.longitude)
+        else:
+            raise TypeError(f"Cannot write a value of type {type(value).__name__} to a snapshot")
+
+
+class _TableBuilder:
+    # the records of a collection, in the order they were written
+    def __init__(self):
+        self.offsets = array("Q")
+        self.sizes = array("I")
+        self._last_id: Optional[str] = None
+        self._ordered = True
+
+    def add(self, id: str, offset: int, size: int):
+        if self._last_id is not None and id <= self._last_id:
+            self._ordered = False
+        self._last_id = id
+        self.offsets.append(offset)
+        self.sizes.append(size)
+
+    def order(self, fp: IO[bytes]) -> range | list[int]:
+        """
+        The record indexes ordered by id. Firestore returns documents ordered by id, so they are sorted unless the
+        database isn't Firestore. Then the ids are read back from the written file to sort them.
+        """
+        if self._ordered:
+            return range(len(self.offsets))
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            def id_at(i: int) -> str:
+                size, = _ID.unpack_from(buf, self.offsets[i])
+                start = self.offsets[i] + _ID.size
+                return str(buf[start:start + size], "utf-8")
+
+            return sorted(range(len(self.offsets)), key=id_at)
+
+
+def _write_sized(out: bytearray, tag: int, data: bytes):
+    out.append(tag)
+    out += _SIZE.pack(len(data))
+    out += data
+
+
+def _begin(out: bytearray, tag: int) -> int:
+    out.append(tag)
+    start = len(out)
+    out += bytes(_CONTAINER.size)
+    return start
+
+
+def _end(out: bytearray, start: int, count: int):
+    _CONTAINER.pack_into(out, start, len(out) - start - _CONTAINER.size, count)
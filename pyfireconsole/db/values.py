@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Any, Protocol, runtime_checkable
+
+
+@runtime_checkable
+class DocumentReferenceLike(Protocol):
+    """
+    A document reference of any client: firestore.DocumentReference, AsyncDocumentReference or the memory backend's.
+    """
+    path: str
+    id: str
+
+
+def order_key(value: Any) -> tuple:
+    """
+    Sort and equality key of a Firestore value, following Firestore's ordering of types:
+    null < boolean < number < timestamp < string < bytes < reference < geo point < array < map.
+    """
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        # NaN is ordered before all other numbers
+        return (2, 0, 0) if value != value else (2, 1, value)
+    if isinstance(value, datetime):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, list):
+        return (8, tuple(order_key(v) for v in value))
+    if isinstance(value, dict):
+        return (9, tuple((k, order_key(v)) for k, v in sorted(value.items())))
+    if isinstance(value, DocumentReferenceLike):
+        return (6, value.path)
+    # geo points
+    return (7, (getattr(value, "latitude", 0), getattr(value, "longitude", 0)), repr(value))
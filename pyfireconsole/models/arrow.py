@@ -0,0 +1,158 @@
+import json
+from datetime import date, datetime
+from types import NoneType, UnionType
+from typing import TYPE_CHECKING, Any, Callable, Optional, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+from pyfireconsole.models.jsonl import _json_default
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+    from pyfireconsole.models.pyfire_model import PyfireCollection, PyfireDoc
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError("pyarrow is required for Arrow and Parquet export. Install it with `pip install pyfireconsole[arrow]`") from e
+    return pyarrow
+
+
+def arrow_schema(model_class: Type['PyfireDoc'], fields: Optional[tuple[str, ...]] = None) -> 'pa.Schema':
+    """
+    Build an Arrow schema from the pydantic field annotations of a model.
+    str, int, float, bool, datetime and date map to the Arrow types, lists of them to list types.
+    DocumentRef fields hold the document path. Other types (dicts, nested models, unions) are stored as JSON strings.
+    Sub collections are not exported.
+
+    Args:
+        model_class (Type[PyfireDoc]): The model class.
+        fields (tuple[str, ...], optional): Only include these top level fields. The id is always included.
+
+    Returns:
+        pa.Schema: The schema.
+    """
+    pa = _import_pyarrow()
+    return _schema(pa, _columns(model_class, fields))
+
+
+def to_arrow(coll: 'PyfireCollection', page_size: int = 500) -> 'pa.Table':
+    """
+    Read a collection into an Arrow table, converting one page to a record batch at a time.
+    """
+    pa = _import_pyarrow()
+    columns = _columns(coll.model_class, coll._select_fields)
+    schema = _schema(pa, columns)
+    batches = [_record_batch(pa, schema, columns, page) for page in coll.iter_pages(page_size)]
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def to_parquet(coll: 'PyfireCollection', path: str, page_size: int = 500, compression: str = "snappy") -> int:
+    """
+    Write a collection to a Parquet file, one record batch per page. Only one page is held in memory.
+
+    Returns:
+        int: The number of written rows.
+    """
+    pa = _import_pyarrow()
+    columns = _columns(coll.model_class, coll._select_fields)
+    schema = _schema(pa, columns)
+    written = 0
+    with pa.parquet.ParquetWriter(path, schema, compression=compression) as writer:
+        for page in coll.iter_pages(page_size):
+            writer.write_batch(_record_batch(pa, schema, columns, page))
+            written += len(page)
+    return written
+
+
+def _schema(pa, columns: list[tuple[str, Any, Callable]]) -> 'pa.Schema':
+    return pa.schema([pa.field(name, arrow_type, nullable=True) for name, arrow_type, _ in columns])
+
+
+def _record_batch(pa, schema: 'pa.Schema', columns: list[tuple[str, Any, Callable]], docs: list['PyfireDoc']) -> 'pa.RecordBatch':
+    data = {}
+    for name, _, convert in columns:
+        data[name] = [_convert_value(convert, getattr(doc, name, None)) for doc in docs]
+    return pa.RecordBatch.from_pydict(data, schema=schema)
+
+
+def _convert_value(convert: Callable, value: Any) -> Any:
+    if value is None:
+        return None
+    return convert(value)
+
+
+def _columns(model_class: Type['PyfireDoc'], fields: Optional[tuple[str, ...]] = None) -> list[tuple[str, Any, Callable]]:
+    selected = None if fields is None else {field.split('.', 1)[0] for field in fields} | {"id"}
+    collections = model_class._meta().collection_names
+    columns = []
+    for name, field in model_class.model_fields.items():
+        if name in collections:
+            continue
+        if selected is not None and name not in selected:
+            continue
+        arrow_type, convert = _arrow_type(field.annotation)
+        columns.append((name, arrow_type, convert))
+    return columns
+
+
+def _arrow_type(annotation: Any) -> tuple[Any, Callable]:
+    pa = _import_pyarrow()
+    origin = get_origin(annotation)
+
+    # Optional[X] is nullable X, other unions are JSON strings
+    if origin in (Union, UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not NoneType]
+        if len(args) == 1:
+            return _arrow_type(args[0])
+        if all(_is_document_ref(arg) or arg is str for arg in args):
+            return pa.string(), _ref_or_str
+        return pa.string(), _to_json
+
+    if annotation is str:
+        return pa.string(), str
+    if annotation is bool:
+        return pa.bool_(), bool
+    if annotation is int:
+        return pa.int64(), int
+    if annotation is float:
+        return pa.float64(), float
+    if annotation is datetime:
+        return pa.timestamp("us", tz="UTC"), _identity
+    if annotation is date:
+        return pa.date32(), _identity
+    if _is_document_ref(annotation):
+        return pa.string(), _ref_or_str
+
+    if origin in (list, tuple, set) and len(get_args(annotation)) == 1:
+        item_type, convert = _arrow_type(get_args(annotation)[0])
+        if convert is not _to_json:
+            return pa.list_(item_type), lambda values: [_convert_value(convert, v) for v in values]
+
+    return pa.string(), _to_json
+
+
+def _is_document_ref(annotation: Any) -> bool:
+    from pyfireconsole.models.pyfire_model import DocumentRef
+
+    return isinstance(annotation, type) and issubclass(annotation, DocumentRef)
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _ref_or_str(value: Any) -> str:
+    if isinstance(value, BaseModel) and hasattr(value, "path"):
+        return value.path
+    return str(value)
+
+
+def _to_json(value: Any) -> str:
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    return json.dumps(value, default=_json_default, ensure_ascii=False)
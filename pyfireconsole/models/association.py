@@ -1,13 +1,17 @@
-from typing import Any, Optional, Type, Union
+from typing import Any, Iterable, Optional, Type, Union
 
 import inflection
 
-from pyfireconsole.models.pyfire_model import PyfireDoc
+from pyfireconsole.models.pyfire_model import PyfireDoc, _clear_model_metas
 
 # Pending relationships (defined with string class names) are stored here.
 # call resolve_pyfire_model_names() to resolve them.
 _pending_relationships: list[Any] = []
 
+# Applied relationships per model class: {cls: {attr_name: (relationship_type, model_class, db_field)}}
+# preload_associations() uses this to batch load the targets.
+_associations: dict[type, dict[str, tuple[str, Type[PyfireDoc], str]]] = {}
+
 
 def belongs_to(model_class_or_name: Union[str, Type[PyfireDoc]], db_field: str, attr_name: Optional[str] = None):
     def decorator(cls):
@@ -60,41 +64,113 @@ def resolve_pyfire_model_names(global_context: dict[str, Any]):
             elif relationship_type == "has_many":
                 _apply_has_many(model_class, db_field, attr)(cls)
     _pending_relationships = []
+    _clear_model_metas()
 
 
 def _apply_belongs_to(model_class: Type[PyfireDoc], db_field: str, attr: Optional[str] = None):
     def decorator(cls):
+        attr_name = attr or model_class.__name__.lower()
+
         def getter_method(self):
+            if self._preloaded is not None and attr_name in self._preloaded:
+                return self._preloaded[attr_name]
+
             model_id = getattr(self, db_field)
             if model_id:
                 return model_class.find(model_id)
             else:
                 return None
 
-        attr_name = attr or model_class.__name__.lower()
         setattr(cls, attr_name, property(getter_method))
+        _register_association(cls, attr_name, "belongs_to", model_class, db_field)
         return cls
     return decorator
 
 
 def _apply_has_one(model_class: Type[PyfireDoc], db_field: str, attr: Optional[str] = None):
     def decorator(cls):
+        attr_name = attr or model_class.__name__.lower()
+
         def getter_method(self):
+            if self._preloaded is not None and attr_name in self._preloaded:
+                return self._preloaded[attr_name]
+
             model_instance = model_class.where(db_field, "==", self.id).first()
             return model_instance
 
-        attr_name = attr or model_class.__name__.lower()
         setattr(cls, attr_name, property(getter_method))
+        _register_association(cls, attr_name, "has_one", model_class, db_field)
         return cls
     return decorator
 
 
 def _apply_has_many(model_class: Type[PyfireDoc], db_field: str, attr: Optional[str] = None):
     def decorator(cls):
+        attr_name = attr or inflection.pluralize(model_class.__name__.lower())
+
         def getter_method(self):
+            if self._preloaded is not None and attr_name in self._preloaded:
+                return self._preloaded[attr_name]
+
             return model_class.where(db_field, "==", self.id)
 
-        attr_name = attr or inflection.pluralize(model_class.__name__.lower())
         setattr(cls, attr_name, property(getter_method))
+        _register_association(cls, attr_name, "has_many", model_class, db_field)
         return cls
     return decorator
+
+
+def _register_association(cls, attr_name: str, relationship_type: str, model_class: Type[PyfireDoc], db_field: str):
+    _associations.setdefault(cls, {})[attr_name] = (relationship_type, model_class, db_field)
+    _clear_model_metas()
+
+
+def _find_association(cls, attr_name: str) -> tuple[str, Type[PyfireDoc], str]:
+    association = cls._meta().associations.get(attr_name)
+    if association is None:
+        raise AttributeError(f"'{cls.__name__}' has no association '{attr_name}'")
+    return association
+
+
+def preload_associations(docs: list[PyfireDoc], attr_names: Iterable[str]):
+    """
+    Batch load the associations of the given documents and attach them, so accessing them does not hit Firestore.
+    belongs_to targets are fetched with batched get_all() calls, has_one and has_many targets with chunked "in" queries.
+    """
+    if not docs:
+        return
+
+    for attr_name in attr_names:
+        relationship_type, model_class, db_field = _find_association(type(docs[0]), attr_name)
+        if relationship_type == "belongs_to":
+            model_ids = [getattr(doc, db_field) for doc in docs if getattr(doc, db_field)]
+            targets = model_class._find_existing(list(dict.fromkeys(model_ids)))
+            for doc in docs:
+                model_id = getattr(doc, db_field)
+                if not model_id:
+                    _attach(doc, attr_name, None)
+                elif model_id in targets:
+                    _attach(doc, attr_name, targets[model_id])
+        else:
+            children = _load_children(model_class, db_field, list(dict.fromkeys(doc.id for doc in docs)))
+            for doc in docs:
+                if relationship_type == "has_one":
+                    _attach(doc, attr_name, children[doc.id][0] if children.get(doc.id) else None)
+                else:
+                    coll = model_class.where(db_field, "==", doc.id)
+                    coll._loaded = children.get(doc.id, [])
+                    _attach(doc, attr_name, coll)
+
+
+def _load_children(model_class: Type[PyfireDoc], db_field: str, parent_ids: list[str]) -> dict[str, list[PyfireDoc]]:
+    children: dict[str, list[PyfireDoc]] = {}
+    # "in" filters over the disjunction limit are split by the query
+    for child in model_class.where(db_field, "in", parent_ids).each():
+        children.setdefault(getattr(child, db_field), []).append(child)
+    return children
+
+
+def _attach(doc: PyfireDoc, attr_name: str, value: Any):
+    if doc._preloaded is None:
+        doc._preloaded = {}
+    doc._preloaded[attr_name] = value
@@ -0,0 +1,206 @@
+import gzip
+import json
+import time
+from contextlib import nullcontext
+from datetime import date, datetime
+from typing import IO, TYPE_CHECKING, Iterable, Optional, Type
+
+from pydantic import BaseModel
+
+from pyfireconsole.db.rate_limiter import DEFAULT_OPS_PER_SECOND, RampRateLimiter
+from pyfireconsole.queries.batch_write_query import MAX_BATCH_SIZE, WriteOp
+from pyfireconsole.queries.query_runner import QueryRunner
+
+if TYPE_CHECKING:
+    from pyfireconsole.models.pyfire_model import PyfireCollection, PyfireDoc
+
+
+def export_jsonl(coll: 'PyfireCollection', path_or_fp: str | IO, recursive: bool = False, page_size: int = 500,
+                 compress: Optional[bool] = None, include: list[str] = [], excepts: list[str] = []) -> int:
+    """
+    Write the documents of a collection to JSON Lines, one document per line, page by page.
+    Only one page of documents is held in memory.
+
+    Args:
+        coll (PyfireCollection): The collection to export.
+        path_or_fp (str | IO): The output path or a file object.
+        recursive (bool): Whether to dump the sub collections of each document.
+        page_size (int): The number of documents fetched per request.
+        compress (bool, optional): Whether to gzip the output. Defaults to True for paths ending with ".gz".
+        include (list[str]): A list of fields to include in the dump.
+        excepts (list[str]): A list of fields to exclude from the dump.
+
+    Returns:
+        int: The number of written documents.
+    """
+    if isinstance(path_or_fp, str):
+        if compress is None:
+            compress = path_or_fp.endswith(".gz")
+        with (gzip.open(path_or_fp, "wt", encoding="utf-8") if compress else open(path_or_fp, "w", encoding="utf-8")) as fp:
+            return _write_jsonl(coll, fp, recursive, page_size, include, excepts)
+
+    if compress:
+        with gzip.open(path_or_fp, "wt", encoding="utf-8") as fp:
+            return _write_jsonl(coll, fp, recursive, page_size, include, excepts)
+    return _write_jsonl(coll, path_or_fp, recursive, page_size, include, excepts)
+
+
+def _write_jsonl(coll: 'PyfireCollection', fp: IO, recursive: bool, page_size: int, include: list[str], excepts: list[str]) -> int:
+    written = 0
+    for page in coll.iter_pages(page_size):
+        for doc in page:
+            fp.write(json.dumps(doc.as_json(recursive, list(include), excepts), default=_json_default, ensure_ascii=False) + "\n")
+        written += len(page)
+    return written
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return str(value)
+
+
+class ImportResult:
+    """
+    The report of import_jsonl().
+
+    Attributes:
+        imported (int): The number of imported rows.
+        written (int): The number of written documents, including sub collection documents.
+        failed (list[tuple[int, str]]): The line numbers and errors of the rows which were not imported.
+            A failed commit may have been partially applied, so some of its rows may exist. Rows without an id were
+            added with auto ids, and importing them again may duplicate their documents.
+        not_attempted (list[int]): The line numbers of the rows which were not written because an earlier chunk of
+            writes in the same window failed. They can be imported again safely.
+        elapsed (float): The import time in seconds.
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.written = 0
+        self.failed: list[tuple[int, str]] = []
+        self.not_attempted: list[int] = []
+        self.elapsed = 0.0
+
+    @property
+    def ops_per_second(self) -> float:
+        return self.written / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return (f"ImportResult(imported={self.imported}, written={self.written}, failed={len(self.failed)}, "
+                f"not_attempted={len(self.not_attempted)}, elapsed={self.elapsed:.2f}s, ops_per_second={self.ops_per_second:.1f})")
+
+
+def import_jsonl(model_class: Type['PyfireDoc'], path_or_fp: str | IO, batch_size: int = MAX_BATCH_SIZE, max_workers: int = 1,
+                 ops_per_second: Optional[float] = DEFAULT_OPS_PER_SECOND, ramp_up: bool = True, compress: Optional[bool] = None) -> ImportResult:
+    """
+    Import a JSON Lines file written by export_jsonl() into the collection of `model_class`.
+    Rows are read and validated one at a time and written with batched writes.
+    Rows which are not valid JSON or fail the model validation are skipped and reported.
+    The rows of a chunk of writes which fails to commit are reported as failed, and the later chunks of the same window
+    are not attempted.
+
+    Args:
+        model_class (Type[PyfireDoc]): The model of the rows.
+        path_or_fp (str | IO): The input path or a text file object.
+        batch_size (int): The number of writes per batch. At most 500.
+        max_workers (int): The number of batches committed in parallel.
+        ops_per_second (float, optional): The initial write rate. None disables rate control.
+        ramp_up (bool): Whether to increase the rate by 50% every 5 minutes (the 500/50/5 rule).
+        compress (bool, optional): Whether the input is gzipped. Defaults to True for paths ending with ".gz".
+
+    Returns:
+        ImportResult: The number of imported rows, the throughput and the failed rows.
+    """
+    limiter = None
+    if ops_per_second is not None:
+        limiter = RampRateLimiter(ops_per_second, ramp_up_rate=0.5 if ramp_up else 0)
+
+    if isinstance(path_or_fp, str):
+        if compress is None:
+            compress = path_or_fp.endswith(".gz")
+        fp = gzip.open(path_or_fp, "rt", encoding="utf-8") if compress else open(path_or_fp, "r", encoding="utf-8")
+    else:
+        fp = nullcontext(path_or_fp)
+
+    result = ImportResult()
+    started = time.monotonic()
+    window = batch_size * max_workers
+    rows: list[tuple[int, list[WriteOp]]] = []
+    pending = 0
+    with fp as lines:
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                ops = _row_ops(model_class, json.loads(line), model_class.collection_name())
+            except Exception as e:
+                result.failed.append((line_no, str(e)))
+                continue
+
+            rows.append((line_no, ops))
+            pending += len(ops)
+            if pending >= window:
+                _write_rows(rows, batch_size, max_workers, limiter, result)
+                rows, pending = [], 0
+
+        _write_rows(rows, batch_size, max_workers, limiter, result)
+
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+def _row_ops(model_class: Type['PyfireDoc'], data: dict, collection_key: str) -> list[WriteOp]:
+    # sub collections dumped by a recursive export
+    children = []
+    for name, child_class in model_class._meta().collections:
+        if isinstance(data.get(name), list):
+            children.append((child_class, name, data.pop(name)))
+
+    doc = model_class(**data)
+    action, doc_data = doc._pending_write()
+    ops = [WriteOp(action, collection_key, doc.id, doc_data)]
+
+    if children and doc.id is None:
+        raise ValueError("id is required to import sub collections")
+    for child_class, name, child_rows in children:
+        child_key = f"{collection_key}/{doc.id}/{child_class.collection_name()}"
+        for child in child_rows:
+            ops.extend(_row_ops(child_class, child, child_key))
+    return ops
+
+
+def _write_rows(rows: list[tuple[int, list[WriteOp]]], batch_size: int, max_workers: int,
+                limiter: Optional[RampRateLimiter], result: ImportResult):
+    chunks = list(_chunks(rows, batch_size * max_workers))
+    for i, chunk in enumerate(chunks):
+        ops = [op for _, row_ops in chunk for op in row_ops]
+        if limiter is not None:
+            limiter.acquire(len(ops))
+        try:
+            QueryRunner.bulk_write(ops, batch_size, max_workers)
+        except Exception as e:
+            # only the rows of this chunk may have been partially applied. the earlier chunks are committed.
+            result.failed.extend((line_no, str(e)) for line_no, _ in chunk)
+            result.not_attempted.extend(line_no for later in chunks[i + 1:] for line_no, _ in later)
+            return
+
+        result.imported += len(chunk)
+        result.written += len(ops)
+
+
+def _chunks(rows: list[tuple[int, list[WriteOp]]], size: int) -> Iterable[list[tuple[int, list[WriteOp]]]]:
+    # whole rows of at most `size` writes, so a failure is reported for the rows of its chunk only.
+    # a row with more writes is a chunk by itself.
+    chunk: list[tuple[int, list[WriteOp]]] = []
+    count = 0
+    for row in rows:
+        if chunk and count + len(row[1]) > size:
+            yield chunk
+            chunk, count = [], 0
+        chunk.append(row)
+        count += len(row[1])
+    if chunk:
+        yield chunk
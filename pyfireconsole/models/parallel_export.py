@@ -0,0 +1,44 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from pyfireconsole.models.pyfire_model import PyfireCollection, PyfireDoc
+
+
+def export_parallel(docs: Iterable['PyfireDoc'], include: list[str], excepts: list[str], max_workers: int) -> list[dict]:
+    """
+    Dump documents with their subcollections like as_json(recursive=True), fetching subcollections concurrently.
+
+    Each document is dumped with empty lists in place of its subcollections, and the subcollections are queued.
+    Up to `max_workers` threads fetch queued subcollections. The main thread fills the lists in query order
+    and queues the subcollections of the fetched documents. Sibling subcollections are fetched in parallel.
+    """
+    pending: list[tuple[list, PyfireCollection]] = []
+    results = [
+        doc.as_json(recursive=True, include=list(include), excepts=excepts, max_workers=max_workers, _pending_collections=pending)
+        for doc in docs
+    ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures: dict[Future, list] = {}
+
+        def submit_pending():
+            for target, coll in pending:
+                futures[executor.submit(_fetch_all, coll)] = target
+            pending.clear()
+
+        submit_pending()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                target = futures.pop(future)
+                for child in future.result():
+                    target.append(child.as_json(recursive=True, _pending_collections=pending))
+            submit_pending()
+
+    return results
+
+
+def _fetch_all(coll: 'PyfireCollection') -> list['PyfireDoc']:
+    # page through the whole sub collection, iterating it would stop at DEFAULT_LIMIT
+    return list(coll.each())
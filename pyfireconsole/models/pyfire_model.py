@@ -1,13 +1,27 @@
-from typing import Generic, Iterable, Optional, Type, TypeVar, get_origin
+import asyncio
+from datetime import datetime
+from itertools import islice
+from types import NoneType, UnionType
+from typing import IO, TYPE_CHECKING, Any, AsyncGenerator, Generator, Generic, Iterable, Optional, Type, TypeVar, Union, get_args, get_origin
 
 import inflection
 from google.api_core.datetime_helpers import DatetimeWithNanoseconds
 from pydantic import BaseModel, ConfigDict
 
-from pyfireconsole.queries.get_query import DocNotFoundException
+from pyfireconsole.db.rate_limiter import DEFAULT_OPS_PER_SECOND
+from pyfireconsole.queries.async_query_runner import AsyncQueryRunner
+from pyfireconsole.queries.batch_write_query import MAX_BATCH_SIZE, WriteOp
+from pyfireconsole.queries.get_query import DocNotFoundException, DocsNotFoundException
 from pyfireconsole.queries.order_query import OrderCondition, OrderDirection
+from pyfireconsole.queries.query_plan import QueryPlan
 from pyfireconsole.queries.query_runner import QueryRunner
-from pyfireconsole.queries.where_clouse import WhereCondition
+from pyfireconsole.queries.union_query_runner import AsyncUnionQueryRunner, UnionQueryRunner
+from pyfireconsole.queries.where_clouse import WhereCondition, expand_branches
+
+if TYPE_CHECKING:
+    import pyarrow
+
+    from pyfireconsole.models.jsonl import ImportResult
 
 ModelType = TypeVar('ModelType', bound='PyfireDoc')
 
@@ -16,9 +30,16 @@ class PyfireCollection(Generic[ModelType]):
     model_class: Type[ModelType]
     _parent_model: Optional['PyfireDoc'] = None
     _collection: Optional[Iterable[dict]] = None
-    _where_cond: Optional[WhereCondition] = None
+    _where_branches: tuple[tuple[WhereCondition, ...], ...] = ((),)  # OR of AND conditions, see where() and where_any()
     _order_cond: Optional[OrderCondition] = None
-    _limit: int = 1000  # default limit to prevent loading too large collections
+    DEFAULT_LIMIT = 1000  # default limit to prevent loading too large collections
+    _limit: Optional[int] = None  # see limit()
+    _offset: int = 0  # see offset()
+    _preloads: tuple[str, ...] = ()  # associations to batch load, see preload()
+    _loaded: Optional[list] = None  # documents already loaded by preload(). iteration doesn't query when set
+    _preload_page_size: int = 500
+    _select_fields: Optional[tuple[str, ...]] = None  # projection, see select()
+    _trusted: bool = False  # skip validation when loading documents, see trusted()
 
     def __init__(self, model_class: Type[ModelType]):
         self.model_class = model_class
@@ -54,38 +75,330 @@ class PyfireCollection(Generic[ModelType]):
         Yields:
             ModelType: The current document in the collection iteration.
         """
-        query = QueryRunner(self.obj_ref_key())
-        if self._where_cond is not None:
-            query = query.where(self._where_cond.field, self._where_cond.operator, self._where_cond.value)
+        if self._loaded is not None:
+            yield from self._loaded
+            return
+
+        limit = self._limit if self._limit is not None else self.DEFAULT_LIMIT
+        self._collection = self._build_query().iter(limit, self._offset)
+
+        if self._preloads:
+            docs = (self._to_model(doc) for doc in self._collection)
+            while page := list(islice(docs, self._preload_page_size)):
+                self._preload(page)
+                yield from page
+            return
+
+        for doc in self._collection:
+            yield self._to_model(doc)
+
+    async def __aiter__(self) -> AsyncGenerator[ModelType, None]:
+        """
+        Async iterator to loop through the collection with firestore.AsyncClient.
+
+        Yields:
+            ModelType: The current document in the collection iteration.
+        """
+        if self._loaded is not None:
+            for obj in self._loaded:
+                yield obj
+            return
+
+        page: list[ModelType] = []
+        limit = self._limit if self._limit is not None else self.DEFAULT_LIMIT
+        async for doc in self._build_query(AsyncQueryRunner).iter(limit, self._offset):
+            page.append(self._to_model(doc))
+            if len(page) >= self._preload_page_size:
+                await asyncio.to_thread(self._preload, page)
+                for obj in page:
+                    yield obj
+                page = []
+
+        await asyncio.to_thread(self._preload, page)
+        for obj in page:
+            yield obj
+
+    async def afirst(self) -> ModelType | None:
+        """
+        Get the first document in the collection with firestore.AsyncClient.
+
+        Returns:
+            ModelType or None: The first document or None if the collection is empty.
+        """
+        async for obj in self:
+            return obj
+        return None
+
+    async def ato_a(self) -> list[ModelType]:
+        """
+        Convert the collection to a list with firestore.AsyncClient.
+
+        Returns:
+            list[ModelType]: The collection as a list.
+        """
+        return [obj async for obj in self]
+
+    async def acount(self) -> int:
+        """
+        Count the documents in the collection with a server side aggregation and firestore.AsyncClient.
+
+        Returns:
+            int: The number of documents.
+        """
+        return self._apply_limit(await self._build_query(AsyncQueryRunner).count())
+
+    def iter_pages(self, page_size: int = 500, start_after: Optional[str] = None) -> Generator[list[ModelType], None, None]:
+        """
+        Iterate over the whole collection page by page.
+        Unlike plain iteration this is not capped by the default limit, and only one page is kept in memory. limit() and offset() apply.
+        To resume an interrupted walk, save the id of the last document of a page and pass it as `start_after`.
+
+        Args:
+            page_size (int): The number of documents fetched per request. Defaults to 500.
+            start_after (str, optional): The id of the document to resume after.
+
+        Yields:
+            list[ModelType]: The documents of each page.
+        """
+        for page in self._build_query().iter_pages(page_size, start_after, self._offset, self._limit):
+            docs = [self._to_model(doc) for doc in page]
+            self._preload(docs)
+            yield docs
+
+    def each(self, batch_size: int = 500, start_after: Optional[str] = None) -> Generator[ModelType, None, None]:
+        """
+        Iterate over the whole collection document by document, fetching `batch_size` documents per request.
+
+        Args:
+            batch_size (int): The number of documents fetched per request. Defaults to 500.
+            start_after (str, optional): The id of the document to resume after.
+
+        Yields:
+            ModelType: The current document in the collection iteration.
+        """
+        for page in self.iter_pages(batch_size, start_after):
+            yield from page
+
+    def preload(self, *attr_names: str) -> 'PyfireCollection[ModelType]':
+        """
+        Eager load associations (belongs_to, has_one, has_many) of the documents in the collection.
+        The targets are fetched in batches per loaded page and accessing them doesn't query Firestore.
+
+        Args:
+            *attr_names (str): The association attribute names. e.g. "user", "my_books"
+
+        Returns:
+            PyfireCollection[ModelType]: A new PyfireCollection instance with the preloads.
+        """
+        coll = self.all()
+        coll._preloads = self._preloads + tuple(name for name in attr_names if name not in self._preloads)
+        return coll
+
+    def select(self, *fields: str) -> 'PyfireCollection[ModelType]':
+        """
+        Only fetch the given fields of the documents.
+        The documents are partial models. Only the selected fields are validated and set,
+        the other fields are unset or hold their defaults. save() on a partial model only writes the selected fields.
+
+        Args:
+            *fields (str): The field names to fetch. The id is always fetched.
+
+        Returns:
+            PyfireCollection[ModelType]: A new PyfireCollection instance with the projection.
+        """
+        coll = self.all()
+        coll._select_fields = fields
+        return coll
+
+    def trusted(self) -> 'PyfireCollection[ModelType]':
+        """
+        Load the documents without pydantic validation, for fast scans of data written through the models.
+        Fields of plain types (str, int, float, bool, datetime, list, dict, ...) are set as read from Firestore,
+        only fields which need conversion (e.g. DocumentRef, nested models) are validated.
+        Call revalidate() on a document to validate it. save() validates trusted documents before writing.
+
+        Returns:
+            PyfireCollection[ModelType]: A new PyfireCollection instance with trusted reads.
+        """
+        coll = self.all()
+        coll._trusted = True
+        return coll
+
+    def _preload(self, docs: list[ModelType]):
+        if not self._preloads:
+            return
+        from pyfireconsole.models.association import preload_associations
+        preload_associations(docs, self._preloads)
+
+    def _build_query(self, runner_class: Type[QueryRunner] | Type[AsyncQueryRunner] = QueryRunner):
+        runners = []
+        for branch in expand_branches(self._where_branches):
+            runner = runner_class(self.obj_ref_key())
+            for cond in branch:
+                runner = runner.where(cond.field, cond.operator, cond.value)
+            runners.append(runner if branch else runner.all())
+
+        if len(runners) == 1:
+            query = runners[0]
+        elif runner_class is AsyncQueryRunner:
+            query = AsyncUnionQueryRunner(runners)
         else:
-            query = query.all()
+            query = UnionQueryRunner(runners)
 
         if self._order_cond is not None:
             query = query.order(self._order_cond.field, self._order_cond.direction)
 
-        self._collection = query.limit(self._limit).iter()
+        if self._select_fields is not None:
+            query = query.select(list(self._select_fields))
+        return query
 
-        self._collection = query.iter()
+    def _to_model(self, doc: dict) -> ModelType:
+        if self._trusted and self._select_fields is None:
+            obj = self.model_class._trusted_doc(doc)
+            obj._parent = self
+            obj._mark_loaded(doc)
+            return obj
 
-        for doc in self._collection:
-            doc = self.model_class._doc_field_load(doc)
+        doc = self.model_class._doc_field_load(doc)
+        if self._select_fields is not None:
+            obj = self.model_class._partial_doc(doc)
+        else:
             obj = self.model_class(**doc)
-            obj._parent = self
-            yield obj
+        obj._parent = self
+        obj._mark_loaded(doc)
+        return obj
 
-    def as_json(self, recursive: bool = False, include: list[str] = [], excepts: list[str] = []) -> list[dict]:
+    def as_json(self, recursive: bool = False, include: list[str] = [], excepts: list[str] = [], max_workers: Optional[int] = None) -> list[dict]:
         """
         Dump the collection to a list of dictionaries.
 
         Args:
             recursive (bool): Whether to dump the collection recursively.
             include (list[str]): A list of fields to include in the dump.
+            max_workers (int, optional): With recursive, the number of subcollections fetched concurrently. Defaults to one at a time.
 
         Returns:
             list[dict]: The collection as a list of dictionaries.
         """
+        if recursive and max_workers is not None and max_workers > 1:
+            from pyfireconsole.models.parallel_export import export_parallel
+            return export_parallel(self, include, excepts, max_workers)
         return [obj.as_json(recursive, include, excepts) for obj in self]
 
+    def export_jsonl(self, path_or_fp: str | IO, recursive: bool = False, page_size: int = 500, compress: Optional[bool] = None,
+                     include: list[str] = [], excepts: list[str] = []) -> int:
+        """
+        Stream the collection to JSON Lines (NDJSON), one document per line.
+        Documents are written as pages arrive, so memory use doesn't grow with the collection size.
+
+        Args:
+            path_or_fp (str | IO): The output path or a file object.
+            recursive (bool): Whether to dump the sub collections of each document.
+            page_size (int): The number of documents fetched per request. Defaults to 500.
+            compress (bool, optional): Whether to gzip the output. Defaults to True for paths ending with ".gz".
+            include (list[str]): A list of fields to include in the dump.
+            excepts (list[str]): A list of fields to exclude from the dump.
+
+        Returns:
+            int: The number of written documents.
+        """
+        from pyfireconsole.models.jsonl import export_jsonl
+        return export_jsonl(self, path_or_fp, recursive, page_size, compress, include, excepts)
+
+    def to_arrow(self, page_size: int = 500) -> 'pyarrow.Table':
+        """
+        Read the collection into a pyarrow Table, one record batch per page.
+        The schema is built from the model's field annotations, see pyfireconsole.models.arrow.arrow_schema(). Requires pyarrow.
+
+        Args:
+            page_size (int): The number of documents fetched per request. Defaults to 500.
+
+        Returns:
+            pyarrow.Table: The documents as a table. Sub collections are not included.
+        """
+        from pyfireconsole.models.arrow import to_arrow
+        return to_arrow(self, page_size)
+
+    def to_parquet(self, path: str, page_size: int = 500, compression: str = "snappy") -> int:
+        """
+        Stream the collection to a Parquet file, writing a record batch per page so memory use stays constant. Requires pyarrow.
+
+        Args:
+            path (str): The output path.
+            page_size (int): The number of documents fetched per request. Defaults to 500.
+            compression (str): The Parquet compression codec. Defaults to "snappy".
+
+        Returns:
+            int: The number of written documents.
+        """
+        from pyfireconsole.models.arrow import to_parquet
+        return to_parquet(self, path, page_size, compression)
+
+    def count(self) -> int:
+        """
+        Count the documents in the collection with a server side aggregation, without downloading them.
+
+        Returns:
+            int: The number of documents.
+        """
+        return self._apply_limit(self._build_query().count())
+
+    def explain(self, count: bool = True) -> QueryPlan:
+        """
+        Describe the Firestore queries iterating the collection would run, without reading the documents.
+
+        Args:
+            count (bool): Whether to estimate the number of matching documents with count aggregations, one per query.
+                Each is billed one read per 1000 matching documents. With OR filters the estimate is the sum of the
+                queries' counts, an upper bound since a document may match several.
+
+        Returns:
+            QueryPlan: The queries, their limit, the estimated reads and the composite indexes they need.
+        """
+        return QueryPlan(
+            self.obj_ref_key(),
+            expand_branches(self._where_branches),
+            order=self._order_cond,
+            limit=self._limit if self._limit is not None else self.DEFAULT_LIMIT,
+            offset=self._offset,
+            select=self._select_fields,
+            branch_counts=self._branch_counts() if count else None,
+        )
+
+    def _branch_counts(self) -> list[int]:
+        # counting the union of OR filters reads the ids of all matches, so each query is counted on its own
+        query = self._build_query()
+        runners = query.runners if isinstance(query, UnionQueryRunner) else [query]
+        return [runner.count() for runner in runners]
+
+    def _apply_limit(self, count: int) -> int:
+        count = max(0, count - self._offset)
+        return count if self._limit is None else min(count, self._limit)
+
+    def sum(self, field: str) -> int | float:
+        """
+        Sum a numeric field over the documents in the collection with a server side aggregation.
+
+        Args:
+            field (str): The field name to sum.
+
+        Returns:
+            int | float: The sum. Non numeric values are ignored.
+        """
+        return self._build_query().sum(field)
+
+    def avg(self, field: str) -> float | None:
+        """
+        Average a numeric field over the documents in the collection with a server side aggregation.
+
+        Args:
+            field (str): The field name to average.
+
+        Returns:
+            float or None: The average, or None if there are no numeric values.
+        """
+        return self._build_query().avg(field)
+
     def first(self) -> ModelType | None:
         """
         Get the first document in the collection.
@@ -93,28 +406,92 @@ class PyfireCollection(Generic[ModelType]):
         Returns:
             ModelType or None: The first document or None if the collection is empty.
         """
-        try:
-            return next(iter(self))
-        except StopIteration:
-            return None
+        return next(iter(self.limit(1 if self._limit is None else min(1, self._limit))), None)
+
+    def limit(self, limit: int) -> 'PyfireCollection[ModelType]':
+        """
+        Read at most `limit` documents. The limit is sent with the query, so only these documents are read.
+        It applies to iteration, iter_pages(), each(), count() and the exports, but not to sum() and avg().
+
+        Args:
+            limit (int): The maximum number of documents.
+
+        Returns:
+            PyfireCollection[ModelType]: A new PyfireCollection instance with the limit.
+        """
+        if limit < 0:
+            raise ValueError("limit must not be negative")
+        coll = self.all()
+        coll._limit = limit
+        return coll
+
+    def offset(self, offset: int) -> 'PyfireCollection[ModelType]':
+        """
+        Skip the first `offset` documents. Firestore still reads (and bills) the skipped documents,
+        use iter_pages() with `start_after` to walk large collections.
+
+        Args:
+            offset (int): The number of documents to skip.
+
+        Returns:
+            PyfireCollection[ModelType]: A new PyfireCollection instance with the offset.
+        """
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        coll = self.all()
+        coll._offset = offset
+        return coll
+
+    def take(self, n: int) -> list[ModelType]:
+        """
+        Get the first `n` documents as a list.
+
+        Args:
+            n (int): The number of documents.
+
+        Returns:
+            list[ModelType]: The documents.
+        """
+        return self.limit(n).to_a()
 
     def where(self, field: str, operator: str, value: str) -> 'PyfireCollection[ModelType]':
         """
-        Filter the collection based on the given condition.
+        Filter the collection based on the given condition. Conditions of chained calls must all match.
+        "in" and "array_contains_any" conditions are split into queries run in parallel, each with at most 30 disjunctions
+        (the product of the numbers of values of its "in" and "array_contains_any" conditions).
 
         Args:
             field (str): The field name to apply the filter on.
-            operator (str): The comparison operator (e.g., '==', '>', '<').
+            operator (str): The comparison operator (e.g., '==', '>', '<', 'in').
             value (str): The value to compare against.
 
         Returns:
             PyfireCollection[ModelType]: A new PyfireCollection instance with the applied filter.
         """
-        coll = PyfireCollection(self.model_class)
-        coll._where_cond = WhereCondition(field, operator, value)
-        if self._parent_model is not None:
-            coll.set_parent(self._parent_model)
+        cond = WhereCondition(field, operator, value)
+        coll = self.all()
+        coll._where_branches = tuple(branch + (cond,) for branch in self._where_branches)
+        return coll
+
+    def where_any(self, *conditions: tuple[str, str, object] | list[tuple[str, str, object]]) -> 'PyfireCollection[ModelType]':
+        """
+        Filter the collection to documents matching any of the conditions, in addition to the current filters.
+        Each alternative runs as its own query, in parallel, and the results are merged without duplicates.
+
+        Args:
+            *conditions: (field, operator, value) tuples, or lists of them which must all match.
+                e.g. where_any(("role", "==", "admin"), [("age", ">=", 20), ("verified", "==", True)])
+
+        Returns:
+            PyfireCollection[ModelType]: A new PyfireCollection instance with the applied filter.
+        """
+        alternatives = []
+        for cond in conditions:
+            conds = cond if isinstance(cond, list) else [cond]
+            alternatives.append(tuple(WhereCondition(*c) for c in conds))
 
+        coll = self.all()
+        coll._where_branches = tuple(branch + alt for branch in self._where_branches for alt in alternatives)
         return coll
 
     def order(self, field: str, direction: str = 'ASCENDING') -> 'PyfireCollection[ModelType]':
@@ -128,12 +505,8 @@ class PyfireCollection(Generic[ModelType]):
         Returns:
             PyfireCollection[ModelType]: A new PyfireCollection instance with the applied order.
         """
-        coll = PyfireCollection(self.model_class)
-        coll._where_cond = self._where_cond
+        coll = self.all()
         coll._order_cond = OrderCondition(field, direction)
-        if self._parent_model is not None:
-            coll.set_parent(self._parent_model)
-
         return coll
 
     def all(self) -> 'PyfireCollection[ModelType]':
@@ -144,22 +517,29 @@ class PyfireCollection(Generic[ModelType]):
             PyfireCollection[ModelType]: A new PyfireCollection instance containing all documents.
         """
         coll = PyfireCollection(self.model_class)
-        coll._where_cond = self._where_cond
+        coll._where_branches = self._where_branches
         coll._order_cond = self._order_cond
         coll._limit = self._limit
+        coll._offset = self._offset
+        coll._preloads = self._preloads
+        coll._select_fields = self._select_fields
+        coll._trusted = self._trusted
         if self._parent_model is not None:
             coll.set_parent(self._parent_model)
 
         return coll
 
-    def to_a(self, limit: int = 1000) -> list[ModelType]:
+    def to_a(self, limit: Optional[int] = None) -> list[ModelType]:
         """
         Convert the collection to a list.
 
+        Args:
+            limit (int, optional): The maximum number of documents. Defaults to the limit of the collection.
+
         Returns:
             list[ModelType]: The collection as a list.
         """
-        return list(self)
+        return list(self if limit is None else self.limit(limit))
 
     def add(self, entity: ModelType) -> ModelType:
         """
@@ -184,6 +564,31 @@ class PyfireCollection(Generic[ModelType]):
 
         return entity
 
+    def delete_all(self, batch_size: int = MAX_BATCH_SIZE, max_workers: int = 1) -> int:
+        """
+        Delete all documents matching the collection with batched writes. limit() and offset() apply.
+        Sub collections of the deleted documents are not deleted.
+
+        Args:
+            batch_size (int): The number of documents deleted per batch. At most 500.
+            max_workers (int): The number of batches committed in parallel. Each read fetches the documents of
+                `max_workers` batches.
+
+        Returns:
+            int: The number of deleted documents.
+        """
+        deleted = 0
+        page_size = batch_size * max_workers
+        # Always read the first page again, the deleted documents can't be used as cursors.
+        while self._limit is None or deleted < self._limit:
+            size = page_size if self._limit is None else min(page_size, self._limit - deleted)
+            page = next(self._build_query().iter_pages(size, offset=self._offset, limit=size), None)
+            if not page:
+                break
+            QueryRunner(self.obj_collection_name()).delete_many([doc["id"] for doc in page], batch_size, max_workers)
+            deleted += len(page)
+        return deleted
+
     def __str__(self) -> str:
         return f"{self.__class__.__name__}<{self.model_class.__name__}>[{self.obj_ref_key()}]"
 
@@ -220,19 +625,75 @@ class PyfireDoc(BaseModel):
     id: Optional[str] = None  # Firestore document id
     _parent: Optional[PyfireCollection] = None  # when a model is a subcollection, this is the parent model
     _path: Optional[str] = None  # firestore path
+    _preloaded: Optional[dict] = None  # associations loaded by PyfireCollection.preload()
+    _loaded_data: Optional[dict] = None  # field values last read from or written to firestore
+    _dirty_fields: Optional[set] = None  # fields marked by mark_dirty() since _loaded_data
+    _partial: bool = False  # only the fields in _loaded_data were fetched, see PyfireCollection.select()
+    _trusted: bool = False  # loaded without validation, see PyfireCollection.trusted()
 
     def __init__(self, **data):
         super().__init__(**data)
         self._setup_collections()
 
+    def mark_dirty(self, *names: str):
+        """
+        Mark fields as changed so that the next save() writes them.
+        Changes are detected by comparing with the loaded values, but values nested in untyped fields (e.g. `dict[str, object]`)
+        are shared with the loaded data. Call this after mutating them in place.
+        """
+        if self._dirty_fields is None:
+            self._dirty_fields = set()
+        self._dirty_fields.update(names)
+
+    def _field_values(self) -> dict:
+        return super().model_dump()
+
+    def _mark_loaded(self, data: dict):
+        self._loaded_data = data
+        self._dirty_fields = None
+
+    def changed_fields(self) -> list[str]:
+        """
+        Returns the document fields changed since the document was loaded or saved.
+        For a document which was not loaded from firestore, all fields are returned.
+        """
+        data = self._field_values()
+        collections = self._meta().collection_names
+        names = [name for name in data if name not in collections]
+        if self._loaded_data is None:
+            return names
+        if self._partial:
+            names = [name for name in names if name in self._loaded_data or name in (self._dirty_fields or ())]
+
+        dirty = self._dirty_fields or set()
+        return [name for name in names if name in dirty or name not in self._loaded_data or self._loaded_data[name] != data[name]]
+
+    def revalidate(self) -> 'PyfireDoc':
+        """
+        Validate the fields of a document loaded by a trusted read (see PyfireCollection.trusted()),
+        converting the values to the field types.
+
+        Raises:
+            pydantic.ValidationError: If a field value is invalid or a required field is missing.
+
+        Returns:
+            PyfireDoc: The document.
+        """
+        plan = self._meta()
+        data = {name: value for name, value in self.__dict__.items() if name in plan.plain or name in plan.validated}
+        validated = self.__class__.model_validate(data)
+        for name in data:
+            self.__dict__[name] = validated.__dict__[name]
+        self._trusted = False
+        return self
+
     def _setup_collections(self):
-        # Set the parent of all the collections
-        for name, _ in self.__annotations__.items():
-            attr = getattr(self, name, None)
-            if isinstance(attr, PyfireCollection):
-                attr.set_parent(self)
-            elif isinstance(attr, DocumentRef):
-                pass
+        # Set the parent of all the collections.
+        # The field default is shared between instances, so each instance gets a collection of its own.
+        for name, model_class in self._meta().collections:
+            coll = PyfireCollection(model_class)
+            coll.set_parent(self)
+            self.__dict__[name] = coll
 
     def obj_ref_key(self) -> str:
         """
@@ -262,7 +723,8 @@ class PyfireDoc(BaseModel):
             else:
                 return self._parent.obj_ref_key()
 
-    def as_json(self, recursive: bool = False, include: list[str] = [], excepts: list[str] = []) -> dict:
+    def as_json(self, recursive: bool = False, include: list[str] = [], excepts: list[str] = [],
+                max_workers: Optional[int] = None, _pending_collections: Optional[list] = None) -> dict:
         """
         Returns the model fields as dict. This is used for saving the model to firestore.
 
@@ -270,37 +732,48 @@ class PyfireDoc(BaseModel):
             recursive (bool, optional): Whether to recursively dump the subcollections. Defaults to True.
             include (list[str], optional): A list of fields to include in the dump. Defaults to [].
             excepts (list[str], optional): A list of fields to exclude from the dump. Defaults to [].
+            max_workers (int, optional): With recursive, the number of subcollections fetched concurrently. Defaults to one at a time.
 
         Returns:
             dict: The model fields as dict.
         """
+        if recursive and max_workers is not None and max_workers > 1 and _pending_collections is None:
+            from pyfireconsole.models.parallel_export import export_parallel
+            return export_parallel([self], include, excepts, max_workers)[0]
+
         data = super().model_dump()
+        meta = self._meta()
 
-        for name, _klass in self.__annotations__.items():
+        for name, _ in meta.collections:
             if name in excepts:
                 continue
 
-            attr = getattr(self, name, None)
-            if isinstance(attr, PyfireCollection):
-                if recursive:
-                    data[name] = attr.as_json(recursive=True)
-                else:
-                    data.pop(name)
-            elif isinstance(attr, DatetimeWithNanoseconds):
-                data[name] = attr.rfc3339()
-            if name in include:
-                include.remove(name)
+            attr = self.__dict__.get(name)
+            if recursive and _pending_collections is not None:
+                # filled by export_parallel()
+                data[name] = []
+                _pending_collections.append((data[name], attr))
+            elif recursive:
+                # the whole sub collection page by page, iterating it would stop at DEFAULT_LIMIT
+                data[name] = [child.as_json(recursive=True) for child in attr.each()]
+            else:
+                data.pop(name, None)
+
+        for name in meta.datetimes:
+            if name not in excepts and isinstance(data.get(name), DatetimeWithNanoseconds):
+                data[name] = data[name].rfc3339()
 
         for name in excepts:
             data.pop(name)
 
-        for name in include:
+        # fields are already dumped, unless excepted
+        for name in [name for name in include if name not in meta.fields or name in excepts]:
             if name not in data:
                 attr = getattr(self, name)
                 if isinstance(attr, PyfireCollection):
-                    data[name] = attr.as_json(recursive=recursive)
+                    data[name] = attr.as_json(recursive=recursive, max_workers=max_workers)
                 elif isinstance(attr, PyfireDoc):
-                    data[name] = attr.as_json(recursive=recursive)
+                    data[name] = attr.as_json(recursive=recursive, max_workers=max_workers)
                 elif callable(attr):
                     data[name] = attr()
                 else:
@@ -313,46 +786,176 @@ class PyfireDoc(BaseModel):
         """
         Filters out non document fields from the data dict.
         """
-        for name, klass in cls.__annotations__.items():
-            if name not in data:
-                continue
-            if get_origin(klass) == PyfireCollection:
-                data.pop(name)
+        for name in cls._meta().collection_names:
+            data.pop(name, None)
         return data
 
     def save(self) -> 'PyfireDoc':
         """
         Save or update the current document in Firestore.
+        A document loaded from Firestore is updated with only its changed fields, and nothing is sent if no field changed.
 
         Returns:
             PyfireDoc: The saved document.
         """
-        data = self.as_json(recursive=False)
-        if self.id is None:
+        write = self._pending_write()
+        if write is None:
+            return self
+
+        action, data = write
+        if action == WriteOp.SET and self.id is None:
             _id = QueryRunner(self.obj_collection_name()).create(data)
-            if _id:
-                self.id = _id
-        else:
+        elif action == WriteOp.SET:
             _id = QueryRunner(self.obj_collection_name()).save(self.id, data)
+        else:
+            _id = QueryRunner(self.obj_collection_name()).update(self.id, data)
+        return self._saved(_id)
+
+    async def asave(self) -> 'PyfireDoc':
+        """
+        Save or update the current document in Firestore with firestore.AsyncClient. See save().
+
+        Returns:
+            PyfireDoc: The saved document.
+        """
+        write = self._pending_write()
+        if write is None:
+            return self
+
+        action, data = write
+        if action == WriteOp.SET and self.id is None:
+            _id = await AsyncQueryRunner(self.obj_collection_name()).create(data)
+        elif action == WriteOp.SET:
+            _id = await AsyncQueryRunner(self.obj_collection_name()).save(self.id, data)
+        else:
+            _id = await AsyncQueryRunner(self.obj_collection_name()).update(self.id, data)
+        return self._saved(_id)
+
+    async def aupdate(self, **kwargs) -> 'PyfireDoc':
+        """
+        Updates the current document with provided fields with firestore.AsyncClient. See update().
+        """
+        for key, value in kwargs.items():
+            setattr(self, key, value)
 
+        await self.asave()
+        return self
+
+    async def adelete(self, verify: bool = True, must_exist: bool = False) -> bool:
+        """
+        Deletes the current document from Firestore with firestore.AsyncClient. See delete().
+        """
+        if self.id is None:
+            raise ValueError("Document ID is not set.")
+
+        return await AsyncQueryRunner(self.obj_collection_name()).delete(self.id, verify=verify, must_exist=must_exist)
+
+    def _pending_write(self) -> Optional[tuple[str, dict]]:
+        """
+        Returns the write needed to save the document: (WriteOp.SET, all fields) for a document not loaded from Firestore,
+        (WriteOp.UPDATE, changed fields) for a loaded one, or None if nothing changed.
+        """
+        if self._trusted:
+            self.revalidate()
+        data = self.as_json(recursive=False)
+        if self.id is None or self._loaded_data is None:
+            return WriteOp.SET, data
+
+        changes = {name: data[name] for name in self.changed_fields()}
+        if not changes:
+            return None
+        return WriteOp.UPDATE, changes
+
+    def _saved(self, _id: Optional[str]) -> 'PyfireDoc':
         if _id is None:
             raise ValueError("Could not save document")
+        if self.id is None:
+            self.id = _id
+        self._mark_loaded(self._field_values())
         return self
 
-    def delete(self) -> bool:
+    def delete(self, verify: bool = True, must_exist: bool = False) -> bool:
         """
         Deletes the current document from Firestore.
         Returns True if deletion is successful, False otherwise.
+
+        Args:
+            verify (bool, optional): If True, checks the document exists before and is gone after the delete (3 requests).
+                If False, sends a single delete request. Defaults to True.
+            must_exist (bool, optional): With verify=False, returns False instead of deleting when the document doesn't exist.
+                Otherwise a missing document counts as deleted. Defaults to False.
         """
         if self.id is None:
             raise ValueError("Document ID is not set.")
 
-        result = QueryRunner(self.obj_collection_name()).delete(self.id)
+        result = QueryRunner(self.obj_collection_name()).delete(self.id, verify=verify, must_exist=must_exist)
         return result
 
+    @classmethod
+    def save_all(cls, docs: list['PyfireDoc'], batch_size: int = MAX_BATCH_SIZE, max_workers: int = 1) -> list['PyfireDoc']:
+        """
+        Save or update multiple documents with batched writes instead of a request per document.
+
+        Args:
+            docs (list[PyfireDoc]): The documents to save.
+            batch_size (int, optional): The number of writes per batch. At most 500. Defaults to 500.
+            max_workers (int, optional): The number of batches committed in parallel. Defaults to 1.
+
+        Returns:
+            list[PyfireDoc]: The saved documents.
+        """
+        ops, saved = [], []
+        for doc in docs:
+            write = doc._pending_write()
+            if write is not None:
+                ops.append(WriteOp(write[0], doc.obj_collection_name(), doc.id, write[1]))
+                saved.append(doc)
+
+        for doc, _id in zip(saved, QueryRunner.bulk_write(ops, batch_size, max_workers)):
+            doc._saved(_id)
+        return docs
+
+    @classmethod
+    def delete_all(cls, docs: list['PyfireDoc'], batch_size: int = MAX_BATCH_SIZE, max_workers: int = 1) -> None:
+        """
+        Delete multiple documents with batched writes.
+
+        Args:
+            docs (list[PyfireDoc]): The documents to delete.
+            batch_size (int, optional): The number of deletes per batch. At most 500. Defaults to 500.
+            max_workers (int, optional): The number of batches committed in parallel. Defaults to 1.
+        """
+        if any(doc.id is None for doc in docs):
+            raise ValueError("Document ID is not set.")
+
+        QueryRunner.bulk_write([WriteOp.delete(doc.obj_collection_name(), doc.id) for doc in docs], batch_size, max_workers)
+
+    @classmethod
+    def import_jsonl(cls, path_or_fp: str | IO, batch_size: int = MAX_BATCH_SIZE, max_workers: int = 1,
+                     ops_per_second: Optional[float] = DEFAULT_OPS_PER_SECOND, ramp_up: bool = True, compress: Optional[bool] = None) -> 'ImportResult':
+        """
+        Import documents from a JSON Lines file, e.g. one written by PyfireCollection.export_jsonl().
+        The file is streamed, each row is validated against the model and written with batched writes.
+        Sub collections in rows of a recursive export are imported as well.
+
+        Args:
+            path_or_fp (str | IO): The input path or a text file object. Paths ending with ".gz" are read as gzip.
+            batch_size (int, optional): The number of writes per batch. At most 500. Defaults to 500.
+            max_workers (int, optional): The number of batches committed in parallel. Defaults to 1.
+            ops_per_second (float, optional): The initial write rate. None disables rate control. Defaults to DEFAULT_OPS_PER_SECOND.
+            ramp_up (bool, optional): Whether to increase the rate by 50% every 5 minutes (the 500/50/5 rule). Defaults to True.
+            compress (bool, optional): Whether the input is gzipped. Defaults to True for paths ending with ".gz".
+
+        Returns:
+            ImportResult: The number of imported rows, the throughput and the failed rows with their line numbers.
+        """
+        from pyfireconsole.models.jsonl import import_jsonl
+        return import_jsonl(cls, path_or_fp, batch_size, max_workers, ops_per_second, ramp_up, compress)
+
     def update(self, **kwargs) -> 'PyfireDoc':
         """
         Updates the current document with provided fields.
+        Only the changed fields are sent when the document was loaded from Firestore.
         """
         for key, value in kwargs.items():
             setattr(self, key, value)
@@ -366,18 +969,39 @@ class PyfireDoc(BaseModel):
         Returns the count of documents in the collection.
         This only works for top level collections.
         """
-        return len(QueryRunner(cls.collection_name()).all())
+        return PyfireCollection(cls).count()
 
     @classmethod
     def exists(cls, id: str) -> bool:
         """
-        Checks if a document exists by its ID.
+        Checks if a document exists by its path or ID.
+        Only the document key is read, no model is created.
         """
-        try:
-            cls.find(id)
-            return True
-        except DocNotFoundException:
-            return False
+        return cls.exists_many([id])[0]
+
+    @classmethod
+    def exists_many(cls, paths: list[str], chunk_size: int = 100) -> list[bool]:
+        """
+        Checks if documents exist by their paths or IDs with batched keys-only reads.
+
+        Args:
+            paths (list[str]): The documents' paths or IDs.
+            chunk_size (int, optional): The number of documents checked per request. Defaults to 100.
+
+        Returns:
+            list[bool]: Whether each document exists, in the order of `paths`.
+        """
+        keys = [cls._split_path(path) for path in paths]
+        ids_by_collection: dict[str, list[str]] = {}
+        for collection_name, id in keys:
+            ids_by_collection.setdefault(collection_name, []).append(id)
+
+        existing = set()
+        for collection_name, ids in ids_by_collection.items():
+            for id, exists in zip(ids, QueryRunner(collection_name).exists_many(ids, chunk_size)):
+                if exists:
+                    existing.add((collection_name, id))
+        return [key in existing for key in keys]
 
     @classmethod
     def new(cls, **kwargs) -> 'PyfireDoc':
@@ -413,16 +1037,124 @@ class PyfireDoc(BaseModel):
             d = QueryRunner(collection_name).get(id)
             if d is None:
                 raise DocNotFoundException(f"Document {collection_name}/{id} not found")
-            d = cls._doc_field_load(d)
         except DocNotFoundException as e:
             if allow_empty:
                 return cls._empty_doc(id)
             else:
                 raise e
-        obj = cls.model_validate(d)
+        return cls._loaded_doc(d, path)
+
+    @classmethod
+    async def afind(cls, path: str, allow_empty: bool = False) -> 'PyfireDoc':
+        """
+        Find a document by its path or ID with firestore.AsyncClient. See find().
+
+        Args:
+            path (str): The document's path or ID.
+            allow_empty (bool, optional): If True, returns an empty document if not found. Defaults to False.
+
+        Returns:
+            PyfireDoc: The found document.
+        """
+        collection_name, id = cls._split_path(path)
+        try:
+            d = await AsyncQueryRunner(collection_name).get(id)
+            if d is None:
+                raise DocNotFoundException(f"Document {collection_name}/{id} not found")
+        except DocNotFoundException as e:
+            if allow_empty:
+                return cls._empty_doc(id)
+            else:
+                raise e
+        return cls._loaded_doc(d, f"{collection_name}/{id}")
+
+    @classmethod
+    async def afind_many(cls, paths: list[str], allow_empty: bool = False, chunk_size: int = 100) -> list['PyfireDoc']:
+        """
+        Find multiple documents by their paths or IDs with firestore.AsyncClient. See find_many().
+        The collections are read concurrently.
+        """
+        keys = {path: cls._split_path(path) for path in paths}
+        ids_by_collection: dict[str, list[str]] = {}
+        for collection_name, id in dict.fromkeys(keys.values()):
+            ids_by_collection.setdefault(collection_name, []).append(id)
+
+        results = await asyncio.gather(*[
+            AsyncQueryRunner(collection_name).get_many(ids, chunk_size) for collection_name, ids in ids_by_collection.items()
+        ])
+        loaded = {}
+        for (collection_name, ids), docs in zip(ids_by_collection.items(), results):
+            for id, d in zip(ids, docs):
+                if d is not None:
+                    loaded[(collection_name, id)] = cls._loaded_doc(dict(d), f"{collection_name}/{id}")
+
+        missing = ["/".join(keys[path]) for path in paths if keys[path] not in loaded]
+        if missing and not allow_empty:
+            raise DocsNotFoundException(missing)
+        return [loaded[keys[path]] if keys[path] in loaded else cls._empty_doc(keys[path][1]) for path in paths]
+
+    @classmethod
+    def _loaded_doc(cls, data: dict, path: str) -> 'PyfireDoc':
+        """
+        Create a document from the data read from Firestore.
+        """
+        data = cls._doc_field_load(data)
+        obj = cls.model_validate(data)
         obj._path = path
+        obj._mark_loaded(data)
         return obj
 
+    @classmethod
+    def find_many(cls, paths: list[str], allow_empty: bool = False, chunk_size: int = 100) -> list['PyfireDoc']:
+        """
+        Find multiple documents by their paths or IDs with batched reads.
+
+        Args:
+            paths (list[str]): The documents' paths or IDs.
+            allow_empty (bool, optional): If True, returns empty documents for the missing ones. Defaults to False.
+            chunk_size (int, optional): The number of documents fetched per request. Defaults to 100.
+
+        Returns:
+            list[PyfireDoc]: The found documents in the order of `paths`.
+
+        Raises:
+            DocsNotFoundException: If some documents are not found. `missing` holds their paths.
+        """
+        found = cls._find_existing(paths, chunk_size)
+
+        missing = ["/".join(cls._split_path(path)) for path in paths if path not in found]
+        if missing and not allow_empty:
+            raise DocsNotFoundException(missing)
+
+        return [found[path] if path in found else cls._empty_doc(cls._split_path(path)[1]) for path in paths]
+
+    @classmethod
+    def _find_existing(cls, paths: list[str], chunk_size: int = 100) -> dict[str, 'PyfireDoc']:
+        """
+        Fetch documents by their paths or IDs with batched reads.
+        Returns a dict of the given path or ID to the document. Missing documents are not included.
+        """
+        keys = {path: cls._split_path(path) for path in paths}
+        ids_by_collection: dict[str, list[str]] = {}
+        for collection_name, id in dict.fromkeys(keys.values()):
+            ids_by_collection.setdefault(collection_name, []).append(id)
+
+        loaded: dict[tuple[str, str], PyfireDoc] = {}
+        for collection_name, ids in ids_by_collection.items():
+            for id, d in zip(ids, QueryRunner(collection_name).get_many(ids, chunk_size)):
+                if d is None:
+                    continue
+                loaded[(collection_name, id)] = cls._loaded_doc(dict(d), f"{collection_name}/{id}")
+
+        return {path: loaded[key] for path, key in keys.items() if key in loaded}
+
+    @classmethod
+    def _split_path(cls, path: str) -> tuple[str, str]:
+        if path.find('/') == -1:
+            return cls.collection_name(), path
+        collection_name, id = path.rsplit('/', 1)
+        return collection_name, id
+
     @classmethod
     def first(cls) -> Optional['PyfireDoc']:
         """
@@ -434,6 +1166,87 @@ class PyfireDoc(BaseModel):
         coll = PyfireCollection(cls)
         return coll.first()
 
+    @classmethod
+    def limit(cls, limit: int) -> PyfireCollection['PyfireDoc']:
+        """
+        Read at most `limit` documents. See PyfireCollection.limit().
+
+        Returns:
+            PyfireCollection[PyfireDoc]: A PyfireCollection instance with the limit.
+        """
+        return PyfireCollection(cls).limit(limit)
+
+    @classmethod
+    def take(cls, n: int) -> list['PyfireDoc']:
+        """
+        Get the first `n` documents as a list.
+
+        Returns:
+            list[PyfireDoc]: The documents.
+        """
+        return PyfireCollection(cls).take(n)
+
+    @classmethod
+    def _partial_doc(cls, data: dict) -> 'PyfireDoc':
+        """
+        Create a document from a subset of its fields. Only the given fields are validated.
+
+        Args:
+            data (dict): The field values.
+
+        Returns:
+            PyfireDoc: The partial document.
+        """
+        doc = cls.model_construct(id=data.get("id"))
+        for name, value in data.items():
+            if name in cls.model_fields:
+                cls.__pydantic_validator__.validate_assignment(doc, name, value)
+        doc._partial = True
+        doc._setup_collections()
+        return doc
+
+    @classmethod
+    def _trusted_doc(cls, data: dict) -> 'PyfireDoc':
+        """
+        Create a document from data read from Firestore without validating the plain fields. See PyfireCollection.trusted().
+        Like model_construct(), but with the defaults precomputed per class.
+        """
+        plan = cls._meta()
+        values = {name: value for name, value in data.items() if name in plan.plain}
+        fields_set = set(values)
+        values = {**plan.defaults, **values}
+        for name, field in plan.default_factories:
+            if name not in values:
+                values[name] = field.get_default(call_default_factory=True)
+        private = {**plan.private_defaults, "_trusted": True}
+        for name, attr in plan.private_factories:
+            private[name] = attr.get_default()
+
+        doc = cls.__new__(cls)
+        object.__setattr__(doc, '__dict__', values)
+        object.__setattr__(doc, '__pydantic_fields_set__', fields_set)
+        object.__setattr__(doc, '__pydantic_extra__', None)
+        object.__setattr__(doc, '__pydantic_private__', private)
+
+        for name in plan.validated:
+            if name in data:
+                cls.__pydantic_validator__.validate_assignment(doc, name, data[name])
+        for name, model_class in plan.collections:
+            coll = PyfireCollection(model_class)
+            coll.set_parent(doc)
+            doc.__dict__[name] = coll
+        return doc
+
+    @classmethod
+    def _meta(cls) -> '_ModelMeta':
+        """
+        Returns the field metadata of the model class. It is computed on first use and again if the model was not complete yet.
+        """
+        meta = _model_metas.get(cls)
+        if meta is None or not meta.complete:
+            meta = _model_metas[cls] = _ModelMeta(cls)
+        return meta
+
     @classmethod
     def _empty_doc(cls, id) -> 'PyfireDoc':
         """
@@ -462,9 +1275,20 @@ class PyfireDoc(BaseModel):
         Returns:
             PyfireCollection[PyfireDoc]: A PyfireCollection instance with the applied filter.
         """
-        coll = PyfireCollection(cls)
-        coll._where_cond = WhereCondition(field, operator, value)
-        return coll
+        return PyfireCollection(cls).where(field, operator, value)
+
+    @classmethod
+    def where_any(cls, *conditions: tuple[str, str, object] | list[tuple[str, str, object]]) -> PyfireCollection['PyfireDoc']:
+        """
+        Filter the documents to those matching any of the conditions. See PyfireCollection.where_any().
+
+        Args:
+            *conditions: (field, operator, value) tuples, or lists of them which must all match.
+
+        Returns:
+            PyfireCollection[PyfireDoc]: A PyfireCollection instance with the applied filter.
+        """
+        return PyfireCollection(cls).where_any(*conditions)
 
     @classmethod
     def order(cls, field: str, direction: OrderDirection = "ASCENDING") -> PyfireCollection['PyfireDoc']:
@@ -509,3 +1333,98 @@ class PyfireDoc(BaseModel):
 
     def __str__(self) -> str:
         return f"{self.__class__.__name__}[{self.obj_ref_key()}]({super.__str__(self).split('(', 1)[1]}"
+
+
+# Field types which Firestore returns as is, so documents can be loaded without validating them. See PyfireDoc._trusted_doc()
+_PLAIN_TYPES = (str, int, float, bool, bytes, datetime, list, dict, object, Any, NoneType)
+
+_IMMUTABLE_TYPES = (str, int, float, bool, bytes, tuple, frozenset, NoneType)
+
+
+class _ModelMeta:
+    """
+    Field metadata of a model class, computed once per class so that per document work only touches the relevant fields.
+    See PyfireDoc._meta().
+    """
+
+    def __init__(self, model_class: Type[PyfireDoc]):
+        self.complete = model_class.__pydantic_complete__
+        self.fields = frozenset(model_class.model_fields)
+
+        plain, validated, collections, refs, datetimes = set(), [], [], [], []
+        self.defaults: dict[str, Any] = {}
+        default_factories = []
+        for name, field in model_class.model_fields.items():
+            if get_origin(field.annotation) == PyfireCollection:
+                collections.append((name, field.default.model_class if isinstance(field.default, PyfireCollection) else get_args(field.annotation)[0]))
+                continue
+
+            if _mentions_type(field.annotation, _is_document_ref):
+                refs.append(name)
+            if _mentions_type(field.annotation, lambda t: t in (datetime, Any, object)):
+                datetimes.append(name)
+            if _is_plain_type(field.annotation):
+                plain.add(name)
+            else:
+                validated.append(name)
+
+            if field.is_required():
+                continue
+            if field.default_factory is None and isinstance(field.default, _IMMUTABLE_TYPES):
+                self.defaults[name] = field.default
+            else:
+                default_factories.append((name, field))
+
+        self.private_defaults: dict[str, Any] = {}
+        private_factories = []
+        for name, attr in model_class.__private_attributes__.items():
+            if attr.default_factory is None and isinstance(attr.default, _IMMUTABLE_TYPES):
+                self.private_defaults[name] = attr.default
+            else:
+                private_factories.append((name, attr))
+
+        self.collections: tuple[tuple[str, type], ...] = tuple(collections)  # sub collection fields and their model classes
+        self.collection_names = frozenset(name for name, _ in collections)
+        self.refs: tuple[str, ...] = tuple(refs)  # DocumentRef fields
+        self.datetimes: tuple[str, ...] = tuple(datetimes)  # fields which can hold a datetime
+        # trusted reads, see PyfireDoc._trusted_doc()
+        self.plain = frozenset(plain)
+        self.validated: tuple[str, ...] = tuple(validated)
+        self.default_factories = tuple(default_factories)
+        self.private_factories = tuple(private_factories)
+
+        # associations by attribute name, including the ones of base classes
+        from pyfireconsole.models.association import _associations
+        self.associations: dict[str, tuple[str, Type[PyfireDoc], str]] = {}
+        for klass in reversed(model_class.__mro__):
+            self.associations.update(_associations.get(klass, {}))
+
+
+# Per model class metadata, see PyfireDoc._meta()
+_model_metas: dict[type, _ModelMeta] = {}
+
+
+def _clear_model_metas():
+    """
+    Drop the computed metadata, e.g. after models are rebuilt or associations are added.
+    """
+    _model_metas.clear()
+
+
+def _mentions_type(annotation: Any, predicate) -> bool:
+    if predicate(annotation):
+        return True
+    return any(_mentions_type(arg, predicate) for arg in get_args(annotation))
+
+
+def _is_document_ref(annotation: Any) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, DocumentRef)
+
+
+def _is_plain_type(annotation: Any) -> bool:
+    origin = get_origin(annotation)
+    if origin is None:
+        return annotation in _PLAIN_TYPES
+    if origin in (Union, UnionType, list, dict):
+        return all(_is_plain_type(arg) for arg in get_args(annotation))
+    return False
@@ -1,9 +1,11 @@
-from typing import Dict, Optional
+from typing import Any, ContextManager, Dict, Generator, Optional
 
 from google.cloud.firestore_v1.base_query import BaseQuery
 from google.cloud.firestore_v1.document import DocumentReference, DocumentSnapshot
 
 from pyfireconsole.db.connection import FirestoreConnection
+from pyfireconsole.db.metrics import RPCEvent, track
+from pyfireconsole.db.values import DocumentReferenceLike
 
 
 class AbstractQuery:
@@ -17,9 +19,79 @@ class AbstractQuery:
         else:
             return collection_key_or_query
 
+    def rpc(self, op: str, collection_key: str) -> ContextManager[RPCEvent]:
+        """
+        Measure a request to Firestore when metrics are enabled. See Metrics.rpc().
+        """
+        return track(self.conn.metrics, op, collection_key)
+
     def exec(self):
         raise NotImplementedError
 
+    def _send(self, requests: Generator['DocRequest', Any, Any]):
+        """
+        Run a query written as a generator of DocRequests with a firestore.Client.
+        The response of each request is sent back to the generator, errors are raised in it, and its return value is returned.
+        """
+        response, error = None, None
+        while True:
+            try:
+                request = requests.throw(error) if error is not None else requests.send(response)
+            except StopIteration as stop:
+                return stop.value
+            response, error = None, None
+            try:
+                with self.rpc(request.op, self.collection_key) as rpc:
+                    response = request.send()
+                    request.count(rpc)
+            except Exception as e:
+                error = e
+
+    async def _asend(self, requests: Generator['DocRequest', Any, Any]):
+        """
+        Run a query written as a generator of DocRequests with a firestore.AsyncClient. See _send().
+        """
+        response, error = None, None
+        while True:
+            try:
+                request = requests.throw(error) if error is not None else requests.send(response)
+            except StopIteration as stop:
+                return stop.value
+            response, error = None, None
+            try:
+                with self.rpc(request.op, self.collection_key) as rpc:
+                    response = await request.asend()
+                    request.count(rpc)
+            except Exception as e:
+                error = e
+
+
+class DocRequest:
+    """
+    A request on documents, yielded by queries which run with both the sync and the async client.
+    `target` is the document reference, or the connection for "get_all" with the list of references.
+    """
+    COUNTED_AS = {"get": "reads", "get_all": "reads", "set": "writes", "update": "writes", "delete": "deletes"}
+
+    def __init__(self, op: str, target, *args, **kwargs):
+        self.op = op
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+
+    def send(self):
+        response = getattr(self.target, self.op)(*self.args, **self.kwargs)
+        return list(response) if self.op == "get_all" else response
+
+    async def asend(self):
+        response = getattr(self.target, self.op)(*self.args, **self.kwargs)
+        if self.op == "get_all":
+            return [doc async for doc in response]
+        return await response
+
+    def count(self, rpc: RPCEvent):
+        setattr(rpc, self.COUNTED_AS[self.op], len(self.args[0]) if self.op == "get_all" else 1)
+
 
 def _doc_to_dict(obj: DocumentSnapshot):
     """
@@ -34,7 +106,7 @@ def _recursive_to_dict(doc: DocumentSnapshot) -> Optional[Dict]:
         return None
 
     for key, value in data.items():
-        if isinstance(value, DocumentReference):
+        if isinstance(value, DocumentReferenceLike):
             data[key] = {
                 "path": value.path,
             }
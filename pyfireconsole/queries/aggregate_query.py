@@ -0,0 +1,62 @@
+from typing import Optional
+
+from google.cloud.firestore_v1.base_query import BaseQuery
+
+from pyfireconsole.queries.abstract_query import AbstractQuery
+
+
+class AggregateQuery(AbstractQuery):
+    COUNT = "count"
+    SUM = "sum"
+    AVG = "avg"
+
+    def __init__(self, collection_key_or_query: str | BaseQuery, kind: str, field: Optional[str] = None):
+        if kind not in (self.COUNT, self.SUM, self.AVG):
+            raise ValueError(f"Unknown aggregation: {kind}")
+        if kind != self.COUNT and field is None:
+            raise ValueError(f"{kind} requires a field")
+        self.collection_key_or_query = collection_key_or_query
+        self.kind = kind
+        self.field = field
+
+    def exec(self) -> int | float | None:
+        """
+        Run the aggregation on the server. Only the result is transferred, not the documents.
+        Falls back to a local aggregation over a projected stream when the backend doesn't support aggregation queries.
+        """
+        base = self.collection_ref(self.collection_key_or_query)
+
+        aggregate = getattr(base, self.kind, None)
+        if aggregate is None:
+            return self._aggregate_locally(base)
+
+        args = () if self.field is None else (self.field,)
+        result = aggregate(*args, alias=self.kind).get()
+        return result[0][0].value
+
+    def _aggregate_locally(self, base) -> int | float | None:
+        # Read only the document names (or the aggregated field) when the backend supports projections.
+        if hasattr(base, "select"):
+            base = base.select([] if self.field is None else [self.field])
+
+        if self.kind == self.COUNT:
+            return sum(1 for _ in base.stream())
+
+        values = []
+        for doc in base.stream():
+            value = _get_field(doc.to_dict() or {}, self.field)
+            # Like Firestore, non numeric values are ignored.
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.append(value)
+
+        if self.kind == self.SUM:
+            return sum(values)
+        return sum(values) / len(values) if values else None
+
+
+def _get_field(data: dict, field_path: str):
+    for key in field_path.split('.'):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
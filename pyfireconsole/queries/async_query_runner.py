@@ -0,0 +1,149 @@
+import math
+from typing import Any, AsyncGenerator, ContextManager, Dict, Optional
+
+from google.cloud.firestore_v1.document import DocumentSnapshot
+
+from pyfireconsole.db.connection import async_conn
+from pyfireconsole.db.metrics import RPCEvent, track, track_stream
+from pyfireconsole.queries.abstract_query import _doc_to_dict
+from pyfireconsole.queries.all_query import AllQuery
+from pyfireconsole.queries.delete_query import DeleteQuery
+from pyfireconsole.queries.get_many_query import GetManyQuery
+from pyfireconsole.queries.get_query import GetQuery
+from pyfireconsole.queries.order_query import OrderQuery
+from pyfireconsole.queries.query_runner import ITER_BATCH_SIZE
+from pyfireconsole.queries.save_query import SaveQuery
+from pyfireconsole.queries.select_query import SelectQuery
+from pyfireconsole.queries.update_query import UpdateQuery
+from pyfireconsole.queries.where_query import WhereQuery
+
+
+class AsyncQueryRunner:
+    """
+    The QueryRunner interface for firestore.AsyncClient.
+    Query building methods are the same, reads and writes are coroutines and iter() is an async generator.
+    """
+
+    def __init__(self, collection_key: str):
+        self.conn = async_conn
+        self.collection_key = collection_key
+        self.query = None
+        self.fields: Optional[list[str]] = None
+
+    async def get(self, id: str) -> Dict | None:
+        return await GetQuery(self.collection_key, id).set_conn(self.conn).aexec()
+
+    async def get_many(self, ids: list[str], chunk_size: int = 100) -> list[Dict | None]:
+        """
+        Fetch multiple documents with batched get_all() calls.
+        Args:
+            ids (list[str]): The document ids.
+            chunk_size (int): The number of documents fetched per request.
+        Returns:
+            list[Dict | None]: The documents in the order of `ids`. None for missing documents.
+        """
+        found = await GetManyQuery(self.collection_key, ids, chunk_size).set_conn(self.conn).aexec()
+        return [found.get(id) for id in ids]
+
+    def where(self, field: str, operator: str, value: str) -> 'AsyncQueryRunner':
+        self.query = WhereQuery(self.query or self.collection_key, field, operator, value).set_conn(self.conn).exec()
+        return self
+
+    def order(self, field: str, direction: str) -> 'AsyncQueryRunner':
+        self.query = OrderQuery(self.query or self.collection_key, field, direction).set_conn(self.conn).exec()
+        return self
+
+    def select(self, fields: list[str]) -> 'AsyncQueryRunner':
+        self.query = SelectQuery(self.query or self.collection_key, fields).set_conn(self.conn).exec()
+        self.fields = fields
+        return self
+
+    def all(self) -> 'AsyncQueryRunner':
+        self.query = AllQuery(self.query or self.collection_key).set_conn(self.conn).exec()
+        return self
+
+    def limit(self, limit: int) -> 'AsyncQueryRunner':
+        self.query = self.query.limit(limit) if self.query else self._collection().limit(limit)
+        return self
+
+    async def count(self) -> int:
+        base = self.query or self._collection()
+        with self._rpc("aggregate") as rpc:
+            if not hasattr(base, "count"):
+                count = len([doc async for doc in base.stream()])
+            else:
+                result = await base.count(alias="count").get()
+                count = result[0][0].value
+            rpc.reads = max(math.ceil(count / 1000), 1)
+        return count
+
+    async def save(self, id: str, data: dict) -> str | None:
+        try:
+            return await SaveQuery(self.collection_key, id, data).set_conn(self.conn).aexec()
+        finally:
+            self._invalidate(id)
+
+    async def create(self, data: dict) -> str | None:
+        return await SaveQuery(self.collection_key, None, data).set_conn(self.conn).aexec()
+
+    async def update(self, id: str, data: dict) -> str | None:
+        try:
+            return await UpdateQuery(self.collection_key, id, data).set_conn(self.conn).aexec()
+        finally:
+            self._invalidate(id)
+
+    async def delete(self, id: str, verify: bool = True, must_exist: bool = False) -> bool:
+        """
+        Delete a document. See QueryRunner.delete() for `verify` and `must_exist`.
+        """
+        try:
+            return await DeleteQuery(self.collection_key, id, verify, must_exist).set_conn(self.conn).aexec()
+        finally:
+            self._invalidate(id)
+
+    async def iter(self, limit: Optional[int] = 1000, offset: int = 0) -> AsyncGenerator[Dict[str, Any], None]:
+        query = self.query if self.query is not None else self._collection()
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+
+        # one request read in batches like QueryRunner.iter()
+        stream_rpc = track_stream(self.conn.metrics, "query", self.collection_key)
+        try:
+            stream = aiter(query.stream())
+            while True:
+                with stream_rpc.batch() as rpc:
+                    batch = []
+                    while len(batch) < ITER_BATCH_SIZE:
+                        doc = await anext(stream, None)
+                        if doc is None:
+                            break
+                        batch.append(doc)
+                    rpc.reads = max(rpc.reads + len(batch), 1)
+                for doc in batch:
+                    yield self._to_dict(doc)
+                if len(batch) < ITER_BATCH_SIZE:
+                    return
+        finally:
+            stream_rpc.close()
+
+    def _rpc(self, op: str) -> ContextManager[RPCEvent]:
+        return track(self.conn.metrics, op, self.collection_key)
+
+    def _collection(self):
+        return self.conn.collection(self.collection_key)
+
+    def _path(self, id: str) -> str:
+        return f"{self.collection_key}/{id}"
+
+    def _invalidate(self, id: str):
+        if self.conn.cache is not None:
+            self.conn.cache.invalidate(self._path(id))
+
+    def _to_dict(self, doc: DocumentSnapshot) -> Dict[str, Any]:
+        data = dict(_doc_to_dict(doc) or {}, id=doc.id)
+        if self.fields is not None:
+            top_level_fields = {field.split('.', 1)[0] for field in self.fields}
+            data = {key: value for key, value in data.items() if key in top_level_fields or key == "id"}
+        return data
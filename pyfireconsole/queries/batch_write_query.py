@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from pyfireconsole.queries.abstract_query import AbstractQuery
+
+# Firestore accepts up to 500 writes in a single batch commit.
+MAX_BATCH_SIZE = 500
+
+
+class WriteOp:
+    SET = "set"
+    UPDATE = "update"
+    DELETE = "delete"
+
+    def __init__(self, action: str, collection_key: str, doc_id: Optional[str], data: Optional[dict] = None):
+        self.action = action
+        self.collection_key = collection_key
+        self.doc_id = doc_id
+        self.data = data
+
+    @classmethod
+    def set(cls, collection_key: str, doc_id: Optional[str], data: dict) -> "WriteOp":
+        return cls(cls.SET, collection_key, doc_id, data)
+
+    @classmethod
+    def update(cls, collection_key: str, doc_id: str, data: dict) -> "WriteOp":
+        return cls(cls.UPDATE, collection_key, doc_id, data)
+
+    @classmethod
+    def delete(cls, collection_key: str, doc_id: str) -> "WriteOp":
+        return cls(cls.DELETE, collection_key, doc_id)
+
+
+class BatchWriteQuery(AbstractQuery):
+    def __init__(self, ops: list[WriteOp], batch_size: int = MAX_BATCH_SIZE, max_workers: int = 1):
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.ops = ops
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def exec(self) -> list[str]:
+        """
+        Commit the writes in batches of `batch_size` operations.
+        Batches are committed in parallel when max_workers > 1.
+        Returns the document ids in the order of the operations. Ids are generated for new documents.
+        """
+        doc_refs = []
+        for op in self.ops:
+            collection = self.collection_ref(op.collection_key)
+            doc_refs.append(collection.document(op.doc_id) if op.doc_id else collection.document())
+
+        chunks = [list(range(i, min(i + self.batch_size, len(self.ops)))) for i in range(0, len(self.ops), self.batch_size)]
+
+        def commit(chunk: list[int]):
+            batch = self.conn.batch()
+            for i in chunk:
+                op = self.ops[i]
+                if op.action == WriteOp.SET:
+                    batch.set(doc_refs[i], op.data)
+                elif op.action == WriteOp.UPDATE:
+                    batch.update(doc_refs[i], op.data)
+                elif op.action == WriteOp.DELETE:
+                    batch.delete(doc_refs[i])
+                else:
+                    raise ValueError(f"Unknown write operation: {op.action}")
+            collections = {self.ops[i].collection_key for i in chunk}
+            # a batch across collections is reported as "(batch)"
+            with self.rpc("commit", collections.pop() if len(collections) == 1 else "(batch)") as rpc:
+                batch.commit()
+                rpc.deletes = sum(1 for i in chunk if self.ops[i].action == WriteOp.DELETE)
+                rpc.writes = len(chunk) - rpc.deletes
+
+        if self.max_workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(commit, chunks))
+        else:
+            for chunk in chunks:
+                commit(chunk)
+
+        return [doc_ref.id for doc_ref in doc_refs]
@@ -1,14 +1,41 @@
-from pyfireconsole.queries.abstract_query import AbstractQuery
+from google.api_core.exceptions import NotFound
+
+from pyfireconsole.queries.abstract_query import AbstractQuery, DocRequest
 
 
 class DeleteQuery(AbstractQuery):
-    def __init__(self, collection_key: str, doc_id: str):
+    def __init__(self, collection_key: str, doc_id: str, verify: bool = True, must_exist: bool = False):
         self.collection_key = collection_key
         self.doc_id = doc_id
+        self.verify = verify
+        self.must_exist = must_exist
 
     def exec(self) -> bool:
+        return self._send(self._requests())
+
+    async def aexec(self) -> bool:
+        return await self._asend(self._requests())
+
+    def _requests(self):
         doc_ref = self.collection_ref(self.collection_key).document(self.doc_id)
-        if doc_ref.get().exists:
-            doc_ref.delete()
-            return not self.collection_ref(self.collection_key).document(self.doc_id).get().exists
-        return False
+        if not self.verify:
+            return (yield from self._delete_once(doc_ref))
+
+        if not (yield DocRequest("get", doc_ref)).exists:
+            return False
+        yield DocRequest("delete", doc_ref)
+        return not (yield DocRequest("get", self.collection_ref(self.collection_key).document(self.doc_id))).exists
+
+    def _delete_once(self, doc_ref):
+        """
+        Delete with a single request and no reads.
+        Without must_exist, Firestore reports success even if the document doesn't exist.
+        """
+        try:
+            if self.must_exist:
+                yield DocRequest("delete", doc_ref, option=self.conn.write_option(exists=True))
+            else:
+                yield DocRequest("delete", doc_ref)
+        except NotFound:
+            return False
+        return True
@@ -0,0 +1,26 @@
+from pyfireconsole.queries.abstract_query import AbstractQuery
+
+
+class ExistsQuery(AbstractQuery):
+    def __init__(self, collection_key: str, doc_ids: list[str], chunk_size: int = 100):
+        self.collection_key = collection_key
+        self.doc_ids = doc_ids
+        self.chunk_size = chunk_size
+
+    def exec(self) -> set[str]:
+        """
+        Check the documents with keys-only batched get_all() calls: the empty field mask returns no field data.
+        Returns the ids of the existing documents.
+        """
+        collection = self.collection_ref(self.collection_key)
+        unique_ids = list(dict.fromkeys(self.doc_ids))
+
+        existing = set()
+        for i in range(0, len(unique_ids), self.chunk_size):
+            refs = [collection.document(doc_id) for doc_id in unique_ids[i:i + self.chunk_size]]
+            with self.rpc("get_all", self.collection_key) as rpc:
+                rpc.reads = len(refs)
+                for doc in self.conn.get_all(refs, field_paths=[]):
+                    if doc.exists:
+                        existing.add(doc.id)
+        return existing
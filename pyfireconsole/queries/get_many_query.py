@@ -0,0 +1,43 @@
+from typing import Dict
+
+from pyfireconsole.queries.abstract_query import AbstractQuery, DocRequest, _doc_to_dict
+
+
+class GetManyQuery(AbstractQuery):
+    def __init__(self, collection_key: str, doc_ids: list[str], chunk_size: int = 100):
+        self.collection_key = collection_key
+        self.doc_ids = doc_ids
+        self.chunk_size = chunk_size
+
+    def exec(self) -> Dict[str, dict]:
+        """
+        Fetch the documents with batched get_all() calls, one RPC per chunk. Cached documents aren't fetched.
+        Returns a dict of id to document data. Missing documents are not included.
+        """
+        return self._send(self._requests())
+
+    async def aexec(self) -> Dict[str, dict]:
+        return await self._asend(self._requests())
+
+    def _requests(self):
+        cache = self.conn.cache
+        unique_ids = list(dict.fromkeys(self.doc_ids))
+
+        found = {}
+        if cache is not None:
+            generation = cache.generation()
+            for doc_id in unique_ids:
+                d = cache.get(f"{self.collection_key}/{doc_id}")
+                if d is not None:
+                    found[doc_id] = d
+
+        collection = self.collection_ref(self.collection_key)
+        missing = [doc_id for doc_id in unique_ids if doc_id not in found]
+        for i in range(0, len(missing), self.chunk_size):
+            refs = [collection.document(doc_id) for doc_id in missing[i:i + self.chunk_size]]
+            for doc in (yield DocRequest("get_all", self.conn, refs)):
+                if doc.exists:
+                    found[doc.id] = dict(_doc_to_dict(doc) or {}, id=doc.id)
+                    if cache is not None:
+                        cache.put(f"{self.collection_key}/{doc.id}", found[doc.id], generation)
+        return found
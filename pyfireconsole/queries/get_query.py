@@ -1,18 +1,44 @@
-from pyfireconsole.queries.abstract_query import AbstractQuery, _doc_to_dict
+from pyfireconsole.queries.abstract_query import AbstractQuery, DocRequest, _doc_to_dict
 
 
 class DocNotFoundException(Exception):
     pass
 
 
+class DocsNotFoundException(DocNotFoundException):
+    def __init__(self, missing: list[str]):
+        super().__init__(f"Documents not found: {', '.join(missing)}")
+        self.missing = missing
+
+
 class GetQuery(AbstractQuery):
     def __init__(self, collection_key: str, doc_id: str):
         self.collection_key = collection_key
         self.doc_id = doc_id
 
     def exec(self) -> dict | None:
-        doc_ref = self.collection_ref(self.collection_key).document(self.doc_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            return dict(_doc_to_dict(doc) or {}, id=doc.id)
-        raise DocNotFoundException(f"Document with id {self.doc_id} not found")
+        """
+        Read the document, from the cache of the connection when it's enabled.
+        """
+        return self._send(self._requests())
+
+    async def aexec(self) -> dict | None:
+        return await self._asend(self._requests())
+
+    def _requests(self):
+        cache = self.conn.cache
+        path = f"{self.collection_key}/{self.doc_id}"
+        if cache is not None:
+            generation = cache.generation()
+            d = cache.get(path)
+            if d is not None:
+                return d
+
+        doc = yield DocRequest("get", self.collection_ref(self.collection_key).document(self.doc_id))
+        if not doc.exists:
+            raise DocNotFoundException(f"Document with id {self.doc_id} not found")
+
+        d = dict(_doc_to_dict(doc) or {}, id=doc.id)
+        if cache is not None:
+            cache.put(path, d, generation)
+        return d
@@ -0,0 +1,24 @@
+from typing import Optional
+
+from google.cloud.firestore_v1.base_query import BaseQuery
+from google.cloud.firestore_v1.document import DocumentSnapshot
+
+from pyfireconsole.queries.abstract_query import AbstractQuery
+
+
+class PageQuery(AbstractQuery):
+    def __init__(self, collection_key_or_query: str | BaseQuery, page_size: int, cursor: Optional[DocumentSnapshot] = None, offset: int = 0):
+        self.collection_key_or_query = collection_key_or_query
+        self.page_size = page_size
+        self.cursor = cursor
+        self.offset = offset
+
+    def exec(self) -> BaseQuery:
+        base = self.collection_ref(self.collection_key_or_query)
+
+        # start_after() orders by the query's order fields plus the document name,
+        # so a snapshot of the last document of a page is a stable cursor.
+        if self.cursor is not None:
+            base = base.start_after(self.cursor)
+
+        return base.offset(self.offset).limit(self.page_size)
@@ -0,0 +1,135 @@
+from typing import Optional
+
+from pyfireconsole.queries.order_query import OrderCondition
+from pyfireconsole.queries.where_clouse import WhereCondition
+
+EQUALITY_OPERATORS = ("==", "in", "array_contains", "array_contains_any")
+RANGE_OPERATORS = ("<", "<=", ">", ">=", "!=", "not-in")
+
+
+class QueryPlan:
+    """
+    Describes the Firestore queries a PyfireCollection runs, see PyfireCollection.explain().
+    Index requirements follow Firestore's rules for single field indexes and index merging. They are an estimate,
+    Firestore reports a missing index with a link to create it when the query runs.
+    """
+
+    def __init__(self, collection_key: str, branches: list[tuple[WhereCondition, ...]], order: Optional[OrderCondition] = None,
+                 limit: Optional[int] = None, offset: int = 0, select: Optional[tuple[str, ...]] = None,
+                 estimated_count: Optional[int] = None, branch_counts: Optional[list[int]] = None):
+        self.collection_key = collection_key
+        self.branches = branches
+        self.order = order
+        self.limit = limit
+        self.offset = offset
+        self.select = select
+        self.estimated_count = estimated_count  # documents matching the filters, before offset and limit
+        # the matches per query of OR filters. Their sum is an upper bound of estimated_count, documents may match several.
+        self.branch_counts = branch_counts
+        if branch_counts is not None and estimated_count is None:
+            self.estimated_count = sum(branch_counts)
+
+    @property
+    def count_is_upper_bound(self) -> bool:
+        """
+        Whether estimated_count is the sum of the matches per query, which counts documents matching several queries more than once.
+        """
+        return self.branch_counts is not None and len(self.branch_counts) > 1
+
+    @property
+    def full_scan(self) -> bool:
+        """
+        Whether a query reads the collection without any filter.
+        """
+        return any(not branch for branch in self.branches)
+
+    @property
+    def estimated_reads(self) -> Optional[int]:
+        """
+        The billed document reads. Skipped offset documents are billed too, and every query reads at least one.
+        """
+        if self.estimated_count is None:
+            return None
+        counts = self.branch_counts if self.branch_counts is not None else [self.estimated_count]
+        # each query of OR filters reads its own matches up to offset + limit
+        reads = sum(count if self.limit is None else min(count, self.offset + self.limit) for count in counts)
+        return max(reads, len(self.branches))
+
+    def composite_indexes(self) -> list[list[tuple[str, str]]]:
+        """
+        Returns the composite indexes the queries need, as lists of (field, "ASCENDING" | "DESCENDING" | "CONTAINS").
+        Equality filters alone are served by merging single field indexes, and so are queries on a single field.
+        """
+        indexes = []
+        for branch in self.branches:
+            index = _composite_index(branch, self.order)
+            if index is not None and index not in indexes:
+                indexes.append(index)
+        return indexes
+
+    def to_dict(self) -> dict:
+        return {
+            "collection": self.collection_key,
+            "queries": [[(cond.field, cond.operator, cond.value) for cond in branch] for branch in self.branches],
+            "order": None if self.order is None else (self.order.field, self.order.direction),
+            "limit": self.limit,
+            "offset": self.offset,
+            "select": self.select,
+            "estimated_count": self.estimated_count,
+            "count_is_upper_bound": self.count_is_upper_bound,
+            "estimated_reads": self.estimated_reads,
+            "full_scan": self.full_scan,
+            "composite_indexes": self.composite_indexes(),
+        }
+
+    def __str__(self) -> str:
+        lines = [f"collection: {self.collection_key}"]
+        for i, branch in enumerate(self.branches):
+            conds = " AND ".join(f"{cond.field} {cond.operator} {_short_repr(cond.value)}" for cond in branch)
+            prefix = f"query {i + 1}/{len(self.branches)}" if len(self.branches) > 1 else "query"
+            lines.append(f"{prefix}: {conds or '(no filter)'}")
+        if self.order is not None:
+            lines.append(f"order: {self.order.field} {self.order.direction}")
+        if self.select is not None:
+            lines.append(f"select: {', '.join(self.select)}")
+        lines.append(f"limit: {self.limit if self.limit is not None else 'none'}" + (f", offset: {self.offset}" if self.offset else ""))
+        if self.estimated_count is not None:
+            documents = f"at most {self.estimated_count}" if self.count_is_upper_bound else self.estimated_count
+            lines.append(f"estimated documents: {documents}, estimated reads: {self.estimated_reads}")
+
+        indexes = self.composite_indexes()
+        if indexes:
+            for index in indexes:
+                lines.append("composite index: " + ", ".join(f"{field} {mode}" for field, mode in index))
+        else:
+            lines.append("composite index: not needed")
+        if self.full_scan:
+            lines.append("WARNING: full collection scan. Add where() filters or a limit().")
+        return "\n".join(lines)
+
+
+def _composite_index(branch: tuple[WhereCondition, ...], order: Optional[OrderCondition]) -> Optional[list[tuple[str, str]]]:
+    equality = {}
+    ranges = {}
+    for cond in branch:
+        if cond.operator in RANGE_OPERATORS:
+            ranges.setdefault(cond.field, "ASCENDING")
+        elif cond.field not in ranges:
+            equality[cond.field] = "CONTAINS" if cond.operator.startswith("array_contains") else "ASCENDING"
+
+    fields = set(equality) | set(ranges) | ({order.field} if order is not None else set())
+    if len(fields) <= 1 or (not ranges and order is None):
+        return None
+
+    # equality fields first, then the inequality and order fields
+    index = [(field, mode) for field, mode in equality.items() if field not in ranges and (order is None or field != order.field)]
+    if order is not None:
+        ranges.pop(order.field, None)
+        index.append((order.field, order.direction))
+    index.extend(ranges.items())
+    return index
+
+
+def _short_repr(value, max_length: int = 60) -> str:
+    text = repr(value)
+    return text if len(text) <= max_length else text[:max_length - 3] + "..."
@@ -1,27 +1,64 @@
-from typing import Any, Dict, Generator
+import math
+from itertools import islice
+from typing import Any, ContextManager, Dict, Generator, Optional
 
 from google.cloud.firestore_v1.base_query import BaseQuery
 from google.cloud.firestore_v1.document import DocumentSnapshot
 
 from pyfireconsole.db.connection import conn
+from pyfireconsole.db.metrics import RPCEvent, track, track_stream
 from pyfireconsole.queries.abstract_query import _doc_to_dict
+from pyfireconsole.queries.aggregate_query import AggregateQuery
 from pyfireconsole.queries.all_query import AllQuery
+from pyfireconsole.queries.batch_write_query import MAX_BATCH_SIZE, BatchWriteQuery, WriteOp
 from pyfireconsole.queries.delete_query import DeleteQuery
-from pyfireconsole.queries.get_query import GetQuery
+from pyfireconsole.queries.exists_query import ExistsQuery
+from pyfireconsole.queries.get_many_query import GetManyQuery
+from pyfireconsole.queries.get_query import DocNotFoundException, GetQuery
 from pyfireconsole.queries.order_query import OrderQuery
+from pyfireconsole.queries.page_query import PageQuery
 from pyfireconsole.queries.save_query import SaveQuery
+from pyfireconsole.queries.select_query import SelectQuery
+from pyfireconsole.queries.update_query import UpdateQuery
 from pyfireconsole.queries.where_query import WhereQuery
 
+ITER_BATCH_SIZE = 300  # documents read from the stream per measured batch of iter()
+
 
 class QueryRunner:
     def __init__(self, collection_key: str):
         self.conn = conn
         self.collection_key = collection_key
         self.query = None
+        self.fields: Optional[list[str]] = None
 
     def get(self, id: str) -> Dict | None:
         return GetQuery(self.collection_key, id).set_conn(self.conn).exec()
 
+    def get_many(self, ids: list[str], chunk_size: int = 100) -> list[Dict | None]:
+        """
+        Fetch multiple documents with batched get_all() calls.
+        Args:
+            ids (list[str]): The document ids.
+            chunk_size (int): The number of documents fetched per request.
+        Returns:
+            list[Dict | None]: The documents in the order of `ids`. None for missing documents.
+        """
+        found = GetManyQuery(self.collection_key, ids, chunk_size).set_conn(self.conn).exec()
+        return [found.get(id) for id in ids]
+
+    def exists_many(self, ids: list[str], chunk_size: int = 100) -> list[bool]:
+        """
+        Check whether documents exist without reading their fields.
+        Args:
+            ids (list[str]): The document ids.
+            chunk_size (int): The number of documents checked per request.
+        Returns:
+            list[bool]: Whether each document exists, in the order of `ids`.
+        """
+        existing = ExistsQuery(self.collection_key, ids, chunk_size).set_conn(self.conn).exec()
+        return [id in existing for id in ids]
+
     def where(self, field: str, operator: str, value: str) -> 'QueryRunner':
         self.query = WhereQuery(self.query or self.collection_key, field, operator, value).set_conn(self.conn).exec()
         return self
@@ -30,6 +67,18 @@ class QueryRunner:
         self.query = OrderQuery(self.query or self.collection_key, field, direction).set_conn(self.conn).exec()
         return self
 
+    def select(self, fields: list[str]) -> 'QueryRunner':
+        """
+        Apply a projection to the query. Only the given fields (and the id) are returned.
+        Args:
+            fields (list[str]): The field paths to return.
+        Returns:
+            QueryRunner: The current QueryRunner instance.
+        """
+        self.query = SelectQuery(self.query or self.collection_key, fields).set_conn(self.conn).exec()
+        self.fields = fields
+        return self
+
     def all(self) -> 'QueryRunner':
         self.query = AllQuery(self.query or self.collection_key).set_conn(self.conn).exec()
         return self
@@ -45,19 +94,168 @@ class QueryRunner:
         self.query = self.query.limit(limit) if self.query else self.conn.collection(self.collection_key).limit(limit)
         return self
 
+    def count(self) -> int:
+        """
+        Count the documents matching the query with an aggregation query.
+        Returns:
+            int: The number of documents.
+        """
+        return self._aggregate(AggregateQuery.COUNT)
+
+    def sum(self, field: str) -> int | float:
+        return self._aggregate(AggregateQuery.SUM, field)
+
+    def avg(self, field: str) -> float | None:
+        return self._aggregate(AggregateQuery.AVG, field)
+
     def save(self, id: str, data: dict) -> str | None:
-        return SaveQuery(self.collection_key, id, data).set_conn(self.conn).exec()
+        # cached entries are dropped after the write, and reads which started before it don't store what they read
+        try:
+            return SaveQuery(self.collection_key, id, data).set_conn(self.conn).exec()
+        finally:
+            self._invalidate(id)
+
+    def update(self, id: str, data: dict) -> str | None:
+        try:
+            return UpdateQuery(self.collection_key, id, data).set_conn(self.conn).exec()
+        finally:
+            self._invalidate(id)
 
     def create(self, data: dict) -> str | None:
         return SaveQuery(self.collection_key, None, data).set_conn(self.conn).exec()
 
-    def delete(self, id: str) -> None:
-        return DeleteQuery(self.collection_key, id).set_conn(self.conn).exec()
+    def delete(self, id: str, verify: bool = True, must_exist: bool = False) -> bool:
+        """
+        Delete a document.
+        Args:
+            id (str): The document id.
+            verify (bool): If True, reads the document before and after deleting it. If False, sends a single delete request.
+            must_exist (bool): With verify=False, fail the delete when the document doesn't exist.
+        Returns:
+            bool: True if the document is deleted.
+        """
+        try:
+            return DeleteQuery(self.collection_key, id, verify, must_exist).set_conn(self.conn).exec()
+        finally:
+            self._invalidate(id)
+
+    def delete_many(self, ids: list[str], batch_size: int = MAX_BATCH_SIZE, max_workers: int = 1) -> None:
+        try:
+            BatchWriteQuery([WriteOp.delete(self.collection_key, id) for id in ids], batch_size, max_workers).set_conn(self.conn).exec()
+        finally:
+            for id in ids:
+                self._invalidate(id)
+
+    @staticmethod
+    def bulk_write(ops: list[WriteOp], batch_size: int = MAX_BATCH_SIZE, max_workers: int = 1) -> list[str]:
+        """
+        Commit write operations, possibly across collections, with batched writes.
+        Args:
+            ops (list[WriteOp]): The write operations.
+            batch_size (int): The number of operations per batch. At most 500.
+            max_workers (int): The number of batches committed in parallel.
+        Returns:
+            list[str]: The document ids in the order of `ops`.
+        """
+        try:
+            return BatchWriteQuery(ops, batch_size, max_workers).set_conn(conn).exec()
+        finally:
+            if conn.cache is not None:
+                for op in ops:
+                    if op.doc_id is not None:
+                        conn.cache.invalidate(f"{op.collection_key}/{op.doc_id}")
+
+    def iter(self, limit: Optional[int] = 1000, offset: int = 0) -> Generator[Dict[str, Any], None, None]:
+        """
+        Stream the query results once.
+        The stream is one request, read in batches of ITER_BATCH_SIZE documents. The documents are yielded after their
+        batch is read, so the request's latency is the time spent reading the batches, not the caller's time between them.
+        Args:
+            limit (int, optional): The maximum number of documents to read. None reads all.
+            offset (int): The number of documents to skip.
+        """
+        query = self.query if self.query is not None else self.conn.collection(self.collection_key)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+
+        stream_rpc = track_stream(self.conn.metrics, "query", self.collection_key)
+        try:
+            stream = query.stream()
+            while True:
+                with stream_rpc.batch() as rpc:
+                    batch = list(islice(stream, ITER_BATCH_SIZE))
+                    rpc.reads = max(rpc.reads + len(batch), 1)
+                for doc in batch:
+                    yield self._to_dict(doc)
+                if len(batch) < ITER_BATCH_SIZE:
+                    return
+        finally:
+            # also when the caller stops early
+            stream_rpc.close()
+
+    def iter_pages(self, page_size: int = 500, start_after: Optional[str] = None,
+                   offset: int = 0, limit: Optional[int] = None) -> Generator[list[Dict[str, Any]], None, None]:
+        """
+        Iterate over the query page by page using start_after cursors.
+        Only one page is held in memory at a time.
+        Args:
+            page_size (int): The number of documents fetched per request.
+            start_after (str, optional): The id of the document to resume after.
+            offset (int): The number of documents to skip.
+            limit (int, optional): The maximum number of documents to read. None reads all.
+        Yields:
+            list[Dict[str, Any]]: The documents of each page.
+        """
+        if page_size <= 0:
+            raise ValueError("page_size must be a positive integer")
+
+        cursor = None
+        if start_after is not None:
+            with self._rpc("get") as rpc:
+                cursor = self.conn.collection(self.collection_key).document(start_after).get()
+                rpc.reads = 1
+            if not cursor.exists:
+                raise DocNotFoundException(f"Cursor document {self.collection_key}/{start_after} not found")
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page_query = PageQuery(self.query or self.collection_key, size, cursor, offset).set_conn(self.conn).exec()
+            # the offset only applies before the first page, the cursor skips the rest
+            offset = 0
+            with self._rpc("query") as rpc:
+                snapshots = list(page_query.stream())
+                rpc.reads = max(len(snapshots), 1)
+            if snapshots:
+                yield [self._to_dict(doc) for doc in snapshots]
+            if len(snapshots) < size:
+                return
+            if remaining is not None:
+                remaining -= len(snapshots)
+            cursor = snapshots[-1]
+
+    def _aggregate(self, kind: str, field: Optional[str] = None) -> int | float | None:
+        with self._rpc("aggregate") as rpc:
+            result = AggregateQuery(self.query or self.collection_key, kind, field).set_conn(self.conn).exec()
+            # Aggregations are billed one read per 1000 index entries
+            rpc.reads = max(math.ceil(result / 1000), 1) if kind == AggregateQuery.COUNT else 1
+        return result
+
+    def _rpc(self, op: str) -> ContextManager[RPCEvent]:
+        return track(self.conn.metrics, op, self.collection_key)
 
-    def iter(self, limit: int = 1000) -> Generator[Dict[str, Any], None, None]:
-        docs = self.query.stream()
+    def _path(self, id: str) -> str:
+        return f"{self.collection_key}/{id}"
 
-        docs = self.query.limit(limit).stream()
+    def _invalidate(self, id: str):
+        if self.conn.cache is not None:
+            self.conn.cache.invalidate(self._path(id))
 
-        for doc in docs:
-            yield dict(_doc_to_dict(doc) or {}, id=doc.id)
+    def _to_dict(self, doc: DocumentSnapshot) -> Dict[str, Any]:
+        data = dict(_doc_to_dict(doc) or {}, id=doc.id)
+        if self.fields is not None:
+            top_level_fields = {field.split('.', 1)[0] for field in self.fields}
+            data = {key: value for key, value in data.items() if key in top_level_fields or key == "id"}
+        return data
@@ -1,6 +1,6 @@
 from typing import Optional
 
-from pyfireconsole.queries.abstract_query import AbstractQuery
+from pyfireconsole.queries.abstract_query import AbstractQuery, DocRequest
 
 
 class SaveQuery(AbstractQuery):
@@ -11,10 +11,16 @@ class SaveQuery(AbstractQuery):
         self.data = data
 
     def exec(self) -> str:
+        return self._send(self._requests())
+
+    async def aexec(self) -> str:
+        return await self._asend(self._requests())
+
+    def _requests(self):
         if self.doc_id:
             doc_ref = self.collection_ref(self.collection_key).document(self.doc_id)
         else:
             doc_ref = self.collection_ref(self.collection_key).document()
 
-        doc_ref.set(self.data)
+        yield DocRequest("set", doc_ref, self.data)
         return doc_ref.id
@@ -0,0 +1,17 @@
+from google.cloud.firestore_v1.base_query import BaseQuery
+
+from pyfireconsole.queries.abstract_query import AbstractQuery
+
+
+class SelectQuery(AbstractQuery):
+    def __init__(self, collection_key_or_query: str | BaseQuery, fields: list[str]):
+        self.collection_key_or_query = collection_key_or_query
+        self.fields = fields
+
+    def exec(self) -> BaseQuery:
+        base = self.collection_ref(self.collection_key_or_query)
+
+        # Backends without projections return full documents. QueryRunner trims them.
+        if not hasattr(base, "select"):
+            return base
+        return base.select(self.fields)
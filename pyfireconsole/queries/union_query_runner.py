@@ -0,0 +1,159 @@
+import asyncio
+import copy
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, Iterable, Optional
+
+from pyfireconsole.db.values import order_key
+from pyfireconsole.queries.aggregate_query import _get_field
+from pyfireconsole.queries.async_query_runner import AsyncQueryRunner
+from pyfireconsole.queries.query_runner import QueryRunner
+
+
+class _UnionQueryBase:
+    def __init__(self, runners: list):
+        self.runners = runners
+        self.order_field: Optional[str] = None
+        self.descending = False
+        self.fields: Optional[list[str]] = None
+
+    def order(self, field: str, direction: str):
+        for runner in self.runners:
+            runner.order(field, direction)
+        self.order_field = field
+        self.descending = direction == "DESCENDING"
+        return self
+
+    def select(self, fields: list[str]):
+        # the order field is needed to merge the branches
+        branch_fields = list(fields)
+        if self.order_field is not None and self.order_field not in branch_fields:
+            branch_fields.append(self.order_field)
+        for runner in self.runners:
+            runner.select(branch_fields)
+        self.fields = list(fields)
+        return self
+
+    def _branch_limit(self, limit: Optional[int], offset: int) -> Optional[int]:
+        # the skipped and returned documents may all come from one branch
+        return None if limit is None else limit + offset
+
+    def _merge(self, results: list[list[Dict[str, Any]]], limit: Optional[int], offset: int) -> list[Dict[str, Any]]:
+        docs = sorted(_unique(doc for docs in results for doc in docs), key=self._sort_key, reverse=self.descending)
+        end = self._branch_limit(limit, offset)
+        return [self._trim(doc) for doc in docs[offset:end]]
+
+    def _sort_key(self, doc: Dict[str, Any]):
+        if self.order_field is None:
+            return doc["id"]
+        # values of different types, e.g. None and numbers, are ranked like Firestore does
+        return (order_key(_get_field(doc, self.order_field)), doc["id"])
+
+    def _selected(self, fields: list[str]) -> list:
+        # copies, so the projection doesn't change the runners of the collection
+        return [copy.copy(runner).select(fields) for runner in self.runners]
+
+    def _trim(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        if self.fields is None:
+            return doc
+        top_level_fields = {field.split('.', 1)[0] for field in self.fields}
+        return {key: value for key, value in doc.items() if key in top_level_fields or key == "id"}
+
+
+class UnionQueryRunner(_UnionQueryBase):
+    """
+    Runs OR filters as one query per branch and merges the results.
+    The branch queries run in parallel and the documents are deduplicated by id and merged in the query order
+    (the order field, then the document id, like Firestore).
+    """
+
+    def __init__(self, runners: list[QueryRunner], max_workers: int = 8):
+        super().__init__(runners)
+        self.max_workers = max_workers
+
+    def iter(self, limit: Optional[int] = 1000, offset: int = 0) -> Generator[Dict[str, Any], None, None]:
+        branch_limit = self._branch_limit(limit, offset)
+        results = self._map(lambda runner: list(runner.iter(branch_limit)))
+        yield from self._merge(results, limit, offset)
+
+    def iter_pages(self, page_size: int = 500, start_after: Optional[str] = None,
+                   offset: int = 0, limit: Optional[int] = None) -> Generator[list[Dict[str, Any]], None, None]:
+        """
+        Iterate over the merged results page by page. Each branch is read page by page, so memory doesn't grow with the results
+        except for the ids used for deduplication.
+        """
+        branch_limit = self._branch_limit(limit, offset)
+        branches = [_flatten(runner.iter_pages(page_size, start_after, limit=branch_limit)) for runner in self.runners]
+        merged = islice(_unique(heapq.merge(*branches, key=self._sort_key, reverse=self.descending)), offset, branch_limit)
+        page = []
+        for doc in merged:
+            page.append(self._trim(doc))
+            if len(page) == page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def count(self) -> int:
+        ids = self._map(lambda runner: {doc["id"] for page in runner.iter_pages(1000) for doc in page}, self._selected([]))
+        return len(set().union(*ids))
+
+    def sum(self, field: str) -> int | float:
+        return sum(self._values(field))
+
+    def avg(self, field: str) -> float | None:
+        values = self._values(field)
+        return sum(values) / len(values) if values else None
+
+    def _values(self, field: str) -> list[int | float]:
+        results = self._map(lambda runner: [doc for page in runner.iter_pages(1000) for doc in page], self._selected([field]))
+        values = []
+        for doc in _unique(doc for docs in results for doc in docs):
+            value = _get_field(doc, field)
+            # Like Firestore, non numeric values are ignored.
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.append(value)
+        return values
+
+    def _map(self, fn: Callable[[QueryRunner], Any], runners: Optional[list[QueryRunner]] = None) -> list:
+        runners = self.runners if runners is None else runners
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(runners))) as executor:
+            return list(executor.map(fn, runners))
+
+
+class AsyncUnionQueryRunner(_UnionQueryBase):
+    """
+    UnionQueryRunner for firestore.AsyncClient. The branch queries run concurrently with asyncio.gather().
+    """
+
+    def __init__(self, runners: list[AsyncQueryRunner]):
+        super().__init__(runners)
+
+    async def iter(self, limit: Optional[int] = 1000, offset: int = 0) -> AsyncGenerator[Dict[str, Any], None]:
+        branch_limit = self._branch_limit(limit, offset)
+        results = await asyncio.gather(*(_collect(runner.iter(branch_limit)) for runner in self.runners))
+        for doc in self._merge(results, limit, offset):
+            yield doc
+
+    async def count(self) -> int:
+        # AsyncQueryRunner.iter() is limited, so read the branches without a limit
+        results = await asyncio.gather(*(_collect(runner.iter(limit=None)) for runner in self._selected([])))
+        return len({doc["id"] for docs in results for doc in docs})
+
+
+async def _collect(docs: AsyncGenerator[Dict[str, Any], None]) -> list[Dict[str, Any]]:
+    return [doc async for doc in docs]
+
+
+def _flatten(pages: Iterable[list[Dict[str, Any]]]) -> Generator[Dict[str, Any], None, None]:
+    for page in pages:
+        yield from page
+
+
+def _unique(docs: Iterable[Dict[str, Any]]) -> Generator[Dict[str, Any], None, None]:
+    seen = set()
+    for doc in docs:
+        if doc["id"] not in seen:
+            seen.add(doc["id"])
+            yield doc
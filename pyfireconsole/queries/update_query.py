@@ -0,0 +1,23 @@
+from pyfireconsole.queries.abstract_query import AbstractQuery, DocRequest
+
+
+class UpdateQuery(AbstractQuery):
+
+    def __init__(self, collection_key: str, doc_id: str, data: dict):
+        self.collection_key = collection_key
+        self.doc_id = doc_id
+        self.data = data
+
+    def exec(self) -> str:
+        """
+        Update only the given fields of an existing document. Other fields are left untouched.
+        """
+        return self._send(self._requests())
+
+    async def aexec(self) -> str:
+        return await self._asend(self._requests())
+
+    def _requests(self):
+        doc_ref = self.collection_ref(self.collection_key).document(self.doc_id)
+        yield DocRequest("update", doc_ref, self.data)
+        return doc_ref.id
@@ -1,3 +1,14 @@
+import math
+from itertools import product
+
+# Firestore accepts up to 30 disjunctions per query: the product of the numbers of values of its "in" and
+# "array_contains_any" filters.
+DISJUNCTION_LIMIT = 30
+SPLITTABLE_OPERATORS = ("in", "array_contains_any")
+# The most queries the conditions of a collection may expand to. More is almost always a mistake, e.g. two long lists.
+MAX_QUERY_BRANCHES = 500
+
+
 class WhereCondition:
     def __init__(self, field, operator, value):
         self.field = field
@@ -10,3 +21,51 @@ class WhereCondition:
                 self.operator: self.value
             }
         }
+
+    def disjunctions(self) -> int:
+        return len(self.value) if self.operator in SPLITTABLE_OPERATORS else 1
+
+    def split(self, chunk_size: int = DISJUNCTION_LIMIT) -> list['WhereCondition']:
+        """
+        Split an "in" or "array_contains_any" condition with more than `chunk_size` values into conditions within the limit.
+        Any of the returned conditions matching is the same as this condition matching.
+        """
+        if self.operator not in SPLITTABLE_OPERATORS or len(self.value) <= chunk_size:
+            return [self]
+        values = list(self.value)
+        return [WhereCondition(self.field, self.operator, values[i:i + chunk_size]) for i in range(0, len(values), chunk_size)]
+
+
+def expand_branches(branches: tuple[tuple[WhereCondition, ...], ...], limit: int = DISJUNCTION_LIMIT,
+                    max_branches: int = MAX_QUERY_BRANCHES) -> list[tuple[WhereCondition, ...]]:
+    """
+    Expand OR branches of AND conditions to branches which Firestore can run as single queries,
+    by splitting "in" and "array_contains_any" conditions into more branches until each has at most `limit` disjunctions.
+    Raises:
+        ValueError: If the conditions expand to more than `max_branches` queries.
+    """
+    chunk_sizes = [_chunk_sizes(branch, limit) for branch in branches]
+    total = sum(math.prod(math.ceil(cond.disjunctions() / size) for cond, size in zip(branch, sizes) if size)
+                for branch, sizes in zip(branches, chunk_sizes))
+    if total > max_branches:
+        raise ValueError(
+            f"The where conditions expand to {total} queries, more than {max_branches}. Firestore allows {limit} "
+            f"disjunctions per query, the product of the numbers of values of its \"in\" and \"array_contains_any\" "
+            f"filters. Use fewer values.")
+
+    expanded = []
+    for branch, sizes in zip(branches, chunk_sizes):
+        expanded.extend(product(*(cond.split(max(size, 1)) for cond, size in zip(branch, sizes))))
+    return expanded
+
+
+def _chunk_sizes(branch: tuple[WhereCondition, ...], limit: int) -> list[int]:
+    # split the condition with the largest chunks into one more chunk until their product is within the limit
+    counts = [cond.disjunctions() for cond in branch]
+    chunks = [1] * len(branch)
+    sizes = list(counts)
+    while math.prod(sizes) > limit:
+        i = max(range(len(sizes)), key=sizes.__getitem__)
+        chunks[i] += 1
+        sizes[i] = math.ceil(counts[i] / chunks[i])
+    return sizes
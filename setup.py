@@ -18,6 +18,9 @@ setup(
         'pydantic>=2.0.1,<3.0.0',
         'ipython>=7.0.1,<9.0.0',
     ],
+    extras_require={
+        'arrow': ['pyarrow>=10.0.0'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Environment :: Console',
@@ -1,3 +1,9 @@
+import asyncio
+import gzip
+import io
+import json
+import math
+import time
 from datetime import datetime
 from typing import Optional
 
@@ -7,8 +13,12 @@ from pyfireconsole.models.association import belongs_to, has_many, resolve_pyfir
 from pyfireconsole.models.pyfire_model import DocumentRef, PyfireCollection, PyfireDoc
 from mockfirestore import MockFirestore
 
-from pyfireconsole.queries.get_query import DocNotFoundException
+from pyfireconsole.queries.abstract_query import DocRequest
+from pyfireconsole.queries.get_query import DocNotFoundException, DocsNotFoundException
 from pyfireconsole.queries.order_query import OrderDirection  # type: ignore
+from pyfireconsole.queries.query_runner import QueryRunner
+from pyfireconsole.queries.update_query import UpdateQuery
+from pyfireconsole.queries.where_clouse import expand_branches
 
 
 class I18n_Name(PyfireDoc):
@@ -46,12 +56,97 @@ class Book(PyfireDoc):
 resolve_pyfire_model_names(globals())
 
 
+# ================== mock ====================
+
+class MockWriteBatch:
+    """
+    mockfirestore doesn't implement WriteBatch. Writes are applied on commit.
+    """
+    def __init__(self):
+        self._writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self._writes.append(lambda: doc_ref.set(data, merge=merge))
+
+    def update(self, doc_ref, data):
+        self._writes.append(lambda: doc_ref.update(data))
+
+    def delete(self, doc_ref):
+        self._writes.append(doc_ref.delete)
+
+    def commit(self):
+        for write in self._writes:
+            write()
+        self._writes = []
+
+
+class AsyncMockDocument:
+    """
+    Async facade of a mockfirestore DocumentReference, like firestore.AsyncDocumentReference.
+    """
+    def __init__(self, doc_ref):
+        self.doc_ref = doc_ref
+        self.id = doc_ref.id
+
+    async def get(self):
+        return self.doc_ref.get()
+
+    async def set(self, data, merge=False):
+        self.doc_ref.set(data, merge=merge)
+
+    async def update(self, data):
+        self.doc_ref.update(data)
+
+    async def delete(self):
+        self.doc_ref.delete()
+
+
+class AsyncMockQuery:
+    def __init__(self, query):
+        self.query = query
+
+    def where(self, field, operator, value):
+        return AsyncMockQuery(self.query.where(field, operator, value))
+
+    def order_by(self, field, direction=None):
+        return AsyncMockQuery(self.query.order_by(field, direction=direction))
+
+    def limit(self, limit):
+        return AsyncMockQuery(self.query.limit(limit))
+
+    async def stream(self):
+        for doc in self.query.stream():
+            yield doc
+
+
+class AsyncMockCollection(AsyncMockQuery):
+    def document(self, doc_id=None):
+        return AsyncMockDocument(self.query.document(doc_id))
+
+
+class AsyncMockFirestore:
+    """
+    Async facade of MockFirestore, like firestore.AsyncClient.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def collection(self, path):
+        return AsyncMockCollection(self.db.collection(path))
+
+    async def get_all(self, references, field_paths=None):
+        for doc in self.db.get_all([ref.doc_ref for ref in references], field_paths=field_paths):
+            yield doc
+
+
 # ================== test ====================
 
 @pytest.fixture
 def mock_db():
     db = MockFirestore()
+    db.batch = MockWriteBatch
     FirestoreConnection().set_db(db)
+    FirestoreConnection().set_async_db(AsyncMockFirestore(db))
     yield db
     db.reset()
 
@@ -505,3 +600,1053 @@ def test_table_names():
     class AdminUser(PyfireDoc):
         pass
     assert AdminUser.collection_name() == "admin_users"
+
+
+def test_iter_pages(mock_db):
+    users = [User.new(id=f"user{i}", name=f"User{i}", email="").save() for i in range(5)]
+
+    pages = list(User.all().iter_pages(page_size=2))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sorted([u.id for page in pages for u in page]) == sorted([u.id for u in users])
+
+    # resume from the last document of the first page
+    cursor = pages[0][-1].id
+    rest = [u.id for u in User.all().each(batch_size=2, start_after=cursor)]
+    assert rest == [u.id for page in pages[1:] for u in page]
+
+    assert [u.id for u in User.where("name", "==", "User3").each(batch_size=2)] == ["user3"]
+
+    with pytest.raises(DocNotFoundException):
+        list(User.all().each(start_after="missing"))
+
+
+def test_find_many(mock_db):
+    user1 = User.new(name="John", email="").save()
+    user2 = User.new(name="Mary", email="").save()
+    book = Book.new(
+        title="Math",
+        user_id=user1.id,
+        published_at=datetime.now(),
+        authors=["John", "Mary"],
+        publisher_ref="publisher/12345",
+    ).save()
+    tag = book.tags.add(Tag.new(name="mathmatics"))
+
+    users = User.find_many([user2.id, user1.id, f"users/{user2.id}"], chunk_size=1)
+    assert [u.name for u in users] == ["Mary", "John", "Mary"]
+    assert users[2].obj_ref_key() == f"users/{user2.id}"
+
+    tags = Tag.find_many([tag.obj_ref_key()])
+    assert tags[0].name == "mathmatics"
+    assert tags[0].obj_collection_name() == f"books/{book.id}/tags"
+
+    with pytest.raises(DocsNotFoundException) as e:
+        User.find_many([user1.id, "99999"])
+    assert e.value.missing == ["users/99999"]
+
+    users = User.find_many([user1.id, "99999"], allow_empty=True)
+    assert users[0].name == "John"
+    assert users[1].id == "99999"
+
+
+def test_preload(mock_db, monkeypatch):
+    john = User.new(name="John", email="").save()
+    mary = User.new(name="Mary", email="").save()
+    for title, user in [("Math", john), ("History", john), ("English", mary)]:
+        Book.new(
+            title=title,
+            user_id=user.id,
+            published_at=datetime.now(),
+            authors=["John", "Mary"],
+            publisher_ref="publisher/12345",
+        ).save()
+
+    books = Book.all().preload("user").to_a()
+    users = User.order("name").preload("my_books").to_a()
+
+    # preloaded associations don't hit firestore
+    monkeypatch.setattr(User, "find", classmethod(lambda cls, *args, **kwargs: pytest.fail("find called")))
+    monkeypatch.setattr(Book, "where", classmethod(lambda cls, *args, **kwargs: pytest.fail("where called")))
+
+    assert sorted([(b.title, b.user.name) for b in books]) == [("English", "Mary"), ("History", "John"), ("Math", "John")]
+    assert [sorted(b.title for b in u.my_books) for u in users] == [["History", "Math"], ["English"]]
+
+    pages = list(Book.all().preload("user").iter_pages(page_size=2))
+    assert sorted(b.user.name for page in pages for b in page) == ["John", "John", "Mary"]
+
+    with pytest.raises(AttributeError):
+        User.all().preload("invalid").to_a()
+
+
+def test_save_all_delete_all(mock_db, monkeypatch):
+    users = User.save_all([User.new(name=f"User{i}", email="") for i in range(7)], batch_size=3, max_workers=2)
+    assert all(u.id is not None for u in users)
+    assert sorted(u.name for u in User.all()) == sorted(f"User{i}" for i in range(7))
+
+    users[0].name = "Renamed"
+    book = Book.new(
+        title="Math",
+        user_id=users[0].id,
+        published_at=datetime.now(),
+        authors=["John", "Mary"],
+        publisher_ref="publisher/12345",
+    ).save()
+    tag = Tag.new(name="mathmatics")
+    tag._parent = book.tags
+    User.save_all([users[0]])
+    Tag.save_all([tag])
+    assert User.find(users[0].id).name == "Renamed"
+    assert [t.name for t in book.tags] == ["mathmatics"]
+
+    User.delete_all(users[:2])
+    assert len(User.all().to_a()) == 5
+
+    assert User.where("name", "==", "User6").delete_all() == 1
+    assert User.all().delete_all(batch_size=2) == 4
+    assert User.all().to_a() == []
+
+    # each read fetches the documents of max_workers batches
+    User.save_all([User.new(name=f"User{i}", email="") for i in range(7)])
+    deletes = []
+    delete_many = QueryRunner.delete_many
+    monkeypatch.setattr(QueryRunner, "delete_many", lambda self, ids, *args: deletes.append(len(ids)) or delete_many(self, ids, *args))
+    assert User.all().delete_all(batch_size=2, max_workers=2) == 7
+    assert deletes == [4, 3]
+    assert User.all().to_a() == []
+
+
+def test_delete_without_verify(mock_db):
+    user = User.new(name="John", email="").save()
+
+    assert user.delete(verify=False) is True
+    with pytest.raises(DocNotFoundException):
+        User.find(user.id)
+
+
+def test_partial_update(mock_db, monkeypatch):
+    book = Book.new(
+        title="Math",
+        user_id="12345",
+        published_at=datetime.now(),
+        authors=["John", "Mary"],
+        edit_info={"editor": "John"},
+        publisher_ref="publisher/12345",
+    ).save()
+
+    found = Book.find(book.id)
+    assert found.changed_fields() == []
+    found.title = "Algebra"
+    found.authors.append("Taro")
+    assert sorted(found.changed_fields()) == ["authors", "title"]
+
+    # a concurrent write to another field is not overwritten
+    mock_db.collection("books").document(book.id).update({"user_id": "99999"})
+    found.save()
+    reloaded = Book.find(book.id)
+    assert (reloaded.title, reloaded.authors, reloaded.user_id) == ("Algebra", ["John", "Mary", "Taro"], "99999")
+    assert found.changed_fields() == []
+
+    found.edit_info["editor"] = "Mary"
+    found.update(user_id="99999")
+    assert Book.find(book.id).edit_info == {"editor": "Mary"}
+
+    found = Book.find(book.id)
+    found.edit_info["history"] = {"editor": "Taro"}
+    found.save()
+    found = Book.find(book.id)
+    found.edit_info["history"]["editor"] = "Jiro"
+    found.mark_dirty("edit_info")
+    found.save()
+    assert Book.find(book.id).edit_info == {"editor": "Mary", "history": {"editor": "Jiro"}}
+
+    # nothing changed, nothing is sent
+    monkeypatch.setattr(QueryRunner, "update", lambda *args: pytest.fail("update called"))
+    monkeypatch.setattr(QueryRunner, "save", lambda *args: pytest.fail("save called"))
+    reloaded = Book.find(book.id)
+    reloaded.update(title="Algebra")
+    reloaded.save()
+
+
+def test_count_sum_avg(mock_db):
+    assert User.count() == 0
+    assert Book.all().avg("price") is None
+
+    for i, title in enumerate(["Math", "History", "Math"]):
+        Book.new(
+            title=title,
+            user_id="12345",
+            published_at=datetime.now(),
+            authors=["John", "Mary"],
+            edit_info={"pages": 100 * (i + 1)},
+            publisher_ref="publisher/12345",
+        ).save()
+
+    assert Book.count() == 3
+    assert Book.where("title", "==", "Math").count() == 2
+    assert Book.all().sum("edit_info.pages") == 600
+    assert Book.where("title", "==", "Math").avg("edit_info.pages") == 200
+    assert Book.all().sum("title") == 0
+
+
+def test_select(mock_db):
+    book = Book.new(
+        title="Math",
+        user_id="12345",
+        published_at=datetime.now(),
+        authors=["John", "Mary"],
+        publisher_ref="publisher/12345",
+    ).save()
+    book.tags.add(Tag.new(name="mathmatics"))
+
+    partial = Book.where("title", "==", "Math").select("title", "user_id").first()
+    assert partial.id == book.id
+    assert (partial.title, partial.user_id) == ("Math", "12345")
+    assert not hasattr(partial, "authors")
+    assert [t.name for t in partial.tags] == ["mathmatics"]
+
+    # only the selected fields are written back
+    partial.update(title="Algebra")
+    found = Book.find(book.id)
+    assert (found.title, found.authors) == ("Algebra", ["John", "Mary"])
+
+    assert [u.title for u in Book.all().select("title").order("title")] == ["Algebra"]
+
+
+def test_subcollection_parent_per_instance(mock_db):
+    tag1 = Tag.new(id="tag1", name="mathmatics")
+    tag2 = Tag.new(id="tag2", name="history")
+    assert tag1.i18n_names.obj_ref_key() == "tags/tag1/i18n_names"
+    assert tag2.i18n_names.obj_ref_key() == "tags/tag2/i18n_names"
+
+
+def test_exists(mock_db, monkeypatch):
+    user = User.new(name="John", email="").save()
+    book = Book.new(
+        title="Math",
+        user_id=user.id,
+        published_at=datetime.now(),
+        authors=["John", "Mary"],
+        publisher_ref="publisher/12345",
+    ).save()
+    tag = book.tags.add(Tag.new(name="mathmatics"))
+
+    # no model is created
+    monkeypatch.setattr(User, "model_validate", classmethod(lambda cls, *args: pytest.fail("model_validate called")))
+
+    assert User.exists(user.id) is True
+    assert User.exists("99999") is False
+    assert User.exists_many([user.id, "99999", f"users/{user.id}"], chunk_size=2) == [True, False, True]
+    assert Tag.exists(tag.obj_ref_key()) is True
+
+
+@pytest.fixture
+def doc_cache(mock_db):
+    cache = FirestoreConnection().enable_cache(max_size=2, ttl=60)
+    yield cache
+    FirestoreConnection().disable_cache()
+
+
+def test_doc_cache(doc_cache, monkeypatch):
+    john = User.new(name="John", email="").save()
+    mary = User.new(name="Mary", email="").save()
+    taro = User.new(name="Taro", email="").save()
+
+    assert User.find(john.id).name == "John"
+    assert User.find(john.id).name == "John"
+    assert doc_cache.stats()["hits"] == 1
+    assert doc_cache.stats()["misses"] == 1
+
+    # invalidated on save and delete
+    john.update(name="Johnny")
+    assert User.find(john.id).name == "Johnny"
+    john.delete()
+    with pytest.raises(DocNotFoundException):
+        User.find(john.id)
+
+    # a read racing with a write doesn't leave the old document in the cache
+    update = UpdateQuery.exec
+
+    def racing_update(query):
+        User.find(mary.id)
+        return update(query)
+
+    monkeypatch.setattr(UpdateQuery, "exec", racing_update)
+    mary.update(name="Mary2")
+    monkeypatch.undo()
+    assert User.find(mary.id).name == "Mary2"
+
+    # a write completing between a read and its put() isn't overwritten with the old document
+    send = DocRequest.send
+
+    def racing_get(request):
+        snapshot = send(request)
+        monkeypatch.undo()
+        QueryRunner("users").update(mary.id, {"name": "Mary3"})
+        return snapshot
+
+    doc_cache.invalidate(f"users/{mary.id}")
+    monkeypatch.setattr(DocRequest, "send", racing_get)
+    assert User.find(mary.id).name == "Mary2"
+    assert User.find(mary.id).name == "Mary3"
+    mary.update(name="Mary")
+
+    # find_many and belongs_to go through the cache too
+    assert [u.name for u in User.find_many([mary.id, taro.id])] == ["Mary", "Taro"]
+    book = Book.new(
+        title="Math",
+        user_id=mary.id,
+        published_at=datetime.now(),
+        authors=["John", "Mary"],
+        publisher_ref="publisher/12345",
+    ).save()
+    monkeypatch.setattr(DocRequest, "send", lambda *args: pytest.fail("firestore read"))
+    assert book.user.name == "Mary"
+    assert asyncio.run(User.afind(mary.id)).name == "Mary"
+    monkeypatch.undo()
+
+    # LRU eviction
+    assert User.find(mary.id).name == "Mary"
+    User.find(taro.id)
+    User.find(john.id, allow_empty=True)
+    assert doc_cache.stats()["size"] == 2
+
+    # TTL expiry
+    doc_cache.ttl = 0
+    misses = doc_cache.stats()["misses"]
+    User.find(taro.id)
+    assert doc_cache.stats()["expirations"] == 1
+    assert doc_cache.stats()["misses"] == misses + 1
+
+
+def test_async(mock_db):
+    async def scenario():
+        john = await User.new(name="John", email="").asave()
+        mary = await User.new(name="Mary", email="").asave()
+        assert (await User.afind(john.id)).name == "John"
+
+        users = await asyncio.gather(*[User.afind(id) for id in [mary.id, john.id]])
+        assert [u.name for u in users] == ["Mary", "John"]
+        assert [u.name for u in await User.afind_many([mary.id, f"users/{john.id}"])] == ["Mary", "John"]
+
+        await john.aupdate(name="Johnny")
+        assert [u.name async for u in User.where("name", "==", "Johnny")] == ["Johnny"]
+        assert (await User.order("name", "DESCENDING").afirst()).name == "Mary"
+        assert await User.all().acount() == 2
+
+        assert await mary.adelete() is True
+        assert [u.id for u in await User.where("email", "==", "").ato_a()] == [john.id]
+        with pytest.raises(DocNotFoundException):
+            await User.afind(mary.id)
+
+    asyncio.run(scenario())
+
+    # a new sync client disconnects the async API rather than leaving it on the old database
+    FirestoreConnection().set_db(mock_db)
+    with pytest.raises(NotConnectedException):
+        asyncio.run(User.afind("any"))
+
+
+def test_as_json_parallel(mock_db):
+    user = User.new(id="12345", name="John", email="").save()
+    for title in ["Math", "History"]:
+        book = Book.new(
+            title=title,
+            user_id=user.id,
+            published_at=datetime.now(),
+            authors=["John", "Mary"],
+            publisher_ref="publisher/12345",
+        ).save()
+        for name in ["textbook", "classic"]:
+            tag = book.tags.add(Tag.new(name=f"{title}-{name}"))
+            tag.i18n_names.add(I18n_Name(lang="en", value=name))
+            tag.i18n_names.add(I18n_Name(lang="ja", value=name))
+
+    expected = Book.all().as_json(recursive=True, include=["user"])
+    actual = Book.all().as_json(recursive=True, include=["user"], max_workers=4)
+    assert actual == expected
+    assert [list(d.keys()) for d in actual] == [list(d.keys()) for d in expected]
+    assert [list(t.keys()) for t in actual[0]["tags"]] == [list(t.keys()) for t in expected[0]["tags"]]
+
+    assert book.as_json(recursive=True, max_workers=4) == book.as_json(recursive=True)
+
+
+def test_recursive_dump_reads_whole_sub_collections(mock_db, tmp_path, monkeypatch):
+    book = Book.new(
+        title="Math",
+        user_id="user0",
+        published_at=datetime(2023, 1, 1),
+        authors=["John"],
+        publisher_ref="publisher/12345",
+    ).save()
+    for i in range(5):
+        book.tags.add(Tag.new(name=f"tag{i}"))
+    # more sub documents than the limit of plain iteration
+    monkeypatch.setattr(PyfireCollection, "DEFAULT_LIMIT", 3)
+    assert len(book.tags.to_a()) == 3
+
+    names = [f"tag{i}" for i in range(5)]
+    assert sorted(tag["name"] for tag in book.as_json(recursive=True)["tags"]) == names
+    assert sorted(tag["name"] for tag in Book.all().as_json(recursive=True, max_workers=4)[0]["tags"]) == names
+
+    path = tmp_path / "books.jsonl"
+    assert Book.all().export_jsonl(str(path), recursive=True, page_size=2) == 1
+    assert sorted(tag["name"] for tag in json.loads(path.read_text())["tags"]) == names
+
+
+def test_export_jsonl(mock_db, tmp_path):
+    for i in range(5):
+        User.new(id=f"user{i}", name=f"John{i}", email="").save()
+    book = Book.new(
+        title="Math",
+        user_id="user0",
+        published_at=datetime(2023, 1, 1),
+        authors=["John"],
+        publisher_ref="publisher/12345",
+    ).save()
+    book.tags.add(Tag.new(name="textbook"))
+
+    path = tmp_path / "users.jsonl"
+    assert User.all().export_jsonl(str(path), page_size=2) == 5
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert lines == User.all().as_json()
+
+    buf = io.StringIO()
+    assert Book.all().export_jsonl(buf, recursive=True) == 1
+    line = json.loads(buf.getvalue())
+    assert line["published_at"] == "2023-01-01T00:00:00"
+    assert [tag["name"] for tag in line["tags"]] == ["textbook"]
+
+    gz_path = tmp_path / "users.jsonl.gz"
+    assert User.where("name", "==", "John1").export_jsonl(str(gz_path)) == 1
+    with gzip.open(gz_path, "rt") as f:
+        assert [json.loads(line)["id"] for line in f] == ["user1"]
+
+
+def test_to_arrow_and_parquet(mock_db, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    for i in range(3):
+        book = Book.new(
+            id=f"book{i}",
+            title=f"Math{i}",
+            user_id="12345",
+            published_at=datetime(2023, 1, i + 1),
+            authors=["John", "Mary"],
+            edit_info={"editor": "Bob"} if i == 0 else None,
+            publisher_ref="publisher/12345",
+        ).save()
+        book.tags.add(Tag.new(name="textbook"))
+
+    table = Book.all().to_arrow(page_size=2)
+    assert table.schema.names == ["id", "title", "user_id", "published_at", "authors", "edit_info", "publisher_ref"]
+    assert table.schema.field("published_at").type == pa.timestamp("us", tz="UTC")
+    assert table.schema.field("authors").type == pa.list_(pa.string())
+    assert table.num_rows == 3
+    rows = {row["id"]: row for row in table.to_pylist()}
+    assert rows["book0"]["authors"] == ["John", "Mary"]
+    assert json.loads(rows["book0"]["edit_info"]) == {"editor": "Bob"}
+    assert rows["book1"]["edit_info"] is None
+    assert rows["book2"]["publisher_ref"] == "publisher/12345"
+
+    path = tmp_path / "books.parquet"
+    assert Book.where("user_id", "==", "12345").select("title").to_parquet(str(path), page_size=2) == 3
+    table = pq.read_table(path)
+    assert table.schema.names == ["id", "title"]
+    assert sorted(table.column("title").to_pylist()) == ["Math0", "Math1", "Math2"]
+
+
+def test_import_jsonl(mock_db, tmp_path, monkeypatch):
+    for i in range(3):
+        book = Book.new(
+            id=f"book{i}",
+            title=f"Math{i}",
+            user_id="12345",
+            published_at=datetime(2023, 1, i + 1),
+            authors=["John"],
+            publisher_ref=DocumentRef(path="publisher/12345"),
+        ).save()
+        book.tags.add(Tag.new(name="textbook"))
+    path = tmp_path / "books.jsonl.gz"
+    Book.all().export_jsonl(str(path), recursive=True)
+    expected = Book.all().as_json(recursive=True)
+    for book in Book.all():
+        for tag in book.tags:
+            tag.delete()
+        book.delete()
+    assert Book.where("user_id", "==", "12345").count() == 0
+
+    result = Book.import_jsonl(str(path), batch_size=2, ops_per_second=None)
+    assert (result.imported, result.written, result.failed) == (3, 6, [])
+    assert Book.where("user_id", "==", "12345").as_json(recursive=True) == expected
+
+    lines = io.StringIO('{"id": "book9", "title": "Art", "user_id": "u", "published_at": "2023-01-01T00:00:00", "authors": [], "publisher_ref": "p/1"}\n'
+                        '{"id": "book10", "title": "Art"}\n'
+                        'not json\n')
+    result = Book.import_jsonl(lines)
+    assert result.imported == 1
+    assert [line_no for line_no, _ in result.failed] == [2, 3]
+    assert Book.find("book9").published_at == datetime(2023, 1, 1)
+
+    # a failed commit is reported for the rows of its chunk, and the later chunks of the window are not attempted
+    def row(id, tags):
+        return json.dumps({"id": id, "title": "Art", "user_id": "u", "published_at": "2023-01-01T00:00:00", "authors": [],
+                           "publisher_ref": "p/1", "tags": [{"name": name} for name in tags]}) + "\n"
+
+    bulk_write = QueryRunner.bulk_write
+    calls = []
+
+    def flaky_bulk_write(ops, *args):
+        calls.append(len(ops))
+        if len(calls) == 2:
+            raise RuntimeError("deadline exceeded")
+        return bulk_write(ops, *args)
+
+    monkeypatch.setattr(QueryRunner, "bulk_write", flaky_bulk_write)
+    lines = io.StringIO(row("art0", ["a"]) + row("art1", []) + row("art2", ["b", "c"]) + row("art3", []))
+    result = Book.import_jsonl(lines, batch_size=2, max_workers=1, ops_per_second=None)
+    # art2 doesn't fit in a chunk with art1, so their window is committed in two chunks and the first one fails
+    assert calls == [2, 1, 1]
+    assert (result.imported, result.written, result.failed, result.not_attempted) == (2, 3, [(2, "deadline exceeded")], [3])
+
+
+def test_ramp_rate_limiter():
+    from pyfireconsole.db.rate_limiter import RampRateLimiter
+
+    now = [0.0]
+    limiter = RampRateLimiter(500, clock=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    for _ in range(4):
+        limiter.acquire(500)
+    assert now[0] == 3.0
+
+    now[0] = 600.0
+    assert limiter.rate() == 500 * 1.5 ** 2
+    limiter.acquire(1125)
+    limiter.acquire(1125)
+    assert now[0] == 601.0
+
+
+def test_where_conditions(mock_db):
+    for i in range(70):
+        User.new(id=f"user{i:02}", name=f"John{i % 7}", email="admin" if i % 2 else "").save()
+
+    # chained where() conditions are ANDed
+    users = User.where("name", "==", "John1").where("email", "==", "admin").to_a()
+    assert sorted(user.id for user in users) == [f"user{i:02}" for i in range(70) if i % 7 == 1 and i % 2]
+
+    # "in" with more than 30 values is split into queries and merged
+    ids = [f"user{i:02}" for i in range(0, 70, 2)] + ["missing"]
+    users = User.where("id", "in", ids).where("email", "==", "").to_a()
+    assert sorted(user.id for user in users) == ids[:-1]
+    assert User.where("id", "in", ids).count() == 35
+    assert sum(len(page) for page in User.where("id", "in", ids).iter_pages(page_size=10)) == 35
+
+    # each query has at most 30 disjunctions, the product of the "in" list sizes
+    coll = User.where("id", "in", ids).where("name", "in", [f"John{i}" for i in range(7)])
+    queries = expand_branches(coll._where_branches)
+    assert all(math.prod(len(cond.value) for cond in branch) <= 30 for branch in queries)
+    assert sorted(user.id for user in coll) == ids[:-1]
+    with pytest.raises(ValueError, match="more than 500"):
+        User.where("id", "in", [f"a{i}" for i in range(1000)]).where("name", "in", [f"b{i}" for i in range(1000)]).to_a()
+
+    # where_any() matches any of the alternatives without duplicates
+    users = User.where("email", "==", "admin").where_any(("name", "==", "John0"), [("name", "==", "John1"), ("id", "in", ["user01", "user15"])])
+    assert sorted(user.id for user in users) == sorted([f"user{i:02}" for i in range(70) if i % 2 and i % 7 == 0] + ["user01", "user15"])
+    assert User.where_any(("name", "==", "John0"), ("email", "==", "admin")).count() == 40
+
+    ordered = User.where_any(("name", "==", "John0"), ("name", "==", "John1")).order("id", "DESCENDING").to_a()
+    assert [user.id for user in ordered] == sorted((f"user{i:02}" for i in range(70) if i % 7 in (0, 1)), reverse=True)
+
+    async def run():
+        coll = User.where_any(("name", "==", "John0"), ("name", "==", "John1"))
+        return len(await coll.ato_a()), await coll.acount()
+    assert asyncio.run(run()) == (20, 20)
+
+
+def test_limit_offset(mock_db, monkeypatch):
+    for i in range(20):
+        User.new(id=f"user{i:02}", name=f"John{i % 2}", email="").save()
+
+    streams = []
+    original_iter = QueryRunner.iter
+
+    def spy_iter(self, limit=1000, offset=0):
+        streams.append((limit, offset))
+        return original_iter(self, limit, offset)
+    monkeypatch.setattr(QueryRunner, "iter", spy_iter)
+
+    assert [user.id for user in User.order("id").limit(3)] == ["user00", "user01", "user02"]
+    assert streams == [(3, 0)]
+    assert [user.id for user in User.order("id", "DESCENDING").offset(2).take(2)] == ["user17", "user16"]
+    assert User.order("id").first().id == "user00"
+    assert streams[-1] == (1, 0)
+    assert len(User.all().to_a()) == 20
+    assert len(User.where("name", "==", "John0").to_a(limit=4)) == 4
+
+    assert User.where("name", "==", "John1").limit(4).count() == 4
+    assert User.all().offset(18).limit(5).count() == 2
+    assert [len(page) for page in User.all().limit(7).iter_pages(page_size=3)] == [3, 3, 1]
+    assert [user.id for user in User.order("id").offset(5).limit(3).each(batch_size=2)] == ["user05", "user06", "user07"]
+
+    users = User.where_any(("name", "==", "John0"), ("id", "==", "user01")).order("id").offset(1).limit(3).to_a()
+    assert [user.id for user in users] == ["user01", "user02", "user04"]
+
+    assert User.order("id").limit(5).delete_all(batch_size=2) == 5
+    assert User.order("id").first().id == "user05"
+
+
+def test_trusted(mock_db):
+    from pydantic import ValidationError
+
+    for i in range(3):
+        book = Book.new(
+            id=f"book{i}",
+            title=f"Math{i}",
+            user_id="12345",
+            published_at=datetime(2023, 1, i + 1),
+            authors=["John"],
+            edit_info={"editor": "Bob"},
+            publisher_ref=DocumentRef(path="publisher/12345"),
+        ).save()
+        book.tags.add(Tag.new(name="textbook"))
+
+    books = Book.all().trusted().to_a()
+    assert [book.as_json() for book in books] == Book.all().as_json()
+    assert all(book._trusted for book in books)
+    assert isinstance(books[0].publisher_ref, DocumentRef)
+    assert [tag.name for tag in books[0].tags] == ["textbook"]
+    assert books[0].tags._parent_model is books[0] and books[1].tags is not books[0].tags
+    assert books[0].changed_fields() == []
+
+    mock_db.collection("books").document("book1").update({"title": 123})
+    book = Book.where("id", "==", "book1").trusted().first()
+    assert book.title == 123
+    with pytest.raises(ValidationError):
+        book.revalidate()
+    with pytest.raises(ValidationError):
+        book.save()
+
+    book.title = "History"
+    book.save()
+    assert not book._trusted
+    assert Book.find("book1").title == "History"
+
+
+def test_model_meta(mock_db):
+    class EBook(Book):
+        file_size: int = 0
+        updated_at: Optional[datetime] = None
+
+    meta = EBook._meta()
+    assert meta.collections == (("tags", Tag),)
+    assert meta.refs == ("publisher_ref",)
+    assert set(meta.datetimes) == {"published_at", "edit_info", "updated_at"}
+    assert "user" in meta.associations
+
+    user = User.new(name="John", email="").save()
+    ebook = EBook.new(
+        id="ebook1",
+        title="Math",
+        user_id=user.id,
+        published_at=datetime(2023, 1, 1),
+        authors=["John"],
+        publisher_ref="publisher/12345",
+        updated_at=datetime(2023, 1, 2),
+    ).save()
+    ebook.tags.add(Tag.new(name="textbook"))
+
+    # the inherited sub collection and association work on the subclass
+    ebook = EBook.find("ebook1")
+    assert [tag.name for tag in ebook.tags] == ["textbook"]
+    assert ebook.user.name == "John"
+    data = ebook.as_json(recursive=True)
+    assert data["tags"] == [{"id": ebook.tags.first().id, "name": "textbook", "i18n_names": []}]
+    assert data["updated_at"] == datetime(2023, 1, 2)
+
+    # associations added later are picked up
+    class Author(User):
+        pass
+
+    assert "my_books" in Author._meta().associations
+    has_many(EBook, "user_id", "ebooks")(Author)
+    assert "ebooks" in Author._meta().associations
+    assert "ebooks" not in User._meta().associations
+
+
+@pytest.fixture
+def metrics(mock_db):
+    metrics = FirestoreConnection().enable_metrics()
+    yield metrics
+    FirestoreConnection().disable_metrics()
+
+
+def test_metrics(metrics, monkeypatch):
+    events = []
+    metrics.add_hook(events.append)
+
+    john = User.new(name="John", email="").save()
+    User.find(john.id)
+    User.find_many([john.id])
+    book = Book.new(
+        title="Math",
+        user_id=john.id,
+        published_at=datetime(2023, 1, 1),
+        authors=["John"],
+        publisher_ref="publisher/12345",
+    ).save()
+    book.tags.add(Tag.new(name="textbook"))
+    assert User.where("name", "==", "Nobody").to_a() == []
+    assert User.all().count() == 1
+    User.save_all([User.new(id=f"u{i}", name=f"User{i}", email="") for i in range(3)])
+    john.delete(verify=False)
+
+    stats = metrics.stats()
+    users = stats["collections"]["users"]
+    assert users["ops"] == {"set": 1, "get": 1, "get_all": 1, "query": 1, "aggregate": 1, "commit": 1, "delete": 1}
+    # find: 1, find_many: 1, empty query: 1, count: 1
+    assert users["reads"] == 4
+    assert users["writes"] == 4
+    assert users["deletes"] == 1
+    assert users["latency"]["count"] == users["rpcs"] == 7
+    assert sum(users["latency"]["buckets"].values()) == 7
+    assert stats["collections"]["books/*/tags"]["writes"] == 1
+    assert stats["rpcs"] == len(events) == 9
+    assert events[0].op == "set" and events[0].collection == "users" and events[0].writes == 1
+
+    # spans wrap every request
+    spans = []
+    open_spans = []
+
+    class Span:
+        def __init__(self, name, attributes):
+            self.name, self.attributes = name, dict(attributes)
+
+        def __enter__(self):
+            spans.append(self)
+            open_spans.append(self)
+            return self
+
+        def __exit__(self, *exc):
+            open_spans.remove(self)
+            return False
+
+        def set_attribute(self, key, value):
+            self.attributes[key] = value
+
+    metrics.span_factory = Span
+    metrics.reset()
+    list(User.all().iter_pages(page_size=2))
+    assert [span.name for span in spans] == ["firestore.query", "firestore.query"]
+    assert [span.attributes["db.firestore.reads"] for span in spans] == [2, 1]
+    assert spans[0].attributes["db.collection"] == "users"
+    assert metrics.stats()["reads"] == 3
+
+    # a streamed query is one request, read in batches. the span of a batch is closed before its documents reach the
+    # caller, and the caller's time isn't part of the latency
+    monkeypatch.setattr("pyfireconsole.queries.query_runner.ITER_BATCH_SIZE", 2)
+    monkeypatch.setattr("pyfireconsole.queries.async_query_runner.ITER_BATCH_SIZE", 2)
+    spans.clear()
+    events.clear()
+    for user in User.all():
+        assert open_spans == []
+        time.sleep(0.02)
+    assert [(span.name, span.attributes["db.firestore.reads"]) for span in spans] == [("firestore.query.batch", 2), ("firestore.query.batch", 1)]
+    assert [(event.op, event.reads) for event in events] == [("query", 3)]
+    assert events[0].latency < 0.02
+
+    # a query stopped early is recorded when the iteration is closed
+    events.clear()
+    docs = QueryRunner("users").iter()
+    next(docs)
+    docs.close()
+    assert [(event.op, event.reads) for event in events] == [("query", 2)]
+
+    async def first_user():
+        async for user in User.all():
+            assert open_spans == []
+            return user
+
+    events.clear()
+    assert asyncio.run(first_user()) is not None
+    assert open_spans == []
+    # the page of documents is preloaded before the first one is returned
+    assert [(event.op, event.reads) for event in events] == [("query", 3)]
+
+
+def test_explain_and_magics(mock_db, capsys, monkeypatch):
+    from IPython.core.interactiveshell import InteractiveShell
+    from pyfireconsole.console.magics import PyFireMagics
+
+    for i in range(3):
+        User.new(id=f"u{i}", name=f"User{i}", email="").save()
+
+    plan = User.all().explain()
+    assert plan.full_scan
+    assert plan.estimated_count == 3 and plan.estimated_reads == 3
+    assert plan.limit == PyfireCollection.DEFAULT_LIMIT
+    assert plan.composite_indexes() == []
+
+    # equality filters are served by merged single field indexes
+    assert User.where("name", "==", "User1").where("email", "==", "").explain(count=False).composite_indexes() == []
+    assert User.where("age", ">", 20).order("age").explain(count=False).composite_indexes() == []
+    plan = User.where("role", "==", "admin").where("age", ">=", 20).order("created_at", "DESCENDING").limit(1).explain()
+    assert not plan.full_scan
+    assert plan.estimated_count == 0 and plan.estimated_reads == 1
+    assert plan.composite_indexes() == [[("role", "ASCENDING"), ("created_at", "DESCENDING"), ("age", "ASCENDING")]]
+    assert "composite index: role ASCENDING, created_at DESCENDING, age ASCENDING" in str(plan)
+
+    # OR filters are estimated with a count aggregation per query, without reading the matching ids
+    from pyfireconsole.queries.union_query_runner import UnionQueryRunner
+    monkeypatch.setattr(UnionQueryRunner, "count", lambda self: pytest.fail("union count reads the ids"))
+    plan = User.where_any(("name", "==", "User0"), ("id", "==", "u0"), ("name", "==", "User1")).explain()
+    monkeypatch.undo()
+    assert plan.branch_counts == [1, 1, 1]
+    assert plan.count_is_upper_bound and plan.estimated_count == 3 and plan.estimated_reads == 3
+    assert "estimated documents: at most 3" in str(plan)
+
+    shell = InteractiveShell()
+    shell.register_magics(PyFireMagics)
+    shell.user_ns["User"] = User
+
+    users = shell.run_line_magic("fsstats", "User.all()")
+    assert [user.id for user in users] == ["u0", "u1", "u2"]
+    out = capsys.readouterr().out
+    assert out.splitlines()[0].split() == ["collection", "rpcs", "reads", "writes", "deletes", "p50", "p95", "max"]
+    assert out.splitlines()[1].split()[:5] == ["users", "1", "3", "0", "0"]
+
+    shell.run_line_magic("fsexplain", "User")
+    out = capsys.readouterr().out
+    assert "collection: users" in out and "WARNING: full collection scan" in out
+    shell.run_line_magic("fsexplain", "-n User.where('name', '==', 'User1')")
+    out = capsys.readouterr().out
+    assert "query: name == 'User1'" in out and "estimated" not in out
+    assert FirestoreConnection().metrics is None
+
+
+def test_lazy_model_dir(mock_db, tmp_path, monkeypatch):
+    from IPython.core.interactiveshell import InteractiveShell
+    from pyfireconsole import PyFireConsole
+    from pyfireconsole.console import model_loader
+    from pyfireconsole.console.model_loader import LazyModelNamespace, scan_model_dir
+
+    # the lazy exports of the package support wildcard imports
+    exported: dict = {}
+    exec("from pyfireconsole import *", exported)
+    assert exported["PyFireConsole"] is PyFireConsole and exported["PyfireDoc"] is PyfireDoc
+
+    (tmp_path / "members.py").write_text(
+        "from pyfireconsole.models.association import has_many\n"
+        "from pyfireconsole.models.pyfire_model import PyfireDoc\n\n\n"
+        "@has_many('Article', 'member_id', 'articles')\n"
+        "class Member(PyfireDoc):\n"
+        "    name: str\n"
+    )
+    (tmp_path / "articles.py").write_text(
+        "from pyfireconsole.models.pyfire_model import PyfireDoc\n\n\n"
+        "class Article(PyfireDoc):\n"
+        "    title: str\n"
+        "    member_id: str\n"
+    )
+    (tmp_path / "unused.py").write_text("class Unused:\n    pass\n\n\nraise RuntimeError('must not be imported')\n")
+
+    namespace = PyFireConsole(model_dir=str(tmp_path), lazy=True).load_models({"Unused": None}, verbose=False)
+    assert isinstance(namespace, LazyModelNamespace)
+    assert sorted(namespace.lazy_names) == ["Article", "Member"]
+
+    # names are looked up lazily by code run in the console
+    shell = InteractiveShell(user_ns=namespace)
+    result = shell.run_cell("member = Member.new(name='John').save()\nmember.__class__.__name__")
+    assert result.result == "Member"
+    # the relationship loaded articles.py too
+    assert namespace.lazy_names == []
+    Article = namespace["Article"]
+    Article.new(title="Hello", member_id=namespace["member"].id).save()
+    assert [article.title for article in namespace["member"].articles] == ["Hello"]
+    assert namespace["Unused"] is None
+
+    # the index is cached per file and refreshed when a file changes
+    cache_path = tmp_path / "__pycache__" / "pyfireconsole-index.json"
+    assert json.loads(cache_path.read_text())["files"][str(tmp_path / "articles.py")]["classes"] == ["Article"]
+    monkeypatch.setattr(model_loader, "_class_names", lambda filename: pytest.fail(f"{filename} parsed"))
+    assert scan_model_dir(str(tmp_path))["Article"] == str(tmp_path / "articles.py")
+    monkeypatch.undo()
+
+    (tmp_path / "articles.py").write_text((tmp_path / "articles.py").read_text() + "\n\nclass Comment(Article):\n    body: str\n")
+    assert scan_model_dir(str(tmp_path))["Comment"] == str(tmp_path / "articles.py")
+
+
+@pytest.fixture
+def memory_db():
+    from pyfireconsole.db.memory_backend import AsyncMemoryClient, MemoryClient
+
+    db = MemoryClient()
+    FirestoreConnection().set_db(db)
+    FirestoreConnection().set_async_db(AsyncMemoryClient(db))
+    yield db
+
+
+def test_memory_backend(memory_db):
+    from google.api_core.exceptions import NotFound
+
+    for i in range(50):
+        User.new(id=f"user{i:02}", name=f"John{i % 5}", email=f"{i}@example.com").save()
+    Book.new(
+        id="book1",
+        title="Math",
+        user_id="user01",
+        published_at=datetime(2023, 1, 1, 9),
+        authors=["John", "Mary"],
+        publisher_ref="publisher/12345",
+    ).save()
+
+    # stored like Firestore: naive datetimes are UTC
+    assert Book.find("book1").published_at.isoformat() == "2023-01-01T09:00:00+00:00"
+    assert [user.id for user in User.where("name", "==", "John1").order("email", "DESCENDING").limit(3)] == ["user06", "user46", "user41"]
+    assert User.where("email", ">=", "48").count() == 8  # 48@, 49@ and 4@..9@
+    assert User.where("name", "in", ["John0", "John4"]).count() == 20
+    assert User.where("name", "not-in", ["John0", "John4"]).count() == 30
+    assert [book.id for book in Book.where("authors", "array_contains", "Mary")] == ["book1"]
+    assert Book.where("authors", "array_contains_any", ["Bob", "John"]).count() == 1
+    assert User.where("id", ">", "user45").order("id", "DESCENDING").take(2)[1].id == "user48"
+
+    # cursors, offsets and limits on ordered indexes
+    pages = list(User.order("name", "DESCENDING").iter_pages(page_size=7))
+    ids = [user.id for page in pages for user in page]
+    assert len(ids) == 50 and ids == sorted(ids, key=lambda id: (int(id[4:]) % 5, id), reverse=True)  # ties by id, descending
+    assert [len(page) for page in pages] == [7] * 7 + [1]
+    assert [user.id for user in User.all().offset(10).limit(2)] == ["user10", "user11"]
+
+    # writes maintain the indexes
+    user = User.find("user01")
+    user.update(name="Mary")
+    assert [user.id for user in User.where("name", "==", "Mary")] == ["user01"]
+    assert User.where("name", "==", "John1").count() == 9
+    assert User.where("id", "in", ["user02", "user03"]).delete_all() == 2
+    assert User.count() == 48 and User.where("name", "==", "John2").count() == 9
+
+    # dotted updates, preconditions and atomic batches
+    memory_db.collection("books").document("book1").update({"edit_info.editor": "Bob"})
+    assert Book.find("book1").edit_info == {"editor": "Bob"}
+    memory_db.collection("books").document("book1").update({"publisher": memory_db.document("publisher/12345")})
+    assert QueryRunner("books").get("book1")["publisher"] == {"path": "publisher/12345"}
+    with pytest.raises(NotFound):
+        memory_db.collection("books").document("missing").update({"title": "x"})
+    assert QueryRunner("users").delete("missing", verify=False, must_exist=True) is False
+    assert QueryRunner("users").delete("user00", verify=False, must_exist=True) is True
+    batch = memory_db.batch()
+    batch.set(memory_db.collection("users").document("new"), {"name": "New", "email": ""})
+    batch.update(memory_db.collection("users").document("missing"), {"name": "x"})
+    with pytest.raises(NotFound):
+        batch.commit()
+    assert not memory_db.collection("users").document("new").get().exists
+
+    # aggregations, projections and the async client
+    assert User.count() == 47
+    assert Book.all().sum("title") == 0
+    assert User.where("name", "==", "John4").select("email").first().email == "4@example.com"
+
+    async def scenario():
+        return [user.id async for user in User.where("name", "==", "John3").order("email")]
+
+    assert asyncio.run(scenario())[:2] == ["user13", "user18"]
+
+
+def test_union_order_with_nulls(memory_db):
+    from pyfireconsole.queries.union_query_runner import UnionQueryRunner
+
+    class Item(PyfireDoc):
+        kind: str
+        rank: Optional[int] = None
+
+    for i, (kind, rank) in enumerate([("a", 2), ("b", None), ("a", None), ("b", 1), ("c", 0)]):
+        Item.new(id=f"item{i}", kind=kind, rank=rank).save()
+
+    # null is ordered before numbers, like Firestore
+    coll = Item.where_any(("kind", "==", "a"), ("kind", "==", "b")).order("rank")
+    assert [item.id for item in coll] == ["item1", "item2", "item3", "item0"]
+    assert [item.id for page in coll.iter_pages(page_size=2) for item in page] == ["item1", "item2", "item3", "item0"]
+    assert [item.id for item in coll.order("rank", "DESCENDING")] == ["item0", "item3", "item2", "item1"]
+
+    # aggregations don't change the projection of the branch queries
+    union = UnionQueryRunner([QueryRunner("items").where("kind", "==", kind) for kind in ("a", "b")])
+    assert union.count() == 4
+    assert union.sum("rank") == 3
+    assert next(union.iter())["kind"] == "a"
+
+
+def test_snapshot(memory_db, tmp_path):
+    from google.api_core.exceptions import PermissionDenied
+    from pyfireconsole.db.snapshot import SnapshotClient, dump_snapshot
+
+    for i in range(30):
+        User.new(id=f"user{i:02}", name=f"John{i % 3}", email=f"{i}@example.com").save()
+    Publisher.new(id="12345", name="Tokyo").save()
+    book = Book.new(
+        id="book1",
+        title="Math",
+        user_id="user01",
+        published_at=datetime(2023, 1, 1, 9),
+        authors=["John", "Mary"],
+        edit_info={"pages": 120, "history": [{"by": "Bob", "at": datetime(2022, 5, 1)}]},
+        publisher_ref=DocumentRef[Publisher](path="publisher/12345"),
+    )
+    book.save()
+    book.tags.add(Tag.new(name="science"))
+
+    path = str(tmp_path / "db.pfsnap")
+    assert dump_snapshot(path, page_size=7) == 33
+    assert dump_snapshot(str(tmp_path / "users.pfsnap"), collections=["users"], recursive=False) == 30
+
+    client = FirestoreConnection().open_snapshot(path)
+    assert sorted(coll.id for coll in client.collections()) == ["books", "publishers", "users"]
+    assert [user.id for user in User.where("name", "==", "John1").order("email", "DESCENDING").limit(2)] == ["user07", "user04"]
+    assert User.where("email", "<", "2").count() == 12
+    assert [user.id for user in User.all().limit(2)] == ["user00", "user01"]
+    assert User.find("user05").email == "5@example.com"
+    assert len(list(User.all().iter_pages(page_size=8))) == 4
+
+    book = Book.find("book1")
+    assert book.published_at.isoformat() == "2023-01-01T09:00:00+00:00"
+    assert book.edit_info["history"][0]["at"].year == 2022
+    assert book.publisher_ref.path == "publisher/12345"
+    assert book.user.name == "John1"
+    assert [tag.name for tag in book.tags] == ["science"]
+    assert Book.where("edit_info.pages", ">=", 100).first().id == "book1"
+
+    with pytest.raises(PermissionDenied):
+        User.new(name="Mary", email="").save()
+    assert User.count() == 30
+    client.close()
+
+    # Documents of other databases may come in any order
+    db = MockFirestore()
+    FirestoreConnection().set_db(db)
+    for id in ["b", "c", "a"]:
+        db.collection("tags").document(id).set({"name": id})
+    dump_snapshot(str(tmp_path / "tags.pfsnap"), collections=["tags"], recursive=False)
+    with SnapshotClient(str(tmp_path / "tags.pfsnap")) as client:
+        assert [doc.id for doc in client.collection("tags").stream()] == ["a", "b", "c"]
+        assert client.document("tags/c").get().to_dict() == {"name": "c"}
+        assert not client.document("tags/d").get().exists
+
+    with open(tmp_path / "broken.pfsnap", "wb") as f:
+        f.write(b"not a snapshot" * 10)
+    with pytest.raises(ValueError):
+        SnapshotClient(str(tmp_path / "broken.pfsnap"))
+
+
+def test_benchmarks_run(tmp_path):
+    # keeps benchmarks/orm_hot_paths.py working. The timings are not checked here.
+    import os
+    import subprocess
+    import sys
+
+    script = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "orm_hot_paths.py")
+    baselines = str(tmp_path / "baselines.json")
+    command = [sys.executable, script, "--docs", "3", "--widths", "1", "--repeat", "1", "--no-startup",
+               "--baselines", baselines]
+    output = subprocess.run(command + ["--save"], check=True, capture_output=True, text=True).stdout
+    names = ["find", "iterate", "iterate_trusted", "as_json", "as_json_recursive", "update", "belongs_to", "has_many", "save"]
+    with open(baselines) as f:
+        assert set(json.load(f)["results"]) == {f"{name}[docs=3,width=1]" for name in names}
+    assert "find[docs=3,width=1]" in output and "Saved 9 baselines" in output